@@ -1,4 +1,4 @@
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from flask_socketio import SocketIO
 from dotenv import load_dotenv
@@ -17,6 +17,8 @@ def create_app():
     ))
 
     app = Flask(__name__, static_folder=None)
+    from .core.config import get_config
+    app.config.from_object(get_config())
     app.config.update(
         SECRET_KEY=os.getenv('SECRET_KEY', 'dev'),
         UPLOAD_FOLDER=os.path.abspath(os.getenv('UPLOAD_FOLDER', 'uploads')),
@@ -34,12 +36,62 @@ def create_app():
     )
     
     # Регистрация сервисов (ИСПРАВЛЕННЫЙ ИМПОРТ)
-    from .services import FileService
+    from .services import FileService, ExecutorService
+    from .services.storage_service import StorageService
+    ExecutorService.init_app(app)
+
+    # База: задачи, теги, индексы файлов и сообщений, настройки (нужна сервисам ниже)
+    from .services.database_service import Database
+    from .services.config_service import SettingsStore
+    Database.init_app(app)
+    SettingsStore.import_file()
+
+    StorageService.init_app(app)
     FileService.init_app(app)
 
+    from .services.text_codec import TextCodec
+    TextCodec.init_app(app)
+
+    from .services.progress_service import ProgressReporter
+    ProgressReporter.init_app(app)
+
+    from .services.telegram_cache_service import TelegramFileCache
+    TelegramFileCache.init_app(app)
+
+    from .services.youtube_service import YouTubeService
+    YouTubeService.init_app(app)
+
+    from .services.watcher_service import WatcherService
+    WatcherService.init_app(app)
+
+    from .services.hls_service import HlsService
+    HlsService.init_app(app)
+
+    from .services.image_service import ImageService
+    ImageService.init_app(app)
+
+    from .services.diagnostics_service import DiagnosticsService
+    DiagnosticsService.init_app(app)
+
+    from .services.rate_limit_service import RateLimiter
+    RateLimiter.init_app(app)
+
+    from .services.lifecycle_service import Lifecycle
+    Lifecycle.init_app(app)
+
+    from .services.transfer_service import TransferService
+    TransferService.init_app(app)
+
     # Регистрация API
     from .routes.api import bp as api_bp
     app.register_blueprint(api_bp)
+    from .routes.media import bp as media_bp
+    app.register_blueprint(media_bp)
+    from .routes.health import bp as health_bp
+    app.register_blueprint(health_bp)
+    if app.config.get('DIAGNOSTICS_ENABLED'):
+        from .routes.diagnostics import bp as diagnostics_bp
+        app.register_blueprint(diagnostics_bp)
 
     # SocketIO
     socketio.init_app(
@@ -49,14 +101,14 @@ def create_app():
         logger=logging.getLogger('socketio'),
         engineio_logger=False
     )
+    from .socket_handlers import init_socketio
+    init_socketio(socketio)
 
-    # Статика
-    @app.route('/<path:path>')
-    def serve_static(path):
-        return send_from_directory('../frontend/dist', path)
+    # Статика: манифест сборки, предсжатые варианты, кеширующие заголовки
+    from .services.static_service import StaticAssets
+    StaticAssets.init_app(app)
 
-    @app.route('/')
-    def index():
-        return serve_static('index.html')
+    from .commands import register_commands
+    register_commands(app)
 
     return app
\ No newline at end of file
@@ -1,10 +1,16 @@
 # app/blueprints/chat/routes.py
 from datetime import datetime
 import os
-from pathlib import Path
-from flask import Blueprint, Response, app, current_app, request, jsonify, send_from_directory
+from flask import Blueprint, Response, app, current_app, redirect, request, jsonify, send_from_directory, stream_with_context
 from flask_socketio import emit
 from app.services.file_service import FileService
+from app.services.text_service import TextService
+from app.services.text_codec import TextCodec
+from app.services.image_service import ImageService
+from app.routes.media import send_image_variant, wants_image_variant
+from app.services.realtime_service import RealtimeService
+from app.services.rate_limit_service import RateLimiter, concurrency_limit, large_upload, rate_limit
+from app.core.http_cache import cached_json
 from app.services.config_service import get_config, save_config
 from app import socketio
 
@@ -19,41 +25,45 @@ def index():
 
 @chat_bp.route('/api/history')
 def get_history():
+    """История: только превью, продолжение читается через /file/<filename>?offset="""
     try:
-        files = FileService.get_history_files()
-        return jsonify([{
-            'filename': f.name,
-            'content': f.read_text(encoding='utf-8', errors='replace'),
-            'timestamp': f.stat().st_mtime
-        } for f in files if f.is_file()])
+        return cached_json('chat.history', FileService.listing_version(), lambda: [{
+            'filename': f['filename'],
+            'content': f['content'],
+            'timestamp': f['created'],
+            'size': f['size'],
+            'next_offset': f['next_offset']
+        } for f in FileService.get_history_files()])
     except Exception as e:
         return jsonify(error=str(e)), 500
 
 @chat_bp.route('/api/messages')
 def get_messages():
-    try:
-        files = FileService.list_files()
-        messages = FileService.prepare_messages(files)
-        
+    def build():
+        messages = FileService.prepare_messages(FileService.list_files())
+
         # Добавляем проверку на ошибки чтения файлов
         for msg in messages:
             if 'error' in msg:
                 current_app.logger.warning(f"Поврежденный файл: {msg.get('filename')}")
-                
-        return jsonify(messages)
+        return messages
+
+    try:
+        return cached_json('chat.messages', FileService.listing_version(), build)
     except Exception as e:
         current_app.logger.error(f"Ошибка в /api/messages: {str(e)}")
         return jsonify({"error": "Ошибка загрузки сообщений", "details": str(e)}), 500
 
 @chat_bp.route('/get_files')
 def get_files():
-    files = FileService.list_files()
-    return jsonify([{
-        'name': Path(f).name,
-        'size': Path(f).stat().st_size
-    } for f in files])
+    return cached_json('chat.files', FileService.listing_version(), lambda: [{
+        'name': f['name'],
+        'size': f['size']
+    } for f in FileService.list_files()])
 
 @chat_bp.route('/api/files/upload', methods=['POST'])
+@rate_limit('upload')
+@concurrency_limit('upload', when=large_upload)
 def upload_file():
     if 'file' not in request.files:
         return jsonify(error="Файл не выбран"), 400
@@ -63,13 +73,14 @@ def upload_file():
         return jsonify(error="Неверное имя файла"), 400
 
     try:
-        filename = FileService.sanitize_filename(file.filename)
-        file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+        filename = FileService.store_upload(file)
+        ImageService.schedule_auto(filename)
         return jsonify(success=True, filename=filename)
     except Exception as e:
         return jsonify(error=str(e)), 500
 
 @chat_bp.route('/api/save_text', methods=['POST'])
+@rate_limit('message')
 def save_text():
     data = request.get_json()
     text = data.get('text', '').strip()
@@ -78,7 +89,7 @@ def save_text():
     
     try:
         message = FileService.save_text(text)
-        socketio.emit('message_update', message, broadcast=True)  # Добавлено
+        RealtimeService.emit('message_update', message, topic='messages')
         return jsonify(message)
     except Exception as e:
         return jsonify(error=str(e)), 500
@@ -90,6 +101,10 @@ def handle_new_message(data):
         text = data.get('text', '').strip()
         if not text:
             return
+        wait = RateLimiter.hit_socket('message', request.sid)
+        if wait:
+            emit('error', {'message': "Слишком много сообщений", 'retry_after': wait})
+            return
         
         # Сохраняем только как txt
         message = FileService.save_text(text)
@@ -98,42 +113,66 @@ def handle_new_message(data):
         if get_config().get("copy_to_clipboard", True):
             FileService.copy_to_clipboard(text)
             
-        emit('message_update', {
+        RealtimeService.emit('message_update', {
             'type': 'text',
             'content': text,
             'time': datetime.now().strftime('%H:%M'),
-            'filename': message['filename'],
+            'filename': message.get('filename'),
             'autoCopy': True
-        }, broadcast=True)
+        }, topic='messages')
     except Exception as e:
         current_app.logger.error(f"Ошибка обработки сообщения: {str(e)}")
 
 @chat_bp.route('/file/<filename>')
 def download_file(filename):
-    """Скачивание файла"""
-    upload_folder = current_app.config['UPLOAD_FOLDER']
-    file_path = os.path.join(upload_folder, filename)
+    """
+    Скачивание файла. Текст отдается потоком целиком
+    или окном: ?offset=&limit= (байты) / ?line=&lines= (строки)
+    """
+    filename = FileService.sanitize_filename(filename)
+    # Бинарные файлы из S3 скачиваются напрямую по presigned-ссылке (кроме вариантов картинок)
+    url = None if filename.endswith('.txt') or wants_image_variant(filename) else FileService.download_url(filename)
+    if url:
+        return redirect(url)
+    file_path = FileService.resolve_path(filename)
     
-    if not os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], filename)):
+    if file_path is None:
         return jsonify(error="Файл не найден"), 404
     
     if filename.endswith('.txt'):
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            if request.headers.get('Accept', '').lower() == 'text/plain':
-                return content
-            
-            if get_config().get("copy_to_clipboard", True):
-                FileService.copy_to_clipboard(content)
+            window = TextService.read_window(
+                file_path,
+                request.args,
+                current_app.config.get('TEXT_WINDOW_MAX_BYTES', 1024 * 1024),
+                current_app.config.get('TEXT_WINDOW_MAX_LINES', 5000)
+            )
+            if window is not None:
+                if request.accept_mimetypes.best == 'application/json':
+                    return jsonify(window)
+                return Response(
+                    window['content'],
+                    mimetype='text/plain',
+                    headers=TextService.window_headers(window)
+                )
+
+            # Копирование в буфер - побочный эффект в фоне, ответ не ждет
+            if request.headers.get('Accept', '').lower() != 'text/plain' and get_config().get("copy_to_clipboard", True):
+                FileService.copy_file_to_clipboard(filename)
             
-            return Response(content, mimetype='text/plain')
+            return Response(
+                stream_with_context(TextService.stream(file_path)),
+                mimetype='text/plain',
+                headers={'Content-Length': str(TextCodec.size(file_path))}
+            )
         except Exception as e:
             current_app.logger.error(f"Ошибка обработки файла: {str(e)}")
             return jsonify(error="Ошибка обработки файла"), 500
     
-    return send_from_directory(upload_folder, filename, as_attachment=True)
+    variant = send_image_variant(file_path, filename)
+    if variant is not None:
+        return variant
+    return send_from_directory(os.path.dirname(file_path), os.path.basename(file_path), as_attachment=True)
 
 # WebSocket обработчики
 @socketio.on('connect')
@@ -146,11 +185,14 @@ def handle_disconnect():
 
 @socketio.on('refresh_messages')
 def handle_refresh():
-    """Обновление списка сообщений"""
+    """
+    Обновление списка сообщений для запросившего клиента.
+    Остальные узнают об изменениях из событий наблюдателя (file_added/...).
+    """
     try:
         files = FileService.list_files()
         messages = FileService.prepare_messages(files)
-        emit('messages_refreshed', messages, broadcast=True)
+        emit('messages_refreshed', messages)
     except Exception as e:
         current_app.logger.error(f"Ошибка обновления сообщений: {str(e)}")
 
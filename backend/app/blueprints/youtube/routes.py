@@ -3,7 +3,9 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_socketio import emit
 import yt_dlp
 from app.services.youtube_service import YouTubeService
+from app.services.executor_service import ExecutorService
 from app.core.exceptions import YouTubeDownloadError
+from app.services.rate_limit_service import concurrency_limit, rate_limit
 from app import socketio
 import re
 
@@ -26,7 +28,7 @@ def get_video_info():
         }
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+            info = ExecutorService.run_io(ydl.extract_info, url, download=False)
             
             formats = [{
                 'format_id': f['format_id'],
@@ -60,6 +62,8 @@ def youtube_search():
         return jsonify(error="Search failed"), 500
 
 @youtube_bp.route('/download', methods=['POST'])
+@rate_limit('youtube')
+@concurrency_limit('youtube')
 def download_video():
     try:
         data = request.get_json()
@@ -0,0 +1,30 @@
+# app/commands.py
+import click
+from pathlib import Path
+
+
+def register_commands(app):
+    """Команды обслуживания: flask --app app:create_app <команда>"""
+
+    @app.cli.command('compress-texts')
+    @click.option('--retrain', is_flag=True, help='Обучить новый словарь, даже если он уже есть')
+    def compress_texts(retrain):
+        """Сжать сохраненные .txt в UPLOAD_FOLDER (TEXT_COMPRESSION=zstd)"""
+        from .services.text_codec import TextCodec
+
+        if not TextCodec.enabled():
+            raise click.ClickException("Сжатие выключено: задайте TEXT_COMPRESSION=zstd и установите zstandard")
+        folder = app.config['UPLOAD_FOLDER']
+        if retrain:
+            dict_id = TextCodec.train(str(p) for p in Path(folder).glob('*.txt'))
+            click.echo(f"Словарь: {dict_id or 'недостаточно образцов'}")
+
+        result = TextCodec.migrate(folder)
+        if result['dict_id']:
+            click.echo(f"Словарь: {result['dict_id']}")
+        if result['last_error']:
+            click.echo(f"Последняя ошибка: {result['last_error']}", err=True)
+        click.echo(
+            f"Сжато {result['compressed']} из {result['files']}, ошибок: {result['errors']}, "
+            f"сэкономлено {result['saved_bytes'] // 1024} КБ"
+        )
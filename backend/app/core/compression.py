@@ -0,0 +1,62 @@
+# app/core/compression.py
+import gzip
+from typing import Iterable, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli не установлен - остается только gzip
+    brotli = None
+
+# Типы, которые имеет смысл сжимать (картинки и видео уже сжаты)
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/javascript', 'application/json', 'image/svg+xml',
+    'application/xml', 'application/wasm', 'application/manifest+json'
+)
+
+# Расширение предсжатого файла рядом с оригиналом
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def compressible(mimetype: Optional[str]) -> bool:
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def supported_encodings() -> tuple:
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Сжатие максимальным уровнем по умолчанию (для предсжатия один раз)"""
+    if encoding == 'br':
+        if brotli is None:
+            raise ValueError("brotli не установлен")
+        return brotli.compress(data, quality=11 if level is None else level)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9 if level is None else level, mtime=0)
+    raise ValueError(f"Неизвестное сжатие: {encoding}")
+
+
+def choose_encoding(accept_encoding: str, available: Iterable[str]) -> Optional[str]:
+    """
+    Лучшая кодировка из доступных по заголовку Accept-Encoding.
+    Порядок предпочтения - порядок available; q=0 запрещает кодировку.
+    """
+    accepted = {}
+    for part in (accept_encoding or '').lower().split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+
+    for encoding in available:
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > 0:
+            return encoding
+    return None
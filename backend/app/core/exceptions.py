@@ -10,3 +10,11 @@ class YouTubeDownloadError(Exception):
 class FileProcessingError(Exception):
     """Ошибка обработки файла"""
     pass
+
+class ExecutorBusyError(Exception):
+    """Пул выполнения перегружен"""
+    pass
+
+class ShuttingDownError(Exception):
+    """Сервер останавливается и не принимает новую работу"""
+    pass
@@ -0,0 +1,77 @@
+# app/core/http_cache.py
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+from flask import Response, current_app, request
+from .compression import choose_encoding, compress, supported_encodings
+
+try:
+    from eventlet.patcher import original
+    _Lock = original('threading').Lock
+except ImportError:
+    from threading import Lock as _Lock
+
+# Уровни для сжатия на лету: быстрее, чем максимальные при предсжатии статики
+DYNAMIC_LEVELS = {'br': 5, 'gzip': 6}
+MAX_ENTRIES = 64
+
+_cache: 'OrderedDict[str, Dict]' = OrderedDict()
+_lock = _Lock()
+
+
+def _entry(key: str, version: str, builder: Callable[[], Any]) -> Dict:
+    """Сериализованный ответ для версии коллекции; пересобирается только при смене версии"""
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry['version'] == version:
+            _cache.move_to_end(key)
+            return entry
+
+    body = current_app.json.dumps(builder()).encode('utf-8')
+    entry = {
+        'version': version,
+        'body': body,
+        'etag': hashlib.sha1(body).hexdigest()[:16],
+        'variants': {}
+    }
+    with _lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return entry
+
+
+def cached_json(key: str, version: str, builder: Callable[[], Any]) -> Response:
+    """
+    JSON-ответ списка с ETag/304 и сжатием по Accept-Encoding.
+    version - дешевый признак изменения коллекции (ревизия каталога,
+    поколение папки); builder вызывается только при ее смене.
+    """
+    entry = _entry(key, version, builder)
+    body = entry['body']
+    encoding = None
+    if len(body) >= current_app.config.get('JSON_COMPRESS_MIN', 1024):
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), supported_encodings())
+
+    etag = f"{entry['etag']}-{encoding}" if encoding else entry['etag']
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+
+    if encoding:
+        variant = entry['variants'].get(encoding)
+        if variant is None:
+            variant = entry['variants'][encoding] = compress(body, encoding, DYNAMIC_LEVELS[encoding])
+        body = variant
+        headers['Content-Encoding'] = encoding
+
+    return Response(body, mimetype='application/json', headers=headers)
+
+
+def invalidate(key: str = None):
+    with _lock:
+        if key is None:
+            _cache.clear()
+        else:
+            _cache.pop(key, None)
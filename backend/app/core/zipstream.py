@@ -0,0 +1,184 @@
+# app/core/zipstream.py
+import struct
+import time
+import zlib
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+# Поля заголовков ZIP 32-битные: все, что не помещается, уходит в zip64
+ZIP32_MAX = 0xFFFFFFFF
+ZIP16_MAX = 0xFFFF
+# Сжатый размер deflate заранее неизвестен, поэтому zip64 включается с запасом
+ZIP64_THRESHOLD = 0xF0000000
+
+STORED = 0
+DEFLATED = 8
+FLAG_DESCRIPTOR = 0x08   # CRC и размеры пишутся после данных
+FLAG_UTF8 = 0x800
+DEFLATE_LEVEL = 6
+
+
+def _dos_datetime(timestamp: float):
+    t = time.localtime(max(timestamp, 315532800))  # ZIP не умеет даты раньше 1980
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    )
+
+
+class ZipEntry:
+    """Файл архива: имя, размер и источник данных (функция, возвращающая итератор байтов)"""
+
+    def __init__(self, name: str, size: int, mtime: float, source: Callable[[], Iterable[bytes]],
+                 compress: bool = False):
+        self.name = name
+        self.encoded_name = name.encode('utf-8')
+        self.size = size
+        self.mtime = mtime
+        self.source = source
+        self.method = DEFLATED if compress else STORED
+        self.zip64 = size >= ZIP64_THRESHOLD
+        self.offset = 0
+        self.crc = 0
+        self.compressed_size = 0
+
+    def local_header(self) -> bytes:
+        dos_time, dos_date = _dos_datetime(self.mtime)
+        # Для zip64 пустое extra-поле сообщает читателю, что дескриптор с 8-байтовыми размерами
+        extra = struct.pack('<HHQQ', 0x0001, 16, 0, 0) if self.zip64 else b''
+        return struct.pack(
+            '<IHHHHHIIIHH', 0x04034B50, 45 if self.zip64 else 20, FLAG_DESCRIPTOR | FLAG_UTF8,
+            self.method, dos_time, dos_date, 0, ZIP32_MAX if self.zip64 else 0,
+            ZIP32_MAX if self.zip64 else 0, len(self.encoded_name), len(extra)
+        ) + self.encoded_name + extra
+
+    def descriptor(self) -> bytes:
+        if self.zip64:
+            return struct.pack('<IIQQ', 0x08074B50, self.crc, self.compressed_size, self.size)
+        return struct.pack('<IIII', 0x08074B50, self.crc, self.compressed_size, self.size)
+
+    def central_header(self) -> bytes:
+        dos_time, dos_date = _dos_datetime(self.mtime)
+        fields = []
+        size, compressed, offset = self.size, self.compressed_size, self.offset
+        if self.zip64 or size >= ZIP32_MAX:
+            fields.append(size)
+            size = ZIP32_MAX
+        if self.zip64 or compressed >= ZIP32_MAX:
+            fields.append(compressed)
+            compressed = ZIP32_MAX
+        if offset >= ZIP32_MAX:
+            fields.append(offset)
+            offset = ZIP32_MAX
+        extra = struct.pack(f'<HH{len(fields)}Q', 0x0001, 8 * len(fields), *fields) if fields else b''
+        version = 45 if fields else 20
+        return struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014B50, version, version, FLAG_DESCRIPTOR | FLAG_UTF8,
+            self.method, dos_time, dos_date, self.crc, compressed, size,
+            len(self.encoded_name), len(extra), 0, 0, 0, 0, offset
+        ) + self.encoded_name + extra
+
+
+class ZipStream:
+    """
+    Потоковая запись ZIP: архив отдается частями по мере чтения файлов,
+    память не зависит от размера архива. Если все файлы без сжатия,
+    итоговый размер известен заранее (content_length) - клиент видит прогресс.
+    offload(func) выполняет блокирующую работу - чтение источника, CRC и
+    сжатие куска (например, ExecutorService.run_io); по умолчанию - на месте.
+    """
+
+    def __init__(self, entries: List[ZipEntry], chunk_size: int = 256 * 1024,
+                 offload: Optional[Callable[[Callable[[], Any]], Any]] = None):
+        self.entries = entries
+        self.chunk_size = chunk_size
+        self.offload = offload or (lambda func: func())
+
+    def content_length(self) -> Optional[int]:
+        """Точный размер архива или None, если есть сжимаемые файлы"""
+        if any(entry.method != STORED for entry in self.entries):
+            return None
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            entry.compressed_size = entry.size
+            offset += len(entry.local_header()) + entry.size + len(entry.descriptor())
+        directory_size = sum(len(entry.central_header()) for entry in self.entries)
+        return offset + directory_size + len(self._end(offset, directory_size))
+
+    def __iter__(self) -> Iterator[bytes]:
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            header = entry.local_header()
+            yield header
+            offset += len(header)
+            for chunk in self._entry_data(entry):
+                offset += len(chunk)
+                yield chunk
+            descriptor = entry.descriptor()
+            yield descriptor
+            offset += len(descriptor)
+
+        directory = b''.join(entry.central_header() for entry in self.entries)
+        yield directory
+        yield self._end(offset, len(directory))
+
+    def _entry_data(self, entry: ZipEntry) -> Iterator[bytes]:
+        state = {'crc': 0, 'read': 0}
+        compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15) if entry.method == DEFLATED else None
+        source = self.offload(lambda: iter(entry.source()))
+
+        def next_chunk() -> Optional[bytes]:
+            """Следующий кусок источника, уже учтенный в CRC и сжатый; None - конец"""
+            data = next(source, None)
+            if data is None:
+                return None
+            state['crc'] = zlib.crc32(data, state['crc'])
+            state['read'] += len(data)
+            return compressor.compress(data) if compressor is not None else data
+
+        written = 0
+        buffer = bytearray()
+        try:
+            while True:
+                data = self.offload(next_chunk)
+                if data is None:
+                    break
+                buffer += data
+                if len(buffer) >= self.chunk_size:
+                    written += len(buffer)
+                    yield bytes(buffer)
+                    buffer.clear()
+        finally:
+            # Клиент мог оборвать загрузку - источник (ответ хранилища) закрывается сразу
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+        if compressor is not None:
+            buffer += self.offload(compressor.flush)
+        if buffer:
+            written += len(buffer)
+            yield bytes(buffer)
+
+        read = state['read']
+        if read != entry.size and entry.method == STORED:
+            # Размер уже объявлен в Content-Length - недописанный архив лучше оборвать
+            raise IOError(f"{entry.name}: размер изменился во время выгрузки ({entry.size} -> {read})")
+        entry.crc, entry.size, entry.compressed_size = state['crc'], read, written
+
+    def _end(self, directory_offset: int, directory_size: int) -> bytes:
+        """Конец центрального каталога; zip64-записи - если что-то не влезло в 32/16 бит"""
+        count = len(self.entries)
+        need_zip64 = (count >= ZIP16_MAX or directory_offset >= ZIP32_MAX or directory_size >= ZIP32_MAX
+                      or any(entry.zip64 for entry in self.entries))
+        record = b''
+        if need_zip64:
+            zip64_offset = directory_offset + directory_size
+            record = struct.pack(
+                '<IQHHIIQQQQ', 0x06064B50, 44, 45, 45, 0, 0, count, count, directory_size, directory_offset
+            ) + struct.pack('<IIQI', 0x07064B50, 0, zip64_offset, 1)
+        return record + struct.pack(
+            '<IHHHHIIH', 0x06054B50, 0, 0,
+            min(count, ZIP16_MAX), min(count, ZIP16_MAX),
+            min(directory_size, ZIP32_MAX), min(directory_offset, ZIP32_MAX), 0
+        )
@@ -0,0 +1,81 @@
+# backend/app/models.py
+from .extensions import db
+
+# Время везде - секунды Unix (float), как в остальных хранилищах приложения
+
+
+class StoredFile(db.Model):
+    """Метаданные файла папки (uploads, youtube) - зеркало каталога наблюдателя"""
+    __tablename__ = 'files'
+
+    id = db.Column(db.Integer, primary_key=True)
+    folder = db.Column(db.String(32), nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False, default=0)
+    mtime = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('folder', 'name', name='files_folder_name'),
+        db.Index('files_folder_created', 'folder', 'created_at'),
+    )
+
+
+class FileTag(db.Model):
+    """Тег файла; хранится по имени, поэтому работает и для S3"""
+    __tablename__ = 'file_tags'
+
+    name = db.Column(db.String(255), primary_key=True)
+    tag = db.Column(db.String(32), primary_key=True)
+
+    __table_args__ = (
+        db.Index('file_tags_tag', 'tag'),
+    )
+
+
+class Message(db.Model):
+    """Сообщение журнала: метаданные и превью для ленты (текст - в сегментах журнала)"""
+    __tablename__ = 'messages'
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    created_at = db.Column(db.Float, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    preview = db.Column(db.Text, nullable=False, default='')
+
+    __table_args__ = (
+        db.Index('messages_created', 'created_at'),
+    )
+
+
+class YoutubeJob(db.Model):
+    """Задача загрузки YouTube; незавершенные возобновляются после рестарта"""
+    __tablename__ = 'youtube_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    url = db.Column(db.Text, nullable=False)
+    format = db.Column(db.String(255))
+    download_dir = db.Column(db.Text, nullable=False)
+    output_path = db.Column(db.Text)
+    tuning = db.Column(db.Text)
+    status = db.Column(db.String(16), nullable=False)
+    bytes_done = db.Column(db.BigInteger, nullable=False, default=0)
+    total_bytes = db.Column(db.BigInteger)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.Float)
+    created_at = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('youtube_jobs_status', 'status'),
+        db.Index('youtube_jobs_updated', 'updated_at'),
+    )
+
+
+class Setting(db.Model):
+    """Настройка приложения: значение в JSON"""
+    __tablename__ = 'settings'
+
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)
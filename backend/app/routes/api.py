@@ -1,19 +1,58 @@
-from pathlib import Path
-from flask import Blueprint, jsonify, request, current_app, send_from_directory
-from flask_socketio import emit
-import socketio
+from flask import Blueprint, Response, jsonify, request, current_app, redirect, send_file, send_from_directory, stream_with_context
 from werkzeug.utils import secure_filename
+import io
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from ..services.file_service import FileService
 from ..services.youtube_service import YouTubeService
-from ..core.exceptions import InvalidFileError, YouTubeDownloadError
+from ..services.executor_service import ExecutorService
+from ..services.text_service import TextService
+from ..services.text_codec import TextCodec
+from ..services.watcher_service import WatcherService
+from ..services.realtime_service import RealtimeService
+from ..services.progress_service import ProgressReporter
+from ..services.hls_service import HlsService
+from ..services.image_service import ImageService
+from ..services.database_service import Database
+from ..services.job_store import JobStore
+from ..services.storage_service import StorageService
+from ..services.telegram_cache_service import TelegramFileCache
+from ..services.rate_limit_service import RateLimiter, concurrency_limit, large_upload, rate_limit
+from ..core.exceptions import InvalidFileError, ShuttingDownError, YouTubeDownloadError
 from ..services.log_service import log_access
+from ..core.http_cache import cached_json
+from ..core.zipstream import ZipStream
+from .media import send_image_variant, wants_image_variant
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
+def notify_file_change(change: str, name: str, size=None):
+    """Событие об изменении файла, если его не отправит наблюдатель за папкой"""
+    if StorageService.is_local() and WatcherService.active():
+        return
+    RealtimeService.emit(f'file_{change}', {'folder': 'uploads', 'name': name, 'size': size}, topic='files')
+
+def send_upload(file_path: str, download_name: str):
+    """
+    Файл загрузок как вложение; сжатый zstd текст отдается распакованным,
+    для картинок с ?size= - уменьшенный вариант для просмотра
+    """
+    variant = send_image_variant(file_path, download_name)
+    if variant is not None:
+        return variant
+    if download_name.endswith('.txt') and TextCodec.is_compressed(file_path):
+        data = ExecutorService.run_io(TextCodec.read, file_path)
+        return send_file(io.BytesIO(data), mimetype='text/plain', as_attachment=True, download_name=download_name)
+    return send_from_directory(
+        os.path.dirname(file_path),
+        os.path.basename(file_path),
+        as_attachment=True,
+        download_name=download_name
+    )
+
 # Сообщения
 @bp.route('/save_text', methods=['POST'])
+@rate_limit('message')
 def save_text():
     try:
         data = request.get_json()
@@ -26,9 +65,11 @@ def save_text():
 @bp.route('/messages', methods=['GET'])
 def get_messages():
     try:
-        files = FileService.list_files()
-        messages = FileService.prepare_messages(files)
-        return jsonify(messages)
+        return cached_json(
+            'api.messages',
+            FileService.listing_version(),
+            lambda: FileService.prepare_messages(FileService.list_files())
+        )
     except Exception as e:
         current_app.logger.error(f"Messages error: {str(e)}")
         return jsonify({"error": "Ошибка загрузки сообщений"}), 500
@@ -37,68 +78,251 @@ def get_messages():
 @bp.route('/history', methods=['GET'])
 def get_history():
     try:
-        files = FileService.get_history_files()
-        return jsonify(files)
+        return cached_json('api.history', FileService.listing_version(), FileService.get_history_files)
     except Exception as e:
         current_app.logger.error(f"History error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Список файлов (из каталога наблюдателя, без пересканирования папки)
+@bp.route('/files', methods=['GET'])
+def list_files():
+    """Список файлов с тегами; ?tag= - только файлы с этим тегом, ?limit=&offset= - страница"""
+    tag = request.args.get('tag', '').strip().lower()
+    limit = min(request.args.get('limit', 0, type=int), 1000)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    try:
+        return cached_json(
+            f"api.files:{tag}:{limit}:{offset}",
+            FileService.listing_version(),
+            lambda: FileService.list_tagged_files(tag or None, limit or None, offset)
+        )
+    except Exception as e:
+        current_app.logger.error(f"Files error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/files/watcher', methods=['GET'])
+def get_watcher_status():
+    """Режим наблюдателя и ревизия каталога"""
+    return jsonify(WatcherService.status())
+
 # Загрузка файлов
 @bp.route('/files/upload', methods=['POST'])
+@rate_limit('upload')
+@concurrency_limit('upload', when=large_upload)
 def upload_file():
+    # Прогресс приема тела запроса: клиент передает ?upload_id= или X-Upload-Id
+    upload_id = request.args.get('upload_id') or request.headers.get('X-Upload-Id')
+    if upload_id:
+        upload_id = f"upload:{upload_id[:64]}"
+        ProgressReporter.start(upload_id, 'upload', topic='files', total=request.content_length)
+        request.environ['wsgi.input'] = ProgressReporter.wrap_stream(upload_id, request.environ['wsgi.input'])
+
     if 'file' not in request.files:
+        if upload_id:
+            ProgressReporter.finish(upload_id, 'error', error="No file")
         return jsonify({"error": "No file"}), 400
         
     file = request.files['file']
     if file.filename == '':
+        if upload_id:
+            ProgressReporter.finish(upload_id, 'error', error="Empty filename")
         return jsonify({"error": "Empty filename"}), 400
 
     try:
         result = FileService.handle_file_upload(file)
+        if upload_id:
+            ProgressReporter.finish(upload_id, 'complete', filename=result['filename'])
+        HlsService.schedule_auto('uploads', result['filename'])
+        ImageService.schedule_auto(result['filename'])
+        if not StorageService.is_local():
+            notify_file_change('added', result['filename'])
         return jsonify(result)
     except Exception as e:
+        if upload_id:
+            ProgressReporter.finish(upload_id, 'error', error=str(e))
         return jsonify({"error": str(e)}), 500
 
+# Прямая загрузка в S3 частями: клиент получает presigned-ссылки на части,
+# отправляет их сам и сообщает ETag частей для сборки
+@bp.route('/files/multipart', methods=['POST', 'DELETE'])
+def multipart_upload():
+    if not StorageService.supports_multipart():
+        return jsonify({"error": "Хранилище не поддерживает прямую загрузку, используйте /files/upload"}), 400
+    data = request.get_json(silent=True) or {}
+    filename = FileService.sanitize_filename(data.get('filename') or '')
+    try:
+        if request.method == 'DELETE':
+            ExecutorService.run_io(StorageService.abort_multipart, filename, data['upload_id'])
+            return jsonify({"status": "aborted"})
+        size = int(data.get('size') or 0)
+        if size <= 0:
+            return jsonify({"error": "size обязателен"}), 400
+        upload = ExecutorService.run_io(StorageService.create_multipart, filename, size, data.get('content_type'))
+        return jsonify({"filename": filename, **upload})
+    except (InvalidFileError, KeyError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+@bp.route('/files/multipart/complete', methods=['POST'])
+def complete_multipart_upload():
+    if not StorageService.supports_multipart():
+        return jsonify({"error": "Хранилище не поддерживает прямую загрузку"}), 400
+    data = request.get_json(silent=True) or {}
+    filename = FileService.sanitize_filename(data.get('filename') or '')
+    try:
+        entry = ExecutorService.run_io(StorageService.complete_multipart, filename, data['upload_id'], data['parts'])
+    except (InvalidFileError, KeyError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Multipart complete error: {str(e)}")
+        return jsonify({"error": "Ошибка сборки файла"}), 500
+    TelegramFileCache.invalidate(filename)
+    notify_file_change('added', filename, entry['size'])
+    ImageService.schedule_auto(filename)
+    return jsonify({"success": True, "filename": filename, "size": entry['size']})
+
 # Управление файлами
 @bp.route('/files/<filename>', methods=['DELETE'])
 def delete_file(filename):
     try:
         safe_filename = secure_filename(filename)
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], safe_filename)
-        
-        if not os.path.exists(file_path):
+        if not FileService.delete_file(safe_filename):
             return jsonify({"error": "Файл не найден"}), 404
-            
-        os.remove(file_path)
-        emit('file_deleted', {'filename': safe_filename}, namespace='/', broadcast=True)
+
+        notify_file_change('deleted', safe_filename)
         return jsonify({"status": "Файл удален"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
+@bp.route('/files/batch', methods=['POST'])
+def batch_files():
+    """
+    Пакет операций над файлами:
+    {"operations": [{"op": "delete", "names": [...]},
+                    {"op": "move", "name": "a.txt", "to": "b.txt"},
+                    {"op": "tag", "names": [...], "add": [...], "remove": [...]}],
+     "atomic": true}
+    При atomic (по умолчанию) и ошибке проверки ничего не меняется - 409.
+    Вместо события на каждый файл рассылается одно files_batch_updated.
+    """
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "Нет операций"}), 400
+    atomic = data.get('atomic', True)
+    if not isinstance(atomic, bool):
+        return jsonify({"error": "atomic должен быть true или false"}), 400
+    try:
+        result = FileService.batch(
+            operations,
+            atomic=atomic,
+            concurrency=current_app.config.get('BATCH_CONCURRENCY', 8),
+            max_items=current_app.config.get('BATCH_MAX_ITEMS', 1000)
+        )
+    except InvalidFileError as e:
+        return jsonify({"error": str(e)}), 400
+    if not result['applied']:
+        return jsonify(result), 409
+
+    if result['deleted'] or result['moved'] or result['tagged']:
+        RealtimeService.emit('files_batch_updated', {
+            'folder': 'uploads',
+            'deleted': result['deleted'],
+            'moved': result['moved'],
+            'tagged': result['tagged'],
+            'revision': result['revision']
+        }, topic='files')
+    return jsonify(result)
+
 @bp.route('/files/download/<filename>', methods=['GET'])
 def download_file_route(filename):
     try:
         safe_filename = FileService.sanitize_filename(filename)
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        return send_from_directory(
-            upload_folder,
-            safe_filename,
-            as_attachment=True
-        )
+        url = None if wants_image_variant(safe_filename) else FileService.download_url(safe_filename)
+        if url:
+            return redirect(url)
+        file_path = FileService.resolve_path(safe_filename)
+        if file_path is None:
+            return jsonify({"error": "Файл не найден"}), 404
+        return send_upload(file_path, safe_filename)
     except Exception as e:
         return jsonify({"error": str(e)}), 404
     
+def parse_export_date(value, end: bool = False):
+    """YYYY-MM-DD или YYYY-MM; для конца интервала - начало следующего дня/месяца"""
+    if not value:
+        return None
+    if len(value) == 7:
+        month = datetime.strptime(value, '%Y-%m')
+        return (month + timedelta(days=32)).replace(day=1) if end else month
+    day = datetime.strptime(value, '%Y-%m-%d')
+    return day + timedelta(days=1) if end else day
+
+@bp.route('/files/export', methods=['GET', 'POST'])
+def export_files():
+    """
+    ZIP-архив файлов потоком: names (список или через запятую), from/to
+    (YYYY-MM-DD или YYYY-MM), type (text/image/video/audio/document),
+    compress=0 - без сжатия (тогда размер архива известен заранее,
+    если в выгрузке нет сообщений журнала и текстов вне локального диска)
+    """
+    params = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    names = params.get('names')
+    if isinstance(names, str):
+        names = [n for n in names.split(',') if n]
+    try:
+        entries = FileService.export_entries(
+            names=names,
+            date_from=parse_export_date(params.get('from')),
+            date_to=parse_export_date(params.get('to'), end=True),
+            kind=params.get('type'),
+            compress=str(params.get('compress', '1')) not in ('0', 'false')
+        )
+    except (InvalidFileError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if not entries:
+        return jsonify({"error": "Нет файлов для выгрузки"}), 404
+
+    # Чтение хранилища и deflate идут в пуле потоков, а не в хабе
+    archive = ZipStream(entries, offload=ExecutorService.run_io)
+    headers = {
+        'Content-Disposition': f"attachment; filename=export_{datetime.now():%Y-%m-%d_%H-%M-%S}.zip",
+        'X-Export-Files': str(len(entries))
+    }
+    length = archive.content_length()
+    if length is not None:
+        headers['Content-Length'] = str(length)
+    return Response(stream_with_context(iter(archive)), mimetype='application/zip',
+                    headers=headers, direct_passthrough=True)
+
+@bp.route('/files/content/<filename>', methods=['GET'])
+def get_file_content(filename):
+    """Окно текстового файла: ?offset=&limit= (байты) или ?line=&lines= (строки)"""
+    safe_filename = FileService.sanitize_filename(filename)
+    file_path = FileService.resolve_path(safe_filename) if safe_filename.endswith('.txt') else None
+    if file_path is None:
+        return jsonify({"error": "Файл не найден"}), 404
+
+    try:
+        max_bytes = current_app.config.get('TEXT_WINDOW_MAX_BYTES', 1024 * 1024)
+        window = TextService.read_window(
+            file_path,
+            request.args,
+            max_bytes,
+            current_app.config.get('TEXT_WINDOW_MAX_LINES', 5000)
+        )
+        if window is None:
+            window = TextService.read_bytes(file_path, 0, 64 * 1024)
+        return jsonify({"filename": safe_filename, **window})
+    except Exception as e:
+        current_app.logger.error(f"Content error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @bp.route('/files/delete/<filename>', methods=['DELETE'])
 def delete_file_handler(filename):  # Изменили имя функции
     try:
-        from app.services.file_service import FileService
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        filepath = Path(upload_folder) / filename
-        
-        if not filepath.exists():
+        if not FileService.delete_file(filename):
             return jsonify({"error": "File not found"}), 404
-            
-        filepath.unlink()
+
         return jsonify({"status": "success"})
         
     except Exception as e:
@@ -107,6 +331,8 @@ def delete_file_handler(filename):  # Изменили имя функции
 
 # YouTube интеграция
 @bp.route('/youtube/download', methods=['POST'])
+@rate_limit('youtube')
+@concurrency_limit('youtube')
 def download_youtube():
     data = request.json
     url = data.get('url')
@@ -119,40 +345,100 @@ def download_youtube():
         if not YouTubeService.validate_url(url):
             return jsonify({"error": "Неверный YouTube URL"}), 400
 
-        filename, title = YouTubeService.download_video(
+        tuning = YouTubeService.normalize_tuning(data.get('tuning'))
+    except YouTubeDownloadError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        result = YouTubeService.download(
             url,
-            current_app.config['YT_DOWNLOAD_FOLDER']
+            current_app.config['YT_DOWNLOAD_FOLDER'],
+            tuning
         )
+        filename = result['filename']
+        HlsService.schedule_auto('youtube', filename)
         
-        emit('youtube_progress', {
+        RealtimeService.emit('youtube_progress', {
             'status': 'complete',
             'filename': filename,
-            'title': title
-        }, namespace='/', broadcast=True)
+            'title': result['title'],
+            'throughput': result['throughput']
+        }, topic='youtube')
         
         return jsonify({
             "status": "success",
             "filename": filename,
-            "download_url": f"/downloads/{filename}"
+            "download_url": f"/downloads/{filename}",
+            "bytes": result['bytes'],
+            "seconds": result['seconds'],
+            "throughput": result['throughput'],
+            "postprocess": result.get('postprocess')
         })
+    except ShuttingDownError as e:
+        return jsonify({"error": str(e)}), 503
     except YouTubeDownloadError as e:
         return jsonify({"error": str(e)}), 500
 
-# Веб-сокет события
-@bp.route('/socket')
-def handle_socket_connection():
-    @socketio.on('connect')
-    def on_connect():
-        emit('connection_status', {'status': 'connected'})
+@bp.route('/youtube/tuning', methods=['GET', 'PUT'])
+def youtube_tuning():
+    """Глобальный лимит скорости и текущие доли активных загрузок"""
+    if request.method == 'PUT':
+        data = request.get_json(silent=True) or {}
+        try:
+            YouTubeService.bandwidth.configure(int(data.get('bandwidth_limit', 0)))
+        except (TypeError, ValueError):
+            return jsonify({"error": "bandwidth_limit должен быть числом"}), 400
 
-    @socketio.on('new_message')
-    def handle_new_message(data):
-        emit('new_message', data, broadcast=True)
+    return jsonify({
+        "defaults": YouTubeService.normalize_tuning(None),
+        "bandwidth": YouTubeService.bandwidth.status()
+    })
 
-    @socketio.on('request_progress')
-    def handle_progress_request(data):
-        # Логика обновления прогресса
-        emit('download_progress', {'progress': 0})
+@bp.route('/youtube/batch', methods=['POST'])
+@rate_limit('youtube')
+def download_youtube_batch():
+    """Пакетная загрузка: список ссылок и/или плейлистов"""
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls') or []
+    if isinstance(urls, str):
+        urls = urls.split()
+    if data.get('url'):
+        urls.append(data['url'])
+
+    try:
+        batch = YouTubeService.start_batch(
+            urls,
+            current_app.config['YT_DOWNLOAD_FOLDER'],
+            parallel=data.get('parallel'),
+            tuning=data.get('tuning')
+        )
+        return jsonify(batch), 202
+    except YouTubeDownloadError as e:
+        return jsonify({"error": str(e)}), 400
+
+@bp.route('/youtube/batch/<batch_id>', methods=['GET'])
+def get_youtube_batch(batch_id):
+    batch = YouTubeService.get_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Пакет не найден"}), 404
+    return jsonify(batch)
+
+@bp.route('/youtube/jobs', methods=['GET'])
+def get_youtube_jobs():
+    """Последние задачи загрузки: статус, попытки, скачанные байты"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify(JobStore.recent(limit))
+
+# Веб-сокет: подключения и подписки (обработчики в socket_handlers.py)
+@bp.route('/progress', methods=['GET'])
+def get_progress():
+    """Снимок текущих операций (?topic=youtube|files)"""
+    return jsonify(ProgressReporter.snapshot(request.args.get('topic')))
+
+@bp.route('/socket/stats', methods=['GET'])
+def get_socket_stats():
+    """Число подключений и подписчиков по темам"""
+    return jsonify(RealtimeService.stats())
 
 # Вспомогательные эндпоинты
 @bp.route('/config', methods=['GET'])
@@ -162,11 +448,51 @@ def get_config():
         "allowed_extensions": current_app.config['ALLOWED_EXTENSIONS']
     })
 
+@bp.route('/journal/status', methods=['GET'])
+def get_journal_status():
+    """Состояние журнала сообщений (режим TEXT_STORAGE_MODE=journal)"""
+    journal = FileService.journal()
+    if journal is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **journal.status()})
+
+@bp.route('/messages/<int:msg_id>/open', methods=['POST'])
+def open_message(msg_id):
+    """Материализовать сообщение журнала в .txt и открыть в редакторе"""
+    if FileService.journal() is None:
+        return jsonify({"error": "Журнал отключен"}), 404
+    try:
+        file_path = FileService.materialize(msg_id)
+        if file_path is None:
+            return jsonify({"error": "Сообщение не найдено"}), 404
+        FileService._open_file_in_thread(file_path)
+        return jsonify({"status": "success", "path": file_path})
+    except Exception as e:
+        current_app.logger.error(f"Open message error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/executor/stats', methods=['GET'])
+def get_executor_stats():
+    """Глубина очередей и загрузка пулов выполнения"""
+    return jsonify(ExecutorService.stats())
+
+@bp.route('/db/stats', methods=['GET'])
+def get_db_stats():
+    """База: диалект, пул соединений, выполнение в пуле потоков"""
+    return jsonify(Database.stats())
+
+@bp.route('/ratelimit/stats', methods=['GET'])
+def get_rate_limit_stats():
+    """Лимиты запросов и занятые слоты тяжелых операций"""
+    return jsonify(RateLimiter.stats())
+
 @bp.route('/downloads/<filename>')
 def download_file(filename):
     safe_filename = secure_filename(filename)
-    return send_from_directory(
-        current_app.config['UPLOAD_FOLDER'],
-        safe_filename,
-        as_attachment=True
-    )
\ No newline at end of file
+    url = None if wants_image_variant(safe_filename) else FileService.download_url(safe_filename)
+    if url:
+        return redirect(url)
+    file_path = FileService.resolve_path(safe_filename)
+    if file_path is None:
+        return jsonify({"error": "Файл не найден"}), 404
+    return send_upload(file_path, safe_filename)
\ No newline at end of file
@@ -0,0 +1,49 @@
+from flask import Blueprint, Response, jsonify, request
+from ..services.auth_service import admin_required
+from ..services.diagnostics_service import DiagnosticsService, MAX_PROFILE_SECONDS
+from ..services.executor_service import ExecutorService
+
+# Регистрируется только при DIAGNOSTICS_ENABLED
+bp = Blueprint('diagnostics', __name__, url_prefix='/api/diagnostics')
+
+
+@bp.route('/hub', methods=['GET'])
+@admin_required
+def hub_status():
+    """Задержка хаба и последние блокировки со стеками"""
+    return jsonify(DiagnosticsService.hub_status())
+
+
+@bp.route('/profile', methods=['POST'])
+@admin_required
+def run_profile():
+    """
+    Сэмплирующий профиль на ?seconds=N (до 60), интервал ?interval_ms=.
+    Ответ - folded stacks для flamegraph.pl / speedscope
+    """
+    seconds = request.args.get('seconds', 10, type=float)
+    interval = request.args.get('interval_ms', 5, type=float) / 1000
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return jsonify({"error": f"seconds должен быть от 0 до {MAX_PROFILE_SECONDS}"}), 400
+
+    profile = ExecutorService.run_io(DiagnosticsService.profile, seconds, max(interval, 0.001))
+    if profile is None:
+        return jsonify({"error": "Профилирование уже выполняется"}), 409
+    return Response(profile, mimetype='text/plain', headers={
+        'Content-Disposition': 'attachment; filename=profile.folded'
+    })
+
+
+@bp.route('/memory', methods=['GET', 'POST', 'DELETE'])
+@admin_required
+def memory():
+    """POST - включить tracemalloc, GET - снимок (?diff=0 без сравнения), DELETE - выключить"""
+    if request.method == 'POST':
+        return jsonify(DiagnosticsService.memory_start(request.args.get('frames', 10, type=int)))
+    if request.method == 'DELETE':
+        return jsonify(DiagnosticsService.memory_stop())
+    return jsonify(ExecutorService.run_io(
+        DiagnosticsService.memory_snapshot,
+        min(request.args.get('top', 20, type=int), 200),
+        request.args.get('diff', '1') != '0'
+    ))
@@ -0,0 +1,17 @@
+from flask import Blueprint, jsonify
+from ..services.lifecycle_service import Lifecycle
+
+bp = Blueprint('health', __name__)
+
+
+@bp.route('/healthz', methods=['GET'])
+def healthz():
+    """Живость: процесс отвечает (во время остановки тоже - чтобы его не убили раньше срока)"""
+    return jsonify(Lifecycle.liveness())
+
+
+@bp.route('/readyz', methods=['GET'])
+def readyz():
+    """Готовность: каталог загружен, пулы работают, бот подключен; при остановке - 503"""
+    ready, status = Lifecycle.readiness()
+    return jsonify(status), 200 if ready else 503
@@ -0,0 +1,118 @@
+import math
+import time
+from pathlib import Path
+from flask import Blueprint, jsonify, current_app, request, send_file
+from ..services.hls_service import HlsService
+from ..services.image_service import ImageService
+from ..services.file_service import FileService
+from ..core.exceptions import InvalidFileError
+
+bp = Blueprint('media', __name__, url_prefix='/api/media')
+
+PLAYLIST_MIMETYPE = 'application/vnd.apple.mpegurl'
+SEGMENT_MIMETYPE = 'video/mp2t'
+# Сегменты лежат в папке с версией исходника, поэтому не меняются никогда
+SEGMENT_CACHE = 'public, max-age=31536000, immutable'
+VARIANT_MAX_AGE = 86400
+
+
+def wants_image_variant(filename: str) -> bool:
+    """Запрошен уменьшенный вариант картинки (?size=<пиксели>, size=orig - оригинал)"""
+    size = request.args.get('size', 'orig')
+    return size != 'orig' and ImageService.enabled() and ImageService.is_image(filename)
+
+
+def send_image_variant(file_path: str, filename: str):
+    """
+    Вариант картинки под ?size= и Accept; None - отдавать оригинал
+    (вариантов еще нет - они ставятся в очередь).
+    """
+    if not wants_image_variant(filename):
+        return None
+    try:
+        size = int(request.args['size'])
+    except ValueError:
+        size = None
+    variant = ImageService.select(Path(file_path), request.headers.get('Accept', ''), size)
+    if variant is None:
+        return None
+    response = send_file(variant['path'], mimetype=variant['mimetype'], conditional=True, max_age=VARIANT_MAX_AGE)
+    response.vary.add('Accept')
+    return response
+
+
+@bp.route('/hls/<folder>/<filename>', methods=['POST'])
+def hls_package(folder, filename):
+    if not HlsService.enabled():
+        return jsonify({"error": "HLS отключен"}), 404
+    try:
+        # Явный запрос повторяет упаковку и после ошибки, не дожидаясь retry_at
+        return jsonify(HlsService.schedule(folder, filename, retry=True)), 202
+    except InvalidFileError as e:
+        return jsonify({"error": str(e)}), 404
+
+
+@bp.route('/hls/<folder>/<filename>/status', methods=['GET'])
+def hls_status(folder, filename):
+    try:
+        return jsonify(HlsService.status(folder, filename))
+    except InvalidFileError as e:
+        return jsonify({"error": str(e)}), 404
+
+
+@bp.route('/hls/<folder>/<filename>/<path:asset>', methods=['GET'])
+def hls_asset(folder, filename, asset):
+    """Плейлисты и сегменты; если нарезки еще нет - ставит ее в очередь и отвечает 202"""
+    try:
+        path = HlsService.asset_path(folder, filename, asset)
+        if path is None:
+            if asset.endswith('.m3u8') and HlsService.enabled():
+                job = HlsService.schedule(folder, filename)
+                if job['status'] == 'error':
+                    # Повтор не раньше retry_at: плеер не перезапускает упаковку каждые 2 секунды
+                    response = jsonify(job)
+                    response.status_code = 503
+                    response.headers['Retry-After'] = str(max(1, math.ceil(job['retry_at'] - time.time())))
+                    return response
+                if job['status'] != 'ready':
+                    response = jsonify(job)
+                    response.status_code = 202
+                    response.headers['Retry-After'] = '2'
+                    return response
+                path = HlsService.asset_path(folder, filename, asset)
+            if path is None:
+                return jsonify({"error": "Файл не найден"}), 404
+    except InvalidFileError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        current_app.logger.error(f"HLS asset error: {str(e)}")
+        return jsonify({"error": "Ошибка HLS"}), 500
+
+    if path.suffix == '.m3u8':
+        response = send_file(path, mimetype=PLAYLIST_MIMETYPE, conditional=True)
+        response.headers['Cache-Control'] = 'no-cache'
+    else:
+        response = send_file(path, mimetype=SEGMENT_MIMETYPE, conditional=True, max_age=31536000)
+        response.headers['Cache-Control'] = SEGMENT_CACHE
+    return response
+
+
+@bp.route('/image/<filename>', methods=['POST'])
+def image_variants(filename):
+    if not ImageService.enabled():
+        return jsonify({"error": "Варианты картинок отключены"}), 404
+    path = FileService.resolve_path(filename)
+    if path is None:
+        return jsonify({"error": "Файл не найден"}), 404
+    try:
+        return jsonify(ImageService.schedule(Path(path))), 202
+    except InvalidFileError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@bp.route('/image/<filename>/status', methods=['GET'])
+def image_status(filename):
+    path = FileService.resolve_path(filename)
+    if path is None or not ImageService.is_image(filename):
+        return jsonify({"error": "Файл не найден"}), 404
+    return jsonify(ImageService.status(Path(path)))
@@ -1,3 +1,4 @@
 from .file_service import FileService
+from .executor_service import ExecutorService
 
-__all__ = ['FileService']
\ No newline at end of file
+__all__ = ['FileService', 'ExecutorService']
\ No newline at end of file
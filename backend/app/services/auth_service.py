@@ -1,7 +1,9 @@
 # backend/app/services/auth_service.py
+import hmac
 import jwt
 from datetime import datetime, timedelta
-from flask import current_app
+from functools import wraps
+from flask import current_app, jsonify, request
 from jwt.exceptions import (
     InvalidTokenError,
     ExpiredSignatureError,
@@ -86,4 +88,28 @@ def get_current_user(token: str) -> dict:
         raise e
     except KeyError as e:
         current_app.logger.error(f"Неполный payload: {str(e)}")
-        raise InvalidTokenException("Неполные данные в токене") from e
\ No newline at end of file
+        raise InvalidTokenException("Неполные данные в токене") from e
+
+def admin_required(view):
+    """
+    Доступ только администратору: Bearer-токен равен ADMIN_TOKEN
+    или JWT пользователя из ADMIN_USERS
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get('Authorization', '')
+        token = header[7:].strip() if header.startswith('Bearer ') else ''
+        if not token:
+            return jsonify({"error": "Требуется авторизация"}), 401
+
+        admin_token = current_app.config.get('ADMIN_TOKEN')
+        if admin_token and hmac.compare_digest(token, admin_token):
+            return view(*args, **kwargs)
+        try:
+            user = get_current_user(token)
+        except AuthException:
+            return jsonify({"error": "Недействительный токен"}), 401
+        if user['username'] not in current_app.config.get('ADMIN_USERS', []):
+            return jsonify({"error": "Недостаточно прав"}), 403
+        return view(*args, **kwargs)
+    return wrapper
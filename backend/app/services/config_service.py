@@ -2,20 +2,92 @@
 import json
 import logging
 import os
+import time
+from typing import Any, Dict
+from sqlalchemy import select
+from ..models import Setting
+from .database_service import Database
 
 CONFIG_FILE = "app_config.json"
+DEFAULT_CONFIG = {"copy_to_clipboard": True}
 
-def get_config():
+settings = Setting.__table__
+
+
+class SettingsStore:
+    """
+    Настройки приложения в таблице settings (значения - JSON).
+    Прежний app_config.json переносится в базу при первом запуске.
+    """
+
+    @staticmethod
+    def all() -> Dict[str, Any]:
+        def run():
+            with Database.connect() as connection:
+                return connection.execute(select(settings.c.key, settings.c.value)).fetchall()
+        return {key: json.loads(value) for key, value in Database.run(run)}
+
+    @staticmethod
+    def get(key: str, default=None):
+        def run():
+            with Database.connect() as connection:
+                return connection.execute(select(settings.c.value).where(settings.c.key == key)).scalar()
+        value = Database.run(run)
+        return json.loads(value) if value is not None else default
+
+    @staticmethod
+    def update(values: Dict[str, Any]):
+        if not values:
+            return
+        now = time.time()
+        rows = [{'key': key, 'value': json.dumps(value), 'updated_at': now} for key, value in values.items()]
+
+        def run():
+            with Database.begin() as connection:
+                connection.execute(Database.upsert(settings, ['key'], ['value', 'updated_at']), rows)
+        Database.run(run)
+
+    @classmethod
+    def import_file(cls, path: str = CONFIG_FILE):
+        """Перенос app_config.json в базу (файл переименовывается в .imported)"""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as f:
+                values = json.load(f)
+            if not cls.all():
+                cls.update(values)
+            os.replace(path, path + '.imported')
+        except Exception as e:
+            logging.error(f"Config import error: {str(e)}")
+
+
+def _read_file() -> Dict[str, Any]:
     try:
         if not os.path.exists(CONFIG_FILE):
-            return {"copy_to_clipboard": True}
-        
+            return dict(DEFAULT_CONFIG)
+
         with open(CONFIG_FILE, "r") as f:
             return json.load(f)
     except Exception as e:
         logging.error(f"Config error: {str(e)}")
-        return {"copy_to_clipboard": True}
+        return dict(DEFAULT_CONFIG)
+
+
+def get_config():
+    """Настройки из базы; до ее инициализации (или при ошибке) - из app_config.json"""
+    if Database.ready():
+        try:
+            return {**DEFAULT_CONFIG, **SettingsStore.all()}
+        except Exception as e:
+            logging.error(f"Config error: {str(e)}")
+            return dict(DEFAULT_CONFIG)
+    return _read_file()
+
 
 def save_config(config):
+    if Database.ready():
+        SettingsStore.update(config)
+        return
     with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f)
\ No newline at end of file
+        json.dump(config, f)
@@ -0,0 +1,261 @@
+# app/services/database_service.py
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from sqlalchemy import Table, create_engine, event, func, select, text
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import NullPool
+from ..extensions import db
+from .executor_service import ExecutorService
+
+try:
+    from psycogreen.eventlet import patch_psycopg
+except ImportError:  # psycogreen не установлен - запросы к PostgreSQL уходят в пул потоков
+    patch_psycopg = None
+
+try:
+    from eventlet.patcher import original
+    _thread_ident = original('threading').get_ident
+except ImportError:  # запуск без eventlet (скрипты, отладка)
+    import threading
+    _thread_ident = threading.get_ident
+
+try:
+    from flask_migrate import Migrate, upgrade as migrate_upgrade
+except ImportError:  # Flask-Migrate не установлен - схема создается через create_all
+    Migrate = None
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / 'migrations'
+DIALECT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert, 'mysql': mysql.insert}
+# Поток, в котором работает хаб eventlet (модуль импортируется из create_app при запуске)
+_MAIN_THREAD = _thread_ident()
+
+
+def normalize_url(url: str) -> str:
+    """postgres:// (Heroku, docker-compose) SQLAlchemy 2 не понимает - нужен postgresql://"""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def _sqlite_pragmas(busy_timeout_ms: int) -> Callable:
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+    return on_connect
+
+
+class Database:
+    """
+    Общая база приложения (Flask-SQLAlchemy): задачи YouTube, теги и
+    метаданные файлов, индекс сообщений журнала, настройки.
+    PostgreSQL - при DATABASE_URL, иначе SQLite в режиме WAL.
+    Под eventlet драйвер не должен блокировать хаб: psycopg2 становится
+    кооперативным через psycogreen, а вызовы SQLite (и PostgreSQL без
+    psycogreen) выполняются через run() в пуле потоков - без пула
+    соединений, чтобы его блокировки не делились между хабом и потоками.
+    С psycogreen запросы идут прямо из гринлетов через пул соединений, а
+    редкие запросы из рабочих потоков (хуки yt-dlp, сверка каталога) - через
+    отдельный движок без пула. Сервисы работают через SQLAlchemy Core
+    (Database.begin/connect) и не зависят от контекста приложения.
+    """
+    engine: Optional[Engine] = None
+    _thread_engine: Optional[Engine] = None
+    dialect = ''
+    _offload = False
+    _last_error = ''
+
+    @classmethod
+    def init_app(cls, app):
+        uri = normalize_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        url = make_url(uri)
+        cls.dialect = url.get_backend_name()
+        green = ExecutorService.green()
+        if green and cls.dialect == 'postgresql':
+            if patch_psycopg is not None:
+                patch_psycopg()
+            else:
+                logger.warning("psycogreen не установлен - запросы к PostgreSQL выполняются в пуле потоков")
+        cls._offload = green and (cls.dialect == 'sqlite' or (cls.dialect == 'postgresql' and patch_psycopg is None))
+
+        app.config['SQLALCHEMY_DATABASE_URI'] = uri
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            **cls._engine_options(app.config),
+            **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        }
+        db.init_app(app)
+        if Migrate is not None:
+            Migrate(app, db, directory=str(MIGRATIONS_DIR))
+
+        # create_app вызывается и сервером, и ботом: сервисы работают с первым движком процесса
+        if cls.engine is not None:
+            return
+        with app.app_context():
+            engine = db.engine
+            if cls.dialect == 'sqlite':
+                event.listen(engine, 'connect', _sqlite_pragmas(app.config.get('DB_SQLITE_BUSY_TIMEOUT_MS', 5000)))
+            if app.config.get('DATABASE_AUTO_MIGRATE', True):
+                cls._prepare_schema()
+        if green and not cls._offload:
+            cls._thread_engine = create_engine(uri, poolclass=NullPool, pool_pre_ping=False,
+                                               connect_args=app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('connect_args', {}))
+        cls.engine = engine
+        logger.info(
+            f"Database: {url.render_as_string(hide_password=True)} "
+            f"({'пул потоков' if cls._offload else 'пул соединений'})"
+        )
+
+    @classmethod
+    def _engine_options(cls, config) -> Dict:
+        if cls.dialect == 'sqlite':
+            options = {'connect_args': {'check_same_thread': False}}
+            if cls._offload:
+                # Соединение SQLite - это открытие файла: пул не нужен, а его блокировки под monkey_patch зеленые
+                options['poolclass'] = NullPool
+            return options
+        options = {'pool_pre_ping': config.get('DB_POOL_PRE_PING', True)}
+        if cls._offload:
+            options['poolclass'] = NullPool
+        else:
+            options.update(
+                pool_size=config.get('DB_POOL_SIZE', 10),
+                max_overflow=config.get('DB_MAX_OVERFLOW', 20),
+                pool_timeout=config.get('DB_POOL_TIMEOUT', 10),
+                pool_recycle=config.get('DB_POOL_RECYCLE', 1800)
+            )
+        if cls.dialect == 'postgresql':
+            options['connect_args'] = {'connect_timeout': config.get('DB_CONNECT_TIMEOUT', 5)}
+        return options
+
+    @staticmethod
+    def _prepare_schema():
+        """Миграции Alembic до последней версии; без Flask-Migrate - создание недостающих таблиц"""
+        from .. import models  # noqa: F401 - модели регистрируются в metadata
+        if Migrate is not None and MIGRATIONS_DIR.is_dir():
+            migrate_upgrade(directory=str(MIGRATIONS_DIR))
+        else:
+            db.create_all()
+
+    @classmethod
+    def ready(cls) -> bool:
+        return cls.engine is not None
+
+    @classmethod
+    def current_engine(cls) -> Engine:
+        """Движок для вызывающего потока: из рабочих потоков пула (под psycogreen) - без пула соединений"""
+        if cls._thread_engine is not None and _thread_ident() != _MAIN_THREAD:
+            return cls._thread_engine
+        return cls.engine
+
+    @classmethod
+    def begin(cls):
+        """Соединение с транзакцией (with Database.begin() as connection)"""
+        return cls.current_engine().begin()
+
+    @classmethod
+    def connect(cls):
+        return cls.current_engine().connect()
+
+    @classmethod
+    def run(cls, func: Callable, *args, **kwargs):
+        """Выполнить функцию с запросами к базе, не блокируя хаб (для SQLite - в пуле потоков)"""
+        if cls._offload:
+            return ExecutorService.run_io(func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    @classmethod
+    def upsert(cls, table: Table, keys: Iterable[str], update: Iterable[str] = ()):
+        """INSERT с разрешением конфликта по ключу: update - обновляемые колонки, пусто - пропустить дубликат"""
+        insert = DIALECT_INSERTS.get(cls.dialect)
+        if insert is None:
+            raise RuntimeError(f"Upsert не поддерживается для {cls.dialect}")
+        stmt = insert(table)
+        update = list(update)
+        if cls.dialect == 'mysql':
+            if not update:
+                return stmt.prefix_with('IGNORE')
+            return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update})
+        if not update:
+            return stmt.on_conflict_do_nothing(index_elements=list(keys))
+        return stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: stmt.excluded[column] for column in update}
+        )
+
+    @classmethod
+    def import_sqlite(cls, path, table: Table) -> int:
+        """
+        Перенос таблицы из отдельного файла SQLite прежних версий (задачи,
+        теги). Строки копируются, только если таблица в базе пуста; файл
+        затем переименовывается в .imported. Блокирующий вызов - через run().
+        """
+        path = Path(path)
+        if not path.is_file():
+            return 0
+        conn = sqlite3.connect(str(path))
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = [dict(row) for row in conn.execute(f"SELECT * FROM {table.name}")]
+        except sqlite3.Error as e:
+            logger.warning(f"Legacy {path.name}: {str(e)}")
+            rows = []
+        finally:
+            conn.close()
+
+        columns = set(table.c.keys())
+        rows = [{key: value for key, value in row.items() if key in columns} for row in rows]
+        with cls.begin() as connection:
+            existing = connection.execute(select(func.count()).select_from(table)).scalar()
+            if rows and not existing:
+                connection.execute(table.insert(), rows)
+        path.rename(path.with_name(path.name + '.imported'))
+        imported = len(rows) if not existing else 0
+        logger.info(f"Legacy {path.name}: перенесено {imported} строк в {table.name}")
+        return imported
+
+    @classmethod
+    def health(cls) -> Tuple[bool, str]:
+        """Соединение с базой (SELECT 1)"""
+        if cls.engine is None:
+            return False, 'not initialized'
+
+        def ping():
+            started = time.monotonic()
+            with cls.connect() as connection:
+                connection.execute(text('SELECT 1'))
+            return time.monotonic() - started
+
+        try:
+            elapsed = cls.run(ping)
+        except Exception as e:
+            cls._last_error = str(e)
+            return False, str(e)
+        return True, f"{cls.dialect}, {elapsed * 1000:.0f} ms"
+
+    @classmethod
+    def stats(cls) -> Dict:
+        if cls.engine is None:
+            return {'enabled': False}
+        return {
+            'enabled': True,
+            'dialect': cls.dialect,
+            'offload': cls._offload,
+            'pool': cls.engine.pool.status(),
+            'last_error': cls._last_error or None
+        }
+
+    @classmethod
+    def dispose(cls):
+        """Закрыть соединения пула при остановке"""
+        for engine in (cls.engine, cls._thread_engine):
+            if engine is not None:
+                engine.dispose()
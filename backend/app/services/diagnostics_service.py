@@ -0,0 +1,246 @@
+# app/services/diagnostics_service.py
+import linecache
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from typing import Dict, List, Optional
+from .executor_service import make_lock
+
+try:
+    import eventlet
+    from eventlet.patcher import is_monkey_patched, original
+except ImportError:
+    eventlet = None
+
+logger = logging.getLogger(__name__)
+
+# Настоящие потоки и сон ОС: сторож и профилировщик не должны зависеть от хаба
+if eventlet:
+    _thread = original('threading')
+    _sleep = original('time').sleep
+    _get_ident = original('_thread').get_ident
+else:
+    _thread = threading
+    _sleep = time.sleep
+    _get_ident = threading.get_ident
+
+MAX_PROFILE_SECONDS = 60
+MAX_STACK_DEPTH = 64
+
+
+def _format_stack(frame, limit: int = MAX_STACK_DEPTH) -> List[str]:
+    """Стек кадра от внешнего вызова к внутреннему: 'file:line func'"""
+    stack = []
+    while frame is not None and len(stack) < limit:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _folded_frames(frame) -> str:
+    """Стек в формате folded (flamegraph.pl, speedscope): func (file:line);..."""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+
+class DiagnosticsService:
+    """
+    Диагностика хаба eventlet: детектор блокировок, сэмплирующий
+    профилировщик и снимки tracemalloc. Все выключено, пока не задано
+    DIAGNOSTICS_ENABLED; детектор в простое - один гринлет, раз в
+    threshold/3 обновляющий метку времени, и поток-сторож, сверяющий ее.
+    """
+    _enabled = False
+    _threshold = 0.3
+    _heartbeat = 0.0
+    _hub_ident: Optional[int] = None
+    _blocks: deque = deque(maxlen=50)
+    _blocks_total = 0
+    _lock = make_lock()
+    _profiling = make_lock()
+    _detector_started = False
+    _memory_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    @classmethod
+    def init_app(cls, app):
+        cls._enabled = app.config.get('DIAGNOSTICS_ENABLED', False)
+        cls._threshold = app.config.get('HUB_BLOCK_THRESHOLD_MS', 300) / 1000
+        if not cls._enabled or cls._detector_started:
+            return
+        if eventlet is None or not is_monkey_patched('thread'):
+            logger.info("Hub block detector: eventlet не активен, детектор не запущен")
+            return
+        cls._detector_started = True
+        cls._heartbeat = time.monotonic()
+        eventlet.spawn_n(cls._run_heartbeat)
+        _thread.Thread(target=cls._run_watchdog, name='hub-watchdog', daemon=True).start()
+        logger.info(f"Hub block detector: порог {cls._threshold * 1000:.0f} мс")
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls._enabled
+
+    # ======================
+    # ДЕТЕКТОР БЛОКИРОВОК ХАБА
+    # ======================
+    @classmethod
+    def _run_heartbeat(cls):
+        """Гринлет в хабе: если он не успевает обновить метку, хаб кем-то занят"""
+        cls._hub_ident = _get_ident()
+        interval = cls._threshold / 3
+        while cls._detector_started:
+            cls._heartbeat = time.monotonic()
+            eventlet.sleep(interval)
+            # Лог пишется отсюда, а не из сторожа: блокировки logging - зеленые
+            lag = time.monotonic() - cls._heartbeat
+            if lag >= cls._threshold:
+                with cls._lock:
+                    block = cls._blocks[-1] if cls._blocks and not cls._blocks[-1]['logged'] else None
+                    if block is not None:
+                        block.update(duration_ms=round(lag * 1000), logged=True)
+                if block is not None:
+                    logger.warning(
+                        f"Hub blocked for {block['duration_ms']} ms at: "
+                        f"{' <- '.join(reversed(block['stack'][-3:]))}"
+                    )
+
+    @classmethod
+    def _run_watchdog(cls):
+        """Поток ОС: при зависшей метке снимает стек потока хаба (это и есть блокирующий код)"""
+        current: Optional[Dict] = None
+        interval = cls._threshold / 3
+        while cls._detector_started:
+            _sleep(interval)
+            stalled = time.monotonic() - cls._heartbeat
+            if stalled < cls._threshold:
+                current = None
+                continue
+
+            frame = sys._current_frames().get(cls._hub_ident)
+            if frame is None:
+                continue
+            if current is None:
+                current = {
+                    'started': time.time() - stalled,
+                    'duration_ms': 0,
+                    'stack': _format_stack(frame),
+                    'logged': False
+                }
+                with cls._lock:
+                    cls._blocks.append(current)
+                    cls._blocks_total += 1
+            with cls._lock:
+                current['duration_ms'] = round(stalled * 1000)
+
+    @classmethod
+    def hub_status(cls) -> Dict:
+        with cls._lock:
+            blocks = [{k: v for k, v in block.items() if k != 'logged'} for block in cls._blocks]
+        return {
+            'enabled': cls._detector_started,
+            'threshold_ms': round(cls._threshold * 1000),
+            'lag_ms': round((time.monotonic() - cls._heartbeat) * 1000) if cls._detector_started else None,
+            'blocks_total': cls._blocks_total,
+            'blocks': blocks[::-1]
+        }
+
+    # ======================
+    # ПРОФИЛИРОВЩИК
+    # ======================
+    @classmethod
+    def profile(cls, seconds: float, interval: float = 0.005) -> Optional[str]:
+        """
+        Сэмплирование стеков всех потоков ОС (хаб и пулы) в течение seconds.
+        Возвращает профиль в формате folded или None, если профилировщик уже занят.
+        Блокирующий вызов - выполнять в run_io.
+        """
+        if not cls._profiling.acquire(blocking=False):
+            return None
+        try:
+            seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+            own = _get_ident()
+            names = {t.ident: t.name for t in _thread.enumerate()}
+            if cls._hub_ident is not None:
+                names[cls._hub_ident] = 'hub'
+            samples: Counter = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    thread_name = names.get(ident, f'thread-{ident}')
+                    samples[f"{thread_name};{_folded_frames(frame)}"] += 1
+                _sleep(interval)
+            return '\n'.join(f"{stack} {count}" for stack, count in samples.most_common())
+        finally:
+            cls._profiling.release()
+
+    # ======================
+    # ПАМЯТЬ
+    # ======================
+    @classmethod
+    def memory_start(cls, frames: int = 10) -> Dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            cls._memory_snapshot = None
+        return cls.memory_status()
+
+    @classmethod
+    def memory_stop(cls) -> Dict:
+        tracemalloc.stop()
+        cls._memory_snapshot = None
+        return cls.memory_status()
+
+    @staticmethod
+    def memory_status() -> Dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {'tracing': tracing, 'current': current, 'peak': peak}
+
+    @classmethod
+    def memory_snapshot(cls, top: int = 20, diff: bool = True) -> Dict:
+        """
+        Топ мест выделения памяти; при diff - разница с предыдущим снимком.
+        Блокирующий вызов - выполнять в run_io.
+        """
+        if not tracemalloc.is_tracing():
+            return {**cls.memory_status(), 'stats': []}
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        previous, cls._memory_snapshot = cls._memory_snapshot, snapshot
+        if diff and previous is not None:
+            stats = [
+                {
+                    'location': cls._location(stat.traceback),
+                    'size': stat.size,
+                    'size_diff': stat.size_diff,
+                    'count': stat.count,
+                    'count_diff': stat.count_diff
+                }
+                for stat in snapshot.compare_to(previous, 'lineno')[:top]
+            ]
+        else:
+            stats = [
+                {'location': cls._location(stat.traceback), 'size': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:top]
+            ]
+        return {**cls.memory_status(), 'diff': bool(diff and previous is not None), 'stats': stats}
+
+    @staticmethod
+    def _location(traceback) -> str:
+        frame = traceback[0]
+        line = linecache.getline(frame.filename, frame.lineno).strip()
+        return f"{frame.filename}:{frame.lineno} {line}"
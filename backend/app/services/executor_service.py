@@ -0,0 +1,329 @@
+# app/services/executor_service.py
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from flask import current_app, has_app_context
+from ..core.exceptions import ExecutorBusyError
+
+try:
+    import eventlet
+    import eventlet.queue
+    from eventlet import tpool
+    from eventlet.patcher import is_monkey_patched, original
+except ImportError:  # запуск без eventlet (скрипты, отладка)
+    eventlet = None
+    tpool = None
+
+logger = logging.getLogger(__name__)
+
+# Настоящая блокировка ОС: счетчики обновляются и из хаба, и из потоков tpool
+_Lock = original('threading').Lock if eventlet else threading.Lock
+# Сон, который действительно блокирует поток (для кода внутри пулов)
+_sleep = original('time').sleep if eventlet else time.sleep
+
+
+def make_lock():
+    """Блокировка ОС, общая для гринлетов хаба и рабочих потоков"""
+    return _Lock()
+
+
+def thread_sleep(seconds: float):
+    """Пауза рабочего потока пула, не затрагивающая хаб"""
+    _sleep(seconds)
+
+
+def _green() -> bool:
+    """Работаем ли мы под eventlet.monkey_patch()"""
+    return eventlet is not None and is_monkey_patched('thread')
+
+
+class _PoolStats:
+    """Счетчики загрузки одного пула"""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.started_at = time.monotonic()
+        self._lock = _Lock()
+
+    def submitted(self):
+        with self._lock:
+            self.pending += 1
+
+    def started(self):
+        with self._lock:
+            self.active += 1
+
+    def finished(self, elapsed: float, ok: bool, was_active: bool = True):
+        with self._lock:
+            self.pending -= 1
+            if was_active:
+                self.active -= 1
+            self.busy_time += elapsed
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            # Для процессов момент старта не виден, считаем занятыми min(pending, workers)
+            active = self.active if self.name == 'io' else min(self.pending, self.workers)
+            uptime = max(time.monotonic() - self.started_at, 1e-6)
+            return {
+                'workers': self.workers,
+                'active': active,
+                'queued': max(self.pending - active, 0),
+                'completed': self.completed,
+                'failed': self.failed,
+                'utilization': round(active / self.workers, 3) if self.workers else 0.0,
+                'avg_utilization': round(min(self.busy_time / (uptime * max(self.workers, 1)), 1.0), 3)
+            }
+
+
+class ExecutorService:
+    """
+    Слой выполнения тяжелых задач вне хаба eventlet.
+    Блокирующий I/O уходит в пул настоящих потоков (eventlet.tpool),
+    CPU-задачи - в пул процессов. Вызывающий гринлет ждет результат,
+    не останавливая остальные соединения.
+    """
+    _app = None
+    _process_pool: Optional[ProcessPoolExecutor] = None
+    _thread_pool: Optional[ThreadPoolExecutor] = None
+    _process_workers = 0
+    _thread_workers = 0
+    _max_queue = 0
+    _io_stats: Optional[_PoolStats] = None
+    _cpu_stats: Optional[_PoolStats] = None
+    _init_lock = _Lock()
+
+    @classmethod
+    def init_app(cls, app):
+        cls._app = app
+        cls._process_workers = int(app.config.get('EXECUTOR_PROCESS_WORKERS', 1))
+        cls._thread_workers = max(1, int(app.config.get('EXECUTOR_THREAD_WORKERS', 8)))
+        cls._max_queue = int(app.config.get('EXECUTOR_MAX_QUEUE', 64))
+        cls._io_stats = _PoolStats('io', cls._thread_workers)
+        cls._cpu_stats = _PoolStats('cpu', cls._process_workers)
+
+        if _green():
+            # Размер пула tpool задается до первого вызова
+            tpool.set_num_threads(cls._thread_workers)
+        logger.info(
+            f"Executor initialized: processes={cls._process_workers}, "
+            f"threads={cls._thread_workers}, green={_green()}"
+        )
+
+    @staticmethod
+    def green() -> bool:
+        """Работаем ли под eventlet (блокирующие драйверы нужно уводить из хаба)"""
+        return _green()
+
+    @classmethod
+    def _ensure_initialized(cls):
+        if cls._io_stats is None:
+            with cls._init_lock:
+                if cls._io_stats is None:
+                    cls.init_app(
+                        current_app._get_current_object() if has_app_context()
+                        else SimpleNamespace(config={})
+                    )
+
+    @classmethod
+    def _check_queue(cls, stats: _PoolStats):
+        if cls._max_queue and stats.pending - min(stats.pending, stats.workers) >= cls._max_queue:
+            raise ExecutorBusyError(f"Очередь пула '{stats.name}' переполнена")
+
+    @staticmethod
+    def _bind_context(func: Callable) -> Callable:
+        """Переносит контекст Flask-приложения в рабочий поток"""
+        if not has_app_context():
+            return func
+        app = current_app._get_current_object()
+
+        def wrapper(*args, **kwargs):
+            with app.app_context():
+                return func(*args, **kwargs)
+        return wrapper
+
+    @classmethod
+    def run_io(cls, func: Callable, *args, **kwargs):
+        """Выполнить блокирующий вызов в пуле потоков и дождаться результата"""
+        cls._ensure_initialized()
+        stats = cls._io_stats
+        cls._check_queue(stats)
+        target = cls._bind_context(func)
+        state = {'active': False}
+
+        def job():
+            stats.started()
+            state['active'] = True
+            return target(*args, **kwargs)
+
+        stats.submitted()
+        started = time.monotonic()
+        ok = False
+        try:
+            if _green():
+                result = tpool.execute(job)
+            else:
+                result = cls._get_thread_pool().submit(job).result()
+            ok = True
+            return result
+        finally:
+            stats.finished(time.monotonic() - started, ok, was_active=state['active'])
+
+    @classmethod
+    def run_cpu(cls, func: Callable, *args, **kwargs):
+        """
+        Выполнить CPU-задачу в пуле процессов.
+        func должна быть функцией уровня модуля (передается через pickle).
+        """
+        cls._ensure_initialized()
+        if cls._process_workers <= 0:
+            return cls.run_io(func, *args, **kwargs)
+
+        stats = cls._cpu_stats
+        cls._check_queue(stats)
+        stats.submitted()
+        started = time.monotonic()
+        ok = False
+        try:
+            try:
+                future = cls._get_process_pool().submit(func, *args, **kwargs)
+            except BrokenProcessPool:
+                logger.error("Process pool broken, recreating")
+                cls._process_pool = None
+                future = cls._get_process_pool().submit(func, *args, **kwargs)
+            result = cls._wait(future)
+            ok = True
+            return result
+        finally:
+            stats.finished(time.monotonic() - started, ok)
+
+    @classmethod
+    def spawn(cls, func: Callable, *args, **kwargs):
+        """Запустить функцию в фоне (для побочных эффектов), ошибки только логируются"""
+        target = cls._bind_context(func)
+
+        def runner():
+            try:
+                target(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Background task {getattr(func, '__name__', func)} failed: {str(e)}")
+
+        if _green():
+            eventlet.spawn_n(runner)
+        else:
+            threading.Thread(target=runner, daemon=True).start()
+
+    @classmethod
+    def imap_unordered(cls, func: Callable, items: Iterable, limit: int) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+        """
+        Параллельно применяет func к элементам, не более limit одновременно.
+        Отдает (item, result, error) по мере завершения.
+        func выполняется в гринлете (или потоке без eventlet) и сама
+        решает, что отправить в run_io/run_cpu.
+        """
+        items = list(items)
+        limit = max(1, min(limit, len(items) or 1))
+        target = cls._bind_context(func)
+
+        def call(item):
+            try:
+                return item, target(item), None
+            except Exception as e:
+                return item, None, e
+
+        if _green():
+            pool = eventlet.GreenPool(limit)
+            results = eventlet.queue.LightQueue()
+            for item in items:
+                pool.spawn_n(lambda i: results.put(call(i)), item)
+            for _ in items:
+                yield results.get()
+        else:
+            with ThreadPoolExecutor(max_workers=limit, thread_name_prefix='map-worker') as pool:
+                for future in as_completed([pool.submit(call, item) for item in items]):
+                    yield future.result()
+
+    @staticmethod
+    def _wait(future):
+        """Ожидание future без блокировки хаба"""
+        if not _green():
+            return future.result()
+        delay = 0.005
+        while not future.done():
+            eventlet.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        return future.result()
+
+    @classmethod
+    def _get_thread_pool(cls) -> ThreadPoolExecutor:
+        if cls._thread_pool is None:
+            with cls._init_lock:
+                if cls._thread_pool is None:
+                    cls._thread_pool = ThreadPoolExecutor(
+                        max_workers=cls._thread_workers,
+                        thread_name_prefix='io-worker'
+                    )
+        return cls._thread_pool
+
+    @classmethod
+    def _get_process_pool(cls) -> ProcessPoolExecutor:
+        if cls._process_pool is None:
+            with cls._init_lock:
+                if cls._process_pool is None:
+                    # spawn: дочерние процессы не наследуют состояние хаба eventlet
+                    cls._process_pool = ProcessPoolExecutor(
+                        max_workers=cls._process_workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+        return cls._process_pool
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """Глубина очередей и загрузка пулов"""
+        cls._ensure_initialized()
+        return {
+            'green': _green(),
+            'pid': os.getpid(),
+            'io': cls._io_stats.snapshot(),
+            'cpu': cls._cpu_stats.snapshot()
+        }
+
+    @classmethod
+    def health(cls) -> Tuple[bool, str]:
+        """Пулы работают: инициализированы, не остановлены, пул процессов не сломан"""
+        if cls._io_stats is None:
+            return False, 'not initialized'
+        if cls._thread_pool is not None and cls._thread_pool._shutdown:
+            return False, 'thread pool stopped'
+        if cls._process_pool is not None and cls._process_pool._broken:
+            return False, 'process pool broken'
+        io = cls._io_stats.snapshot()
+        return True, f"io {io['active']}/{io['workers']}, queued {io['queued']}"
+
+    @classmethod
+    def shutdown(cls, wait: bool = True):
+        if cls._process_pool is not None:
+            cls._process_pool.shutdown(wait=wait, cancel_futures=not wait)
+            cls._process_pool = None
+        if cls._thread_pool is not None:
+            cls._thread_pool.shutdown(wait=wait, cancel_futures=not wait)
+            cls._thread_pool = None
+        if _green() and wait:
+            tpool.killall()
+        logger.info("Executor pools stopped")
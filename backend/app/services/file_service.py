@@ -1,18 +1,62 @@
+import io
+import mimetypes
 import os
 import re
+import hashlib
 import logging
 import platform
 import subprocess
+import time
 from pathlib import Path
 from datetime import datetime
 from threading import Thread
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Tuple, Union
 from flask import current_app
+from ..core.compression import compressible
+from ..core.exceptions import InvalidFileError
+from ..core.zipstream import ZipEntry
+from .executor_service import ExecutorService
+from .hls_service import HlsService
+from .image_service import ImageService
+from .index_service import FileIndex, MessageIndex
+from .journal_service import MessageJournal
+from .storage_service import StorageService
+from .tag_store import TagStore, check_tags
+from .text_codec import TextCodec, is_compressed_data
+from .telegram_cache_service import TelegramFileCache
+from .text_service import TextService
+from .watcher_service import WatcherService
 
 logger = logging.getLogger(__name__)
 
+# Виртуальное имя сообщения из журнала: text_<время>_j<id>.txt
+JOURNAL_NAME_RE = re.compile(r'^text_[\d_-]+_j(\d+)\.txt$')
+
+# Фильтр выгрузки по типу файла
+EXPORT_TYPES = {
+    'text': ('.txt', '.md', '.json', '.csv', '.log'),
+    'image': ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.svg', '.heic'),
+    'video': ('.mp4', '.webm', '.mkv', '.mov', '.m4v', '.avi'),
+    'audio': ('.mp3', '.m4a', '.ogg', '.opus', '.wav', '.flac'),
+    'document': ('.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt'),
+}
+
+BATCH_OPERATIONS = ('delete', 'move', 'tag')
+
+# Файлы, принимаемые частями по Socket.IO, до завершения лежат в скрытой папке загрузок
+TRANSFER_DIR = '.transfers'
+
+def _hash_file(filepath: str, algorithm: str = 'sha256', chunk_size: int = 1024 * 1024) -> str:
+    """Хеш содержимого файла (выполняется в пуле процессов)"""
+    digest = hashlib.new(algorithm)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 class FileService:
     _app = None
+    _journal: Optional[MessageJournal] = None
 
     @classmethod
     def init_app(cls, app):
@@ -20,34 +64,518 @@ class FileService:
         upload_folder = app.config['UPLOAD_FOLDER']
         os.makedirs(upload_folder, exist_ok=True)
         logger.info(f"Upload folder initialized: {upload_folder}")
+        TagStore.open(app.config.get('FILE_TAGS_DB') or Path(app.instance_path) / 'tags.sqlite3')
+
+        # create_app вызывается и сервером, и ботом: журнал открывается один раз на процесс
+        if app.config.get('TEXT_STORAGE_MODE') == 'journal' and cls._journal is None:
+            cls._journal = MessageJournal(
+                app.config['JOURNAL_DIR'],
+                segment_size=app.config.get('JOURNAL_SEGMENT_SIZE', 64 * 1024 * 1024),
+                fsync_policy=app.config.get('JOURNAL_FSYNC_POLICY', 'interval'),
+                commit_interval=app.config.get('JOURNAL_COMMIT_INTERVAL_MS', 50) / 1000,
+                compact_ratio=app.config.get('JOURNAL_COMPACT_RATIO', 0.3)
+            ).open()
+            ExecutorService.spawn(cls._journal.run_committer)
+            ExecutorService.spawn(MessageIndex.sync, cls._journal, app.config.get('TEXT_PREVIEW_BYTES', 1024))
+            ExecutorService.spawn(cls._run_compactor, app.config.get('JOURNAL_COMPACT_INTERVAL', 600))
+
+    @classmethod
+    def _run_compactor(cls, interval: int):
+        """Периодическая компакция журнала в пуле потоков"""
+        while cls._journal is not None:
+            time.sleep(interval)
+            try:
+                ExecutorService.run_io(cls._journal.compact)
+            except Exception as e:
+                logger.error(f"Journal compaction error: {str(e)}")
+
+    @classmethod
+    def journal(cls) -> Optional[MessageJournal]:
+        return cls._journal
+
+    @classmethod
+    def journal_health(cls) -> Tuple[bool, str]:
+        if cls._journal is None:
+            return True, 'files'
+        return True, f"{cls._journal.status()['messages']} messages"
+
+    @classmethod
+    def close_journal(cls):
+        """Сбросить журнал на диск при остановке (компакция и group commit завершаются)"""
+        journal, cls._journal = cls._journal, None
+        if journal is not None:
+            journal.close()
+
+    @staticmethod
+    def journal_filename(entry: Dict) -> str:
+        stamp = datetime.fromtimestamp(entry['timestamp']).strftime('%Y-%m-%d_%H-%M-%S')
+        return f"text_{stamp}_j{entry['id']}.txt"
+
+    @classmethod
+    def journal_id(cls, filename: str) -> Optional[int]:
+        """id сообщения журнала по виртуальному имени файла"""
+        match = JOURNAL_NAME_RE.match(filename)
+        return int(match.group(1)) if match and cls._journal is not None else None
+
+    @classmethod
+    def _materialized_path(cls, msg_id: int) -> Path:
+        return Path(cls._journal.directory) / 'materialized' / f"{msg_id}.txt"
+
+    @classmethod
+    def materialize(cls, msg_id: int) -> Optional[str]:
+        """Отдельный .txt для сообщения журнала (создается по требованию и переиспользуется)"""
+        path = cls._materialized_path(msg_id)
+        if path.exists():
+            return str(path)
+        message = cls._journal.get(msg_id)
+        if message is None:
+            return None
+
+        def writer():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(message['text'])
+            os.replace(tmp_path, path)
+
+        ExecutorService.run_io(writer)
+        return str(path)
+
+    @classmethod
+    def resolve_path(cls, filename: str) -> Optional[str]:
+        """
+        Путь на диске к файлу из хранилища (для S3 - кешированная копия)
+        или к материализованному сообщению журнала
+        """
+        filename = cls.sanitize_filename(filename)
+        msg_id = cls.journal_id(filename)
+        if msg_id is not None:
+            return cls.materialize(msg_id)
+        try:
+            return ExecutorService.run_io(StorageService.local_copy, filename)
+        except InvalidFileError:
+            return None
+
+    @classmethod
+    def download_url(cls, filename: str) -> Optional[str]:
+        """Прямая ссылка на файл мимо приложения (presigned для S3), None - отдавать самим"""
+        filename = cls.sanitize_filename(filename)
+        if StorageService.is_local() or cls.journal_id(filename) is not None:
+            return None
+        try:
+            return StorageService.url(filename, download_name=filename)
+        except InvalidFileError:
+            return None
+
+    @classmethod
+    def delete_file(cls, filename: str) -> bool:
+        """Удаление файла или сообщения журнала. False, если ничего не найдено"""
+        filename = cls.sanitize_filename(filename)
+        TelegramFileCache.invalidate(filename)
+        msg_id = cls.journal_id(filename)
+        if msg_id is not None:
+            materialized = cls._materialized_path(msg_id)
+            materialized.unlink(missing_ok=True)
+            deleted = cls._journal.delete(msg_id)
+            if deleted:
+                MessageIndex.remove(msg_id)
+        else:
+            filepath = StorageService.local_path(filename)
+            deleted = ExecutorService.run_io(StorageService.delete, filename)
+            if deleted and filepath is not None:
+                HlsService.remove(Path(filepath))
+                ImageService.remove(Path(filepath))
+        if deleted:
+            TagStore.drop([filename])
+        return deleted
+
+    @classmethod
+    def move_file(cls, filename: str, new_name: str) -> bool:
+        """Переименование файла хранилища. False, если файла нет; InvalidFileError, если имя занято"""
+        filename, new_name = cls.sanitize_filename(filename), cls.sanitize_filename(new_name)
+        if cls.journal_id(filename) is not None or cls.journal_id(new_name) is not None:
+            raise InvalidFileError("Сообщения журнала нельзя переименовать")
+        filepath = StorageService.local_path(filename)
+        try:
+            if not ExecutorService.run_io(StorageService.move, filename, new_name):
+                return False
+        except FileExistsError:
+            raise InvalidFileError(f"Файл уже существует: {new_name}")
+        TelegramFileCache.invalidate(filename)
+        if filepath is not None:
+            HlsService.remove(Path(filepath))
+            ImageService.remove(Path(filepath))
+        TagStore.rename(filename, new_name)
+        return True
+
+    @classmethod
+    def batch(cls, operations: List[Dict], atomic: bool = True, concurrency: int = 8,
+              max_items: int = 1000) -> Dict:
+        """
+        Пакет операций delete/move/tag над файлами с результатом по каждой.
+        Сначала проверяется весь пакет (файлы существуют, имена не заняты,
+        файл не затронут дважды); при atomic и хотя бы одной ошибке ничего
+        не применяется. Удаления и переименования идут параллельно.
+        """
+        items = cls._expand_batch(operations)
+        if len(items) > max_items:
+            raise InvalidFileError(f"Слишком много файлов в пакете (максимум {max_items})")
+        existing = {f['name'] for f in cls.list_files()}
+        if cls._journal is not None:
+            existing.update(cls.journal_filename(entry) for entry in cls._journal.entries())
+
+        touched, targets = set(), set()
+        for item in items:
+            if item.get('error'):
+                continue
+            name = item['name']
+            if name not in existing:
+                item['error'] = "Файл не найден"
+            elif item['op'] != 'tag' and name in touched:
+                item['error'] = "Файл уже затронут другой операцией пакета"
+            elif item['op'] == 'move' and (item['to'] in existing or item['to'] in targets):
+                item['error'] = f"Файл уже существует: {item['to']}"
+            if item['op'] != 'tag' and not item.get('error'):
+                touched.add(name)
+                if item['op'] == 'move':
+                    targets.add(item['to'])
+        for item in items:
+            if item['op'] == 'tag' and not item.get('error') and item['name'] in touched:
+                item['error'] = "Файл удаляется или переименовывается в этом же пакете"
+
+        if atomic and any(item.get('error') for item in items):
+            return {'applied': False, 'results': [cls._batch_result(item, 'skipped') for item in items]}
+
+        file_ops = [item for item in items if item['op'] != 'tag' and not item.get('error')]
+        for item, _, error in ExecutorService.imap_unordered(cls._apply_batch_item, file_ops, concurrency):
+            if error is not None:
+                item['error'] = str(error)
+
+        tag_ops = [item for item in items if item['op'] == 'tag' and not item.get('error')]
+        if tag_ops:
+            cls._apply_tags(tag_ops)
+
+        done = [item for item in items if not item.get('error')]
+        return {
+            'applied': True,
+            'results': [cls._batch_result(item) for item in items],
+            'deleted': [item['name'] for item in done if item['op'] == 'delete'],
+            'moved': [{'from': item['name'], 'to': item['to']} for item in done if item['op'] == 'move'],
+            'tagged': [item['name'] for item in done if item['op'] == 'tag'],
+            'failed': len(items) - len(done),
+            'revision': WatcherService.catalog.revision if WatcherService.active() else None
+        }
+
+    @classmethod
+    def _expand_batch(cls, operations: List[Dict]) -> List[Dict]:
+        """Операции пакета по одному файлу; names: [...] разворачивается в несколько"""
+        items = []
+        for operation in operations:
+            if not isinstance(operation, dict):
+                raise InvalidFileError("Операция должна быть объектом")
+            op = operation.get('op')
+            names = operation.get('names') or [operation.get('name')]
+            if not isinstance(names, list):
+                # Строка тоже итерируется - по одному символу на "имя"
+                raise InvalidFileError("names должен быть списком имен файлов")
+            for name in names:
+                item = {'op': op, 'name': cls.sanitize_filename(str(name or ''))}
+                if op not in BATCH_OPERATIONS:
+                    item['error'] = f"Неизвестная операция: {op}"
+                elif not item['name']:
+                    item['error'] = "Не указано имя файла"
+                elif op == 'move':
+                    item['to'] = cls.sanitize_filename(str(operation.get('to') or ''))
+                    if len(names) > 1 or not item['to'] or item['to'].startswith('.'):
+                        item['error'] = "Для move нужны один файл и новое имя (to)"
+                elif op == 'tag':
+                    try:
+                        item['add'] = check_tags(operation.get('add') or [])
+                        item['remove'] = check_tags(operation.get('remove') or [])
+                    except InvalidFileError as e:
+                        item['error'] = str(e)
+                    else:
+                        if not item['add'] and not item['remove']:
+                            item['error'] = "Не указаны теги (add/remove)"
+                items.append(item)
+        return items
+
+    @classmethod
+    def _apply_batch_item(cls, item: Dict):
+        if item['op'] == 'delete':
+            if not cls.delete_file(item['name']):
+                raise InvalidFileError("Файл не найден")
+            changed = [item['name']]
+        else:
+            if not cls.move_file(item['name'], item['to']):
+                raise InvalidFileError("Файл не найден")
+            changed = [item['name'], item['to']]
+        if StorageService.is_local() and WatcherService.active():
+            # Каталог наблюдателя обновляется сразу: вместо file_* по каждому файлу - одно событие пакета
+            folder = cls.get_upload_folder()
+            WatcherService.absorb([os.path.join(folder, name) for name in changed])
+
+    @staticmethod
+    def _apply_tags(items: List[Dict]):
+        for item in items:
+            if item['add']:
+                TagStore.add([item['name']], item['add'])
+            if item['remove']:
+                TagStore.remove([item['name']], item['remove'])
+
+    @staticmethod
+    def _batch_result(item: Dict, skipped: Optional[str] = None) -> Dict:
+        result = {'op': item['op'], 'name': item['name']}
+        if 'to' in item:
+            result['to'] = item['to']
+        if item.get('error'):
+            result.update(status='error', error=item['error'])
+        else:
+            result['status'] = skipped or 'ok'
+        return result
+
+    @classmethod
+    def list_tagged_files(cls, tag: Optional[str] = None, limit: Optional[int] = None,
+                          offset: int = 0) -> List[Dict]:
+        """
+        Список файлов с тегами; tag - только файлы с этим тегом, limit/offset - страница.
+        При сверенном индексе - запросом к таблице files, иначе по каталогу.
+        """
+        if cls._indexed():
+            return FileIndex.list('uploads', cls.get_upload_folder(), tag, limit, offset)
+        tags = TagStore.tags_of()
+        files = [{**f, 'tags': tags.get(f['name'], [])} for f in cls.list_files()]
+        if tag:
+            files = [f for f in files if tag in f['tags']]
+        return files[offset:offset + limit] if limit else files[offset:]
+
+    @staticmethod
+    def _indexed() -> bool:
+        """Таблица files отражает папку загрузок (локальное хранилище под наблюдателем)"""
+        return StorageService.is_local() and WatcherService.active() and FileIndex.ready('uploads')
 
     @classmethod
     def get_upload_folder(cls):
         with cls._app.app_context():
             return current_app.config['UPLOAD_FOLDER']
         
+    @classmethod
+    def listing_version(cls) -> str:
+        """
+        Дешевая версия списка файлов и сообщений: ревизия каталога наблюдателя
+        (или отпечаток папки) и версия журнала
+        """
+        if not StorageService.is_local():
+            parts = [f"s{StorageService.generation()}"]
+        elif WatcherService.active():
+            parts = [f"w{WatcherService.catalog.revision}", f"i{FileIndex.version}"]
+        else:
+            parts = [f"d{ExecutorService.run_io(cls._folder_fingerprint, cls.get_upload_folder())}"]
+        if cls._journal is not None:
+            parts.append(f"j{cls._journal.version}")
+        parts.append(f"t{TagStore.version}")
+        return '-'.join(parts)
+
+    @staticmethod
+    def _folder_fingerprint(folder: str) -> str:
+        """
+        Отпечаток папки без наблюдателя: имена, размеры и mtime файлов.
+        mtime самой папки не меняется при правке .txt на месте - превью
+        устарели бы, а условные запросы получали бы 304.
+        """
+        digest = hashlib.blake2b(digest_size=8)
+        with os.scandir(folder) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                digest.update(f"{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8', 'surrogateescape'))
+        return digest.hexdigest()
+
+    @classmethod
+    def prepare_messages(cls, files: List[Dict]) -> List[Dict]:
+        """Лента чата: текстовые файлы и сообщения журнала с превью, остальные файлы - ссылками"""
+        preview_bytes = cls._app.config.get('TEXT_PREVIEW_BYTES', 1024)
+        journal_items = cls._journal_history(preview_bytes)
+
+        def build():
+            messages = []
+            for f in files:
+                created = f['created'].timestamp() if isinstance(f['created'], datetime) else f['created']
+                message = {'filename': f['name'], 'time': datetime.fromtimestamp(created).isoformat(), 'size': f['size']}
+                if f['name'].lower().endswith('.txt'):
+                    try:
+                        content = cls._text_preview(f['name'], f['size'], preview_bytes, f['path'])[0]
+                        message.update(type='text', content=content)
+                    except Exception as e:
+                        message.update(type='text', content='', error=str(e))
+                else:
+                    message.update(type='file', content=f['name'])
+                messages.append((created, message))
+            for item in journal_items:
+                messages.append((item['created'], {
+                    'filename': item['filename'],
+                    'time': datetime.fromtimestamp(item['created']).isoformat(),
+                    'size': item['size'],
+                    'type': 'text',
+                    'content': item['content']
+                }))
+            return [message for _, message in sorted(messages, key=lambda m: m[0])]
+
+        return ExecutorService.run_io(build)
+
+    @classmethod
+    def export_entries(cls, names: Optional[List[str]] = None, date_from: Optional[datetime] = None,
+                       date_to: Optional[datetime] = None, kind: Optional[str] = None,
+                       compress: bool = True) -> List[ZipEntry]:
+        """
+        Файлы и сообщения журнала для ZIP-выгрузки по списку имен, интервалу дат
+        и типу. Данные читаются только при отдаче архива; текст сжимается,
+        уже сжатые медиа кладутся как есть.
+        """
+        wanted = {cls.sanitize_filename(name) for name in names} if names else None
+        extensions = EXPORT_TYPES.get(kind) if kind else None
+        if kind and extensions is None:
+            raise InvalidFileError(f"Неизвестный тип: {kind}")
+
+        def selected(name: str, created: float) -> bool:
+            if wanted is not None and name not in wanted:
+                return False
+            if extensions and not name.lower().endswith(extensions):
+                return False
+            if date_from and created < date_from.timestamp():
+                return False
+            return not (date_to and created >= date_to.timestamp())
+
+        def deflate(name: str) -> bool:
+            return compress and compressible(mimetypes.guess_type(name)[0])
+
+        driver = StorageService.driver()
+        entries = []
+        for f in cls.list_files():
+            created = f['created'].timestamp() if isinstance(f['created'], datetime) else f['created']
+            if not selected(f['name'], created):
+                continue
+            if not f['name'].endswith('.txt'):
+                entries.append(ZipEntry(
+                    f['name'], f['size'], created,
+                    lambda name=f['name']: driver.get(name),
+                    compress=deflate(f['name'])
+                ))
+                continue
+            # Текст может быть сжат zstd: в архив идет распакованный, размер - из заголовка кадра.
+            # Без локального пути размер заранее неизвестен - такой текст всегда сжимается deflate
+            size = ExecutorService.run_io(TextCodec.size, f['path']) if f.get('path') else f['size']
+            entries.append(ZipEntry(
+                f['name'], size, created,
+                lambda name=f['name']: TextCodec.decode_stream(driver.get(name)),
+                compress=compress or not f.get('path')
+            ))
+
+        if cls._journal is not None:
+            for item in cls._journal.entries():
+                name = cls.journal_filename(item)
+                if selected(name, item['timestamp']):
+                    # Сообщение могут удалить до отдачи архива - тогда размер не совпадет
+                    # с объявленным, поэтому сообщения журнала всегда сжимаются deflate
+                    entries.append(ZipEntry(
+                        name, item['length'], item['timestamp'],
+                        lambda msg_id=item['id']: cls._export_message(msg_id),
+                        compress=True
+                    ))
+        return sorted(entries, key=lambda entry: entry.mtime)
+
+    @classmethod
+    def _export_message(cls, msg_id: int) -> List[bytes]:
+        """Текст сообщения для архива; удаленное после составления списка - пустой файл"""
+        message = cls._journal.get(msg_id)
+        return [message['text'].encode('utf-8')] if message else []
+
     @classmethod
     def get_history_files(cls) -> List[dict]:
-        upload_folder = cls.get_upload_folder()
+        preview_bytes = cls._app.config.get('TEXT_PREVIEW_BYTES', 1024)
+        return ExecutorService.run_io(cls._scan_history, preview_bytes, cls._journal_history(preview_bytes))
+
+    @classmethod
+    def _scan_history(cls, preview_bytes: int, history: List[dict]) -> List[dict]:
         try:
-            files = list(Path(upload_folder).glob('*.txt'))
-            history = []
-            for file_path in files:
+            for entry in StorageService.list_all():
+                if not entry['key'].endswith('.txt'):
+                    continue
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read(500)
+                    content, next_offset = cls._text_preview(entry['key'], entry['size'], preview_bytes)
                     history.append({
-                        "filename": file_path.name,
+                        "filename": entry['key'],
                         "content": content,
-                        "created": os.path.getctime(file_path)
+                        "created": entry['created'],
+                        "size": entry['size'],
+                        "next_offset": next_offset
                     })
                 except Exception as e:
-                    logger.error(f"Error reading {file_path}: {str(e)}")
+                    logger.error(f"Error reading {entry['key']}: {str(e)}")
             return sorted(history, key=lambda x: x['created'], reverse=True)
         except Exception as e:
             logger.error(f"History error: {str(e)}")
             return []
 
+    @staticmethod
+    def _text_preview(key: str, size: int, preview_bytes: int,
+                      path: Optional[str] = None) -> Tuple[str, Optional[int]]:
+        """
+        Превью текста для ленты и истории. Локальный файл читается с диска;
+        объект S3 - ranged GET начала, без HEAD и без копии в кеш
+        (local_copy нужен только для полного чтения)
+        """
+        path = path or StorageService.local_path(key)
+        if path is not None:
+            return TextService.preview(path, preview_bytes)
+        driver = StorageService.driver()
+        limit = max(preview_bytes, 1)
+        head = b''.join(driver.get(key, 0, limit - 1)) if size else b''
+
+        def chunks():
+            # Сжатый текст дочитывается, пока распакованного не хватит на превью;
+            # закрытие генератора обрывает этот GET
+            yield head
+            if len(head) < size:
+                yield from driver.get(key, len(head))
+
+        data, total = TextCodec.decode_prefix(chunks(), limit, size)
+        return TextService.preview_data(data, total)
+
+    @classmethod
+    def _journal_history(cls, preview_bytes: int) -> List[dict]:
+        """Сообщения журнала в формате истории (превью - из таблицы messages или из сегментов в пуле потоков)"""
+        if cls._journal is None:
+            return []
+        if MessageIndex.ready():
+            return [
+                {
+                    "filename": cls.journal_filename({'id': row['id'], 'timestamp': row['created_at']}),
+                    "content": row['preview'],
+                    "created": row['created_at'],
+                    "size": row['size'],
+                    "next_offset": len(row['preview'].encode('utf-8')) if row['size'] > preview_bytes else None
+                }
+                for row in MessageIndex.history()
+            ]
+        return ExecutorService.run_io(cls._read_journal_history, preview_bytes)
+
+    @classmethod
+    def _read_journal_history(cls, preview_bytes: int) -> List[dict]:
+        history = []
+        for entry in cls._journal.entries():
+            content = cls._journal.preview(entry['id'], preview_bytes)
+            history.append({
+                "filename": cls.journal_filename(entry),
+                "content": content,
+                "created": entry['timestamp'],
+                "size": entry['length'],
+                "next_offset": len(content.encode('utf-8')) if entry['length'] > preview_bytes else None
+            })
+        return history
+
     @classmethod
     def sanitize_filename(cls, filename: str) -> str:
         return re.sub(r'[\\/*?:"<>|]', "", filename).strip()[:255]
@@ -58,41 +586,178 @@ class FileService:
             raise ValueError("Invalid filename")
 
         try:
-            filename = cls.sanitize_filename(file.filename)
-            upload_folder = cls.get_upload_folder()
-            filepath = os.path.join(upload_folder, filename)
-            
-            file.save(filepath)
-            
+            filename = cls.store_upload(file)
+            filepath = StorageService.local_path(filename)
+
             if filename.lower().endswith('.txt'):
-                cls._open_file_in_thread(filepath)
-                cls._copy_to_clipboard(Path(filepath).read_text(encoding='utf-8'))
+                # Сжатый файл редактору не открыть
+                if filepath is not None and not TextCodec.is_compressed(filepath):
+                    cls._open_file_in_thread(filepath)
+                cls.copy_file_to_clipboard(filename)
 
             return {'success': True, 'filename': filename}
         except Exception as e:
             logger.error(f"Upload error: {str(e)}")
             raise
 
+    @classmethod
+    def store_upload(cls, file) -> str:
+        """Сохранение загруженного файла в хранилище (без побочных действий), возвращает имя"""
+        filename = cls.sanitize_filename(file.filename)
+        # Тело формы уже во временном файле werkzeug - копирование уходит в пул потоков
+        ExecutorService.run_io(StorageService.put, filename, file.stream, content_type=file.mimetype)
+        return cls._after_store(filename)
+
+    @classmethod
+    def _after_store(cls, filename: str) -> str:
+        """Общее для новых файлов: сброс кеша Telegram, сжатие текста"""
+        TelegramFileCache.invalidate(filename)
+        filepath = StorageService.local_path(filename)
+        if TextCodec.enabled() and filename.lower().endswith('.txt') and filepath is not None:
+            ExecutorService.run_io(TextCodec.compress_file, filepath)
+        return filename
+
+    # ======================
+    # ПРИЕМ ЧАСТЯМИ (Socket.IO)
+    # ======================
+    @classmethod
+    def transfer_dir(cls) -> Path:
+        return Path(cls._app.config['UPLOAD_FOLDER']) / TRANSFER_DIR
+
+    @classmethod
+    def open_transfer(cls, transfer_id: str, size: int) -> str:
+        """Файл под передачу полного размера: части пишутся по своим смещениям в любом порядке"""
+        folder = cls.transfer_dir()
+        folder.mkdir(exist_ok=True)
+        path = folder / f"{transfer_id}.part"
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        return str(path)
+
+    @staticmethod
+    def write_transfer(path: str, offset: int, data: bytes):
+        """Запись части на место (блокирующий вызов - выполнять в run_io)"""
+        with open(path, 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+
+    @classmethod
+    def store_transfer(cls, path: str, name: str, content_type: Optional[str] = None) -> str:
+        """Принятый и проверенный файл в хранилище (локально - переносом без копирования)"""
+        filename = cls.sanitize_filename(name)
+        ExecutorService.run_io(StorageService.put_file, filename, path, content_type=content_type)
+        return cls._after_store(filename)
+
+    @staticmethod
+    def discard_transfer(path: str):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def read_text(cls, filename: str, limit: int = -1) -> str:
+        """Чтение текстового файла в пуле потоков"""
+        msg_id = cls.journal_id(cls.sanitize_filename(filename))
+        if msg_id is not None:
+            message = cls._journal.get(msg_id)
+            if message is None:
+                raise FileNotFoundError(filename)
+            return message['text'] if limit < 0 else message['text'][:limit]
+
+        filepath = cls.resolve_path(filename)
+        if filepath is None:
+            raise FileNotFoundError(filename)
+
+        def reader():
+            text = TextCodec.read(filepath).decode('utf-8', errors='replace')
+            return text if limit < 0 else text[:limit]
+
+        return ExecutorService.run_io(reader)
+
+    @classmethod
+    def file_hash(cls, filename: str, algorithm: str = 'sha256') -> str:
+        """Хеш файла из папки загрузок, считается в пуле процессов"""
+        filepath = cls.resolve_path(filename)
+        if filepath is None:
+            raise FileNotFoundError(filename)
+        return ExecutorService.run_cpu(_hash_file, filepath, algorithm)
+
     @classmethod
     def save_text(cls, text: str):
         try:
+            if cls._journal is not None:
+                return cls._save_to_journal(text)
+
+            stem = f"text_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+            data = TextCodec.compress(text.encode('utf-8'))
+            if not StorageService.is_local():
+                filename = ExecutorService.run_io(cls._put_unique, stem, data)
+                cls.copy_to_clipboard(text)
+                return {"status": "success", "path": filename}
+
             upload_folder = cls._app.config['UPLOAD_FOLDER']
             os.makedirs(upload_folder, exist_ok=True)
 
-            filename = f"text_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.txt"
-            filepath = os.path.join(upload_folder, filename)
-
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(text)
+            filepath = cls._create_unique(upload_folder, stem)
+            with open(filepath, "wb") as f:
+                f.write(data)
 
-            cls._copy_to_clipboard(text)
-            cls._open_file_in_thread(filepath)
+            cls.copy_to_clipboard(text)
+            if not is_compressed_data(data):
+                cls._open_file_in_thread(filepath)
 
             return {"status": "success", "path": filepath}
         except Exception as e:
             logger.error(f"Ошибка сохранения: {str(e)}")
             return {"status": "error", "message": str(e)}
 
+    @staticmethod
+    def _create_unique(folder: str, stem: str, ext: str = '.txt') -> str:
+        """Атомарно создает файл; при совпадении имени добавляет суффикс _1, _2..."""
+        counter = 0
+        while True:
+            filepath = os.path.join(folder, f"{stem}{f'_{counter}' if counter else ''}{ext}")
+            try:
+                os.close(os.open(filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                return filepath
+            except FileExistsError:
+                counter += 1
+
+    @staticmethod
+    def _put_unique(stem: str, data: bytes, ext: str = '.txt') -> str:
+        """Запись в удаленное хранилище под свободным именем (_1, _2... при совпадении)"""
+        counter = 0
+        while True:
+            filename = f"{stem}{f'_{counter}' if counter else ''}{ext}"
+            if StorageService.stat(filename) is None:
+                StorageService.put(filename, io.BytesIO(data), len(data), 'text/plain; charset=utf-8')
+                return filename
+            counter += 1
+
+    @classmethod
+    def _save_to_journal(cls, text: str) -> Dict:
+        """Добавление сообщения в журнал; .txt создается только для редактора"""
+        entry = cls._journal.append(text)
+        MessageIndex.add(entry, text)
+        filename = cls.journal_filename(entry)
+        cls.copy_to_clipboard(text)
+        if cls._app.config.get('JOURNAL_OPEN_IN_EDITOR'):
+            ExecutorService.spawn(lambda: cls._open_file_in_thread(cls.materialize(entry['id'])))
+        return {"status": "success", "id": entry['id'], "filename": filename}
+
+    @classmethod
+    def copy_to_clipboard(cls, text: str):
+        """Копирование в буфер обмена в фоне, не задерживая ответ"""
+        ExecutorService.spawn(ExecutorService.run_io, cls._copy_to_clipboard, text)
+
+    @classmethod
+    def copy_file_to_clipboard(cls, filename: str):
+        """Копирование содержимого текстового файла в буфер обмена в фоне"""
+        def copier():
+            ExecutorService.run_io(cls._copy_to_clipboard, cls.read_text(filename))
+        ExecutorService.spawn(copier)
+
     @classmethod
     def _copy_to_clipboard(cls, text):
         try:
@@ -140,7 +805,29 @@ class FileService:
 
     @classmethod
     def list_files(cls) -> List[Dict]:
+        if not StorageService.is_local():
+            return ExecutorService.run_io(cls._list_storage)
+        if WatcherService.active():
+            return WatcherService.list_files('uploads')
         upload_folder = cls.get_upload_folder()
+        return ExecutorService.run_io(cls._scan_files, upload_folder)
+
+    @staticmethod
+    def _list_storage() -> List[Dict]:
+        """Список файлов не-локального хранилища в формате _scan_files (path=None)"""
+        entries = sorted(StorageService.list_all(), key=lambda e: e['created'])
+        return [
+            {
+                "name": entry['key'],
+                "path": None,
+                "size": entry['size'],
+                "created": datetime.fromtimestamp(entry['created'])
+            }
+            for entry in entries
+        ]
+
+    @classmethod
+    def _scan_files(cls, upload_folder: str) -> List[Dict]:
         files = []
         try:
             for f in sorted(os.listdir(upload_folder), 
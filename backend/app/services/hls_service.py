@@ -0,0 +1,194 @@
+# app/services/hls_service.py
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+from ..core.exceptions import InvalidFileError
+from .executor_service import ExecutorService, make_lock
+from .lifecycle_service import Lifecycle
+from .media_service import MediaService
+from .realtime_service import RealtimeService
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.webm', '.mkv', '.mov', '.m4v')
+# Нарезка кладется рядом с исходником в скрытую папку (наблюдатель ее не видит)
+HLS_DIR = '.hls'
+# Папка нарезки - <имя>-<версия>, версия - 10 hex-символов (.tmp - недописанная)
+VERSION_RE = re.compile(r'[0-9a-f]{10}(\.tmp)?')
+TOPICS = {'uploads': 'files', 'youtube': 'youtube'}
+# Потолок паузы перед повтором неудачной упаковки, секунды
+MAX_RETRY_BACKOFF = 3600
+
+
+class HlsService:
+    """
+    Фоновая упаковка видео в HLS.
+    Результат лежит в <папка>/.hls/<имя>-<версия>/, где версия зависит
+    от размера и mtime исходника - при изменении файла нарезка делается заново,
+    а старые сегменты можно кешировать навсегда.
+    Упаковки выполняются по одной, чтобы ffmpeg не занимал все ядра.
+    """
+    _folders: Dict[str, str] = {}
+    _jobs: Dict[str, Dict] = {}
+    _queue: deque = deque()
+    _lock = make_lock()
+    _worker_running = False
+    _mode = 'off'
+    _ladder = []
+    _segment_seconds = 4
+    _retry_backoff = 60
+
+    @classmethod
+    def init_app(cls, app):
+        cls._mode = app.config.get('HLS_MODE', 'on_demand')
+        cls._retry_backoff = app.config.get('HLS_RETRY_BACKOFF', 60)
+        cls._ladder = MediaService.parse_ladder(app.config.get('HLS_LADDER', ''))
+        cls._segment_seconds = app.config.get('HLS_SEGMENT_SECONDS', 4)
+        cls._folders = {
+            'uploads': app.config['UPLOAD_FOLDER'],
+            'youtube': str(app.config.get('YT_DOWNLOAD_FOLDER', ''))
+        }
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls._mode != 'off'
+
+    @classmethod
+    def source_path(cls, folder: str, filename: str) -> Path:
+        root = cls._folders.get(folder)
+        if not root or '/' in filename or '\\' in filename or filename.startswith('.'):
+            raise InvalidFileError("Недопустимый путь")
+        path = Path(root) / filename
+        if path.suffix.lower() not in VIDEO_EXTENSIONS or not path.is_file():
+            raise InvalidFileError("Видео не найдено")
+        return path
+
+    @staticmethod
+    def output_dir(path: Path) -> Path:
+        stat = path.stat()
+        version = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:10]
+        return path.parent / HLS_DIR / f"{path.name}-{version}"
+
+    @classmethod
+    def status(cls, folder: str, filename: str) -> Dict:
+        path = cls.source_path(folder, filename)
+        out_dir = cls.output_dir(path)
+        key = str(out_dir)
+        with cls._lock:
+            job = cls._jobs.get(key)
+        if (out_dir / 'master.m3u8').is_file():
+            return {'status': 'ready', 'playlist': 'master.m3u8', **(job or {})}
+        if job:
+            return dict(job)
+        return {'status': 'missing'}
+
+    @classmethod
+    def schedule(cls, folder: str, filename: str, retry: bool = False) -> Dict:
+        """
+        Поставить видео в очередь упаковки (повторный вызов ничего не делает).
+        После ошибки статус error держится до retry_at (пауза удваивается с
+        каждой неудачей), чтобы опрос плеера не запускал ffmpeg по кругу;
+        retry=True (явный POST) повторяет сразу.
+        """
+        path = cls.source_path(folder, filename)
+        out_dir = cls.output_dir(path)
+        if (out_dir / 'master.m3u8').is_file():
+            return {'status': 'ready', 'playlist': 'master.m3u8'}
+
+        key = str(out_dir)
+        with cls._lock:
+            job = cls._jobs.get(key)
+            if job and job['status'] in ('queued', 'packaging'):
+                return dict(job)
+            if job and job['status'] == 'error' and not retry and time.time() < job['retry_at']:
+                return dict(job)
+            failures = job.get('failures', 0) if job else 0
+            job = cls._jobs[key] = {'status': 'queued', 'queued_at': time.time(), 'failures': failures}
+            cls._queue.append((key, folder, path, out_dir))
+            start_worker = not cls._worker_running
+            cls._worker_running = True
+        if start_worker:
+            ExecutorService.spawn(cls._run_worker)
+        return dict(job)
+
+    @classmethod
+    def schedule_auto(cls, folder: str, filename: str):
+        """Упаковка сразу после загрузки (режим HLS_MODE=auto)"""
+        if cls._mode != 'auto' or not filename.lower().endswith(VIDEO_EXTENSIONS):
+            return
+        try:
+            cls.schedule(folder, filename)
+        except InvalidFileError as e:
+            logger.warning(f"HLS auto skipped for {filename}: {str(e)}")
+
+    @classmethod
+    def _run_worker(cls):
+        while True:
+            with cls._lock:
+                # При остановке очередь не разбирается: on_demand упакует заново по запросу
+                if not cls._queue or Lifecycle.draining():
+                    cls._worker_running = False
+                    return
+                key, folder, path, out_dir = cls._queue.popleft()
+                cls._jobs[key]['status'] = 'packaging'
+            try:
+                with Lifecycle.operation('hls', path.name, force=True):
+                    result = ExecutorService.run_io(
+                        MediaService.package_hls, path, out_dir, cls._ladder, cls._segment_seconds
+                    )
+                cls._cleanup_old(path, out_dir)
+                update = {'status': 'ready', 'playlist': 'master.m3u8', **result}
+            except Exception as e:
+                logger.error(f"HLS packaging {path.name} failed: {str(e)}")
+                update = {'status': 'error', 'error': str(e)}
+            with cls._lock:
+                job = cls._jobs[key]
+                if update['status'] == 'error':
+                    job['failures'] += 1
+                    backoff = min(cls._retry_backoff * 2 ** (job['failures'] - 1), MAX_RETRY_BACKOFF)
+                    update['retry_at'] = time.time() + backoff
+                job.update(update)
+            RealtimeService.emit('hls_status', {'folder': folder, 'filename': path.name, **update},
+                                 topic=TOPICS.get(folder))
+
+    @staticmethod
+    def _version_dirs(path: Path) -> List[Path]:
+        """Папки нарезок именно этого файла (glob задел бы a.mp4-copy.mp4 и имена с [ и *)"""
+        root = path.parent / HLS_DIR
+        prefix = f"{path.name}-"
+        try:
+            names = os.listdir(root)
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+        return [
+            root / name for name in names
+            if name.startswith(prefix) and VERSION_RE.fullmatch(name[len(prefix):])
+        ]
+
+    @classmethod
+    def _cleanup_old(cls, path: Path, keep: Path):
+        """Удалить нарезки прежних версий того же файла"""
+        for old in cls._version_dirs(path):
+            if old != keep and old.is_dir():
+                shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def asset_path(cls, folder: str, filename: str, asset: str) -> Optional[Path]:
+        """Путь к плейлисту или сегменту готовой нарезки"""
+        out_dir = cls.output_dir(cls.source_path(folder, filename))
+        target = (out_dir / asset).resolve()
+        if out_dir.resolve() not in target.parents or not target.is_file():
+            return None
+        return target
+
+    @classmethod
+    def remove(cls, path: Path):
+        """Удалить все нарезки файла (при удалении исходника)"""
+        for old in cls._version_dirs(path):
+            shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,290 @@
+# app/services/image_service.py
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+from ..core.exceptions import InvalidFileError
+from .executor_service import ExecutorService, make_lock
+from .lifecycle_service import Lifecycle
+from .realtime_service import RealtimeService
+from .storage_service import StorageService
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен - картинки отдаются как есть
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff')
+# Варианты лежат рядом с исходником в скрытой папке (наблюдатель и список файлов ее не видят)
+VARIANTS_DIR = '.img'
+FORMAT_EXTENSIONS = {'avif': '.avif', 'webp': '.webp', 'jpeg': '.jpg'}
+FORMAT_MIMETYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+# Папка вариантов - <имя>-<версия>, версия - 10 hex-символов (.tmp - недописанная)
+VERSION_RE = re.compile(r'[0-9a-f]{10}(\.tmp)?')
+# Записи об ошибках хранятся для status(); готовые задачи описывает manifest.json
+MAX_FAILED_JOBS = 256
+
+
+def render_variants(source: str, out_dir: str, sizes: List[int], formats: List[str], quality: int) -> Dict:
+    """
+    Уменьшенные копии картинки по максимальной стороне в каждом формате.
+    Ориентация из EXIF применяется, сами EXIF-данные не копируются.
+    Выполняется в пуле процессов (функция уровня модуля).
+    """
+    started = time.monotonic()
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    try:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+            image.load()
+        width, height = image.size
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        variants = []
+        longest = max(width, height)
+        # Размеры больше исходника не нужны; если все больше - остается один вариант в исходном размере
+        targets = sorted({min(size, longest) for size in sizes}) or [longest]
+        for size in targets:
+            scaled = image.copy()
+            scaled.thumbnail((size, size), Image.LANCZOS)
+            for fmt in formats:
+                frame = scaled.convert('RGB') if fmt == 'jpeg' and has_alpha else scaled
+                name = f"{size}{FORMAT_EXTENSIONS[fmt]}"
+                options = {'quality': quality}
+                if fmt == 'jpeg':
+                    options.update(optimize=True, progressive=True)
+                elif fmt == 'webp':
+                    options['method'] = 6
+                frame.save(tmp_dir / name, fmt.upper(), **options)
+                variants.append({
+                    'size': size,
+                    'format': fmt,
+                    'width': frame.width,
+                    'height': frame.height,
+                    'bytes': (tmp_dir / name).stat().st_size,
+                    'file': name
+                })
+
+        manifest = {
+            'width': width,
+            'height': height,
+            'source_bytes': os.path.getsize(source),
+            'variants': variants,
+            'elapsed': round(time.monotonic() - started, 2)
+        }
+        (tmp_dir / 'manifest.json').write_text(json.dumps(manifest), encoding='utf-8')
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(tmp_dir, out_dir)
+        return manifest
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class ImageService:
+    """
+    Фоновая подготовка картинок для просмотра: уменьшенные варианты
+    (IMAGE_SIZES по большей стороне) в AVIF/WebP/JPEG без EXIF.
+    Оригинал не меняется. Варианты лежат в <папка>/.img/<имя>-<версия>/,
+    версия зависит от размера и mtime исходника. Кодирование идет в пуле
+    процессов, задачи - по одной, чтобы не занимать все ядра.
+    """
+    _jobs: Dict[str, Dict] = {}
+    _queue: deque = deque()
+    _lock = make_lock()
+    _worker_running = False
+    _mode = 'off'
+    _sizes: List[int] = []
+    _formats: List[str] = []
+    _quality = 80
+
+    @classmethod
+    def init_app(cls, app):
+        cls._mode = app.config.get('IMAGE_VARIANTS', 'auto')
+        cls._sizes = sorted(int(size) for size in app.config.get('IMAGE_SIZES', '480,1280').split(',') if size)
+        cls._quality = app.config.get('IMAGE_QUALITY', 80)
+        if Image is None:
+            if cls._mode != 'off':
+                logger.warning("Pillow не установлен - варианты картинок не создаются")
+            cls._mode = 'off'
+            return
+        # AVIF есть не во всех сборках Pillow - берутся только доступные форматы
+        wanted = [fmt.strip().lower() for fmt in app.config.get('IMAGE_FORMATS', 'avif,webp,jpeg').split(',')]
+        Image.init()
+        cls._formats = [fmt for fmt in wanted if fmt in FORMAT_EXTENSIONS and fmt.upper() in Image.SAVE]
+        if 'jpeg' not in cls._formats:
+            cls._formats.append('jpeg')  # запасной вариант для клиентов без WebP/AVIF
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls._mode != 'off'
+
+    @staticmethod
+    def is_image(filename: str) -> bool:
+        return filename.lower().endswith(IMAGE_EXTENSIONS)
+
+    @staticmethod
+    def output_dir(path: Path) -> Path:
+        stat = path.stat()
+        version = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:10]
+        return path.parent / VARIANTS_DIR / f"{path.name}-{version}"
+
+    @staticmethod
+    def _manifest(out_dir: Path) -> Optional[Dict]:
+        try:
+            return json.loads((out_dir / 'manifest.json').read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def status(cls, path: Path) -> Dict:
+        out_dir = cls.output_dir(path)
+        manifest = cls._manifest(out_dir)
+        if manifest is not None:
+            return {'status': 'ready', **manifest}
+        with cls._lock:
+            job = cls._jobs.get(str(out_dir))
+        return dict(job) if job else {'status': 'missing'}
+
+    @classmethod
+    def schedule(cls, path: Path) -> Dict:
+        """Поставить картинку в очередь (повторный вызов ничего не делает)"""
+        if not cls.enabled() or not cls.is_image(path.name):
+            raise InvalidFileError("Варианты для этого файла не создаются")
+        out_dir = cls.output_dir(path)
+        if (out_dir / 'manifest.json').is_file():
+            return {'status': 'ready'}
+
+        key = str(out_dir)
+        with cls._lock:
+            job = cls._jobs.get(key)
+            if job and job['status'] in ('queued', 'processing'):
+                return dict(job)
+            job = cls._jobs[key] = {'status': 'queued', 'queued_at': time.time()}
+            cls._queue.append((key, path, out_dir))
+            start_worker = not cls._worker_running
+            cls._worker_running = True
+        if start_worker:
+            ExecutorService.spawn(cls._run_worker)
+        return dict(job)
+
+    @classmethod
+    def schedule_auto(cls, filename: str):
+        """Варианты сразу после загрузки (режим IMAGE_VARIANTS=auto)"""
+        if cls._mode != 'auto' or not cls.is_image(filename):
+            return
+        try:
+            path = ExecutorService.run_io(StorageService.local_copy, filename)
+            if path is not None:
+                cls.schedule(Path(path))
+        except Exception as e:
+            logger.warning(f"Image variants skipped for {filename}: {str(e)}")
+
+    @classmethod
+    def _run_worker(cls):
+        while True:
+            with cls._lock:
+                if not cls._queue or Lifecycle.draining():
+                    cls._worker_running = False
+                    return
+                key, path, out_dir = cls._queue.popleft()
+                cls._jobs[key]['status'] = 'processing'
+            try:
+                with Lifecycle.operation('image', path.name, force=True):
+                    manifest = ExecutorService.run_cpu(
+                        render_variants, str(path), str(out_dir), cls._sizes, cls._formats, cls._quality
+                    )
+                cls._cleanup_old(path, out_dir)
+                update = {'status': 'ready'}
+                smallest = min(v['bytes'] for v in manifest['variants'])
+                logger.info(
+                    f"Image variants {path.name}: {len(manifest['variants'])} шт. за {manifest['elapsed']} с, "
+                    f"{manifest['source_bytes'] // 1024} КБ -> от {smallest // 1024} КБ"
+                )
+            except Exception as e:
+                logger.error(f"Image variants {path.name} failed: {str(e)}")
+                update = {'status': 'error', 'error': str(e)}
+            with cls._lock:
+                if update['status'] == 'ready':
+                    cls._jobs.pop(key, None)
+                else:
+                    cls._jobs[key].update(update)
+                    cls._prune_failed()
+            RealtimeService.emit('image_variants', {'filename': path.name, **update}, topic='files')
+
+    @classmethod
+    def _prune_failed(cls):
+        """Старые ошибки забываются (вызывается под блокировкой)"""
+        failed = [key for key, job in cls._jobs.items() if job['status'] == 'error']
+        for key in failed[:-MAX_FAILED_JOBS]:
+            del cls._jobs[key]
+
+    @staticmethod
+    def _variant_dirs(path: Path) -> List[Path]:
+        """
+        Папки вариантов именно этого файла. Без glob: у a.jpg-copy.jpg тот же
+        префикс, а [ и * в имени файла glob понимает как шаблон
+        """
+        root = path.parent / VARIANTS_DIR
+        prefix = f"{path.name}-"
+        try:
+            names = os.listdir(root)
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+        return [
+            root / name for name in names
+            if name.startswith(prefix) and VERSION_RE.fullmatch(name[len(prefix):])
+        ]
+
+    @classmethod
+    def _cleanup_old(cls, path: Path, keep: Path):
+        for old in cls._variant_dirs(path):
+            if old != keep and old.is_dir():
+                shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def select(cls, path: Path, accept: str, size: Optional[int]) -> Optional[Dict]:
+        """
+        Вариант под клиента: лучший формат из Accept (AVIF, WebP, иначе JPEG)
+        и наименьший размер не меньше запрошенного (без size - самый большой).
+        None, если вариантов еще нет - тогда они ставятся в очередь.
+        """
+        out_dir = cls.output_dir(path)
+        manifest = cls._manifest(out_dir)
+        if manifest is None:
+            if cls.enabled():
+                cls.schedule(path)
+            return None
+
+        accept = (accept or '').lower()
+        available = {v['format'] for v in manifest['variants']}
+        fmt = next(
+            (f for f in ('avif', 'webp') if f in available and FORMAT_MIMETYPES[f] in accept),
+            'jpeg'
+        )
+        candidates = sorted((v for v in manifest['variants'] if v['format'] == fmt), key=lambda v: v['size'])
+        if not candidates:
+            return None
+        variant = next((v for v in candidates if size and v['size'] >= size), candidates[-1])
+        return {**variant, 'path': out_dir / variant['file'], 'mimetype': FORMAT_MIMETYPES[fmt]}
+
+    @classmethod
+    def remove(cls, path: Path):
+        """Удалить все варианты файла (при удалении исходника)"""
+        for old in cls._variant_dirs(path):
+            shutil.rmtree(old, ignore_errors=True)
+            with cls._lock:
+                job = cls._jobs.get(str(old))
+                if job and job['status'] == 'error':
+                    del cls._jobs[str(old)]
@@ -0,0 +1,274 @@
+# app/services/index_service.py
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import bindparam, delete, select
+from ..models import FileTag, Message, StoredFile
+from .database_service import Database
+from .executor_service import ExecutorService
+
+logger = logging.getLogger(__name__)
+
+files = StoredFile.__table__
+file_tags = FileTag.__table__
+messages = Message.__table__
+
+# Строк в одном INSERT при сверке (лимит параметров запроса SQLite)
+SYNC_BATCH = 500
+# Проходов сверки, пока каталог меняется во время записи
+SYNC_PASSES = 3
+
+
+class FileIndex:
+    """
+    Метаданные файлов папок в таблице files - зеркало каталога
+    наблюдателя, общее для всех процессов. Выборка по тегу и постраничный
+    список идут по индексам (folder, created_at) и file_tags(tag) вместо
+    перебора каталога. Пока папка не сверена (или после ошибки записи),
+    списки строятся по каталогу в памяти. version растет с каждой записью.
+    """
+    version = 0
+    # Папки, изменения которых пишутся в таблицу (с начала сверки)
+    _tracking: Set[str] = set()
+    # Папки, списки которых можно читать из таблицы (сверка завершена)
+    _ready: Set[str] = set()
+
+    @staticmethod
+    def _values(folder: str, info: Dict) -> Dict:
+        created = info['created'].timestamp() if isinstance(info['created'], datetime) else info['created']
+        return {
+            'folder': folder,
+            'name': info['name'],
+            'size': info['size'],
+            'mtime': info['mtime'],
+            'created_at': created
+        }
+
+    @classmethod
+    def ready(cls, folder: str) -> bool:
+        return folder in cls._ready
+
+    @classmethod
+    def sync(cls, folder: str, catalog):
+        """
+        Полная сверка папки с каталогом (FileCatalog): лишние строки удаляются,
+        остальные добавляются или обновляются. Изменения пишутся через apply()
+        с начала сверки; проход повторяется, пока ревизия каталога менялась во
+        время записи (снимок мог затереть более новое состояние). Без сходимости
+        папка остается несверенной - наблюдатель повторит позже.
+        """
+        cls._tracking.add(folder)
+        try:
+            for _ in range(SYNC_PASSES):
+                revision = catalog.revision
+                rows, removed = cls._sync_pass(folder, catalog.list(folder))
+                if catalog.revision == revision:
+                    break
+            else:
+                cls._tracking.discard(folder)
+                logger.warning(f"File index {folder}: каталог меняется во время сверки, повтор позже")
+                return
+        except Exception:
+            cls._tracking.discard(folder)
+            raise
+        # Ошибка apply() во время сверки снимает папку с отслеживания - тогда она не готова
+        if folder in cls._tracking:
+            cls._ready.add(folder)
+        cls.version += 1
+        logger.info(f"File index {folder}: {rows} файлов, удалено устаревших {removed}")
+
+    @classmethod
+    def _sync_pass(cls, folder: str, catalog: List[Dict]) -> Tuple[int, int]:
+        rows = [cls._values(folder, info) for info in catalog]
+        names = {row['name'] for row in rows}
+
+        def run():
+            with Database.begin() as connection:
+                existing = set(connection.execute(select(files.c.name).where(files.c.folder == folder)).scalars())
+                stale = [{'b_name': name} for name in existing - names]
+                if stale:
+                    connection.execute(
+                        delete(files).where(files.c.folder == folder, files.c.name == bindparam('b_name')), stale
+                    )
+                upsert = Database.upsert(files, ['folder', 'name'], ['size', 'mtime', 'created_at'])
+                for start in range(0, len(rows), SYNC_BATCH):
+                    connection.execute(upsert, rows[start:start + SYNC_BATCH])
+            return len(stale)
+
+        return len(rows), Database.run(run)
+
+    @classmethod
+    def apply(cls, changes: List[Tuple[str, str, Dict]]):
+        """Изменения каталога (изменение, папка, сведения о файле); при ошибке папка ждет новой сверки"""
+        folders = {folder for _, folder, _ in changes if folder in cls._tracking}
+        changes = [change for change in changes if change[1] in folders]
+        if not changes:
+            return
+        upserts = [cls._values(folder, info) for change, folder, info in changes if change != 'deleted']
+        deletes = [{'b_folder': folder, 'b_name': info['name']} for change, folder, info in changes if change == 'deleted']
+
+        def run():
+            with Database.begin() as connection:
+                if upserts:
+                    connection.execute(Database.upsert(files, ['folder', 'name'], ['size', 'mtime', 'created_at']), upserts)
+                if deletes:
+                    connection.execute(delete(files).where(
+                        files.c.folder == bindparam('b_folder'), files.c.name == bindparam('b_name')
+                    ), deletes)
+
+        try:
+            Database.run(run)
+        except Exception as e:
+            logger.error(f"File index update failed: {str(e)}")
+            cls._tracking.difference_update(folders)
+            cls._ready.difference_update(folders)
+        cls.version += 1
+
+    @classmethod
+    def list(cls, folder: str, base_dir: Optional[str] = None, tag: Optional[str] = None,
+             limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """Файлы папки по времени создания (с тегами); tag - только с этим тегом"""
+        page = select(files.c.name, files.c.size, files.c.mtime, files.c.created_at).where(files.c.folder == folder)
+        if tag:
+            page = page.join(file_tags, file_tags.c.name == files.c.name).where(file_tags.c.tag == tag)
+        page = page.order_by(files.c.created_at, files.c.name).offset(offset)
+        if limit:
+            page = page.limit(limit)
+
+        def run():
+            with Database.connect() as connection:
+                rows = connection.execute(page).fetchall()
+                subquery = page.subquery()
+                tag_rows = connection.execute(
+                    select(file_tags.c.name, file_tags.c.tag)
+                    .join(subquery, subquery.c.name == file_tags.c.name)
+                    .order_by(file_tags.c.tag)
+                ).fetchall()
+            return rows, tag_rows
+
+        rows, tag_rows = Database.run(run)
+        tags: Dict[str, List[str]] = {}
+        for name, value in tag_rows:
+            tags.setdefault(name, []).append(value)
+        return [
+            {
+                'name': row.name,
+                'path': os.path.join(base_dir, row.name) if base_dir else None,
+                'size': row.size,
+                'mtime': row.mtime,
+                'created': datetime.fromtimestamp(row.created_at),
+                'tags': tags.get(row.name, [])
+            }
+            for row in rows
+        ]
+
+
+class MessageIndex:
+    """
+    Метаданные и превью сообщений журнала в таблице messages: лента и
+    история читаются одним запросом по индексу created_at, без чтения
+    сегментов. Сверяется с журналом при запуске; превью пересобираются,
+    если изменился TEXT_PREVIEW_BYTES.
+    """
+    _ready = False
+    _preview_bytes = 1024
+
+    @classmethod
+    def ready(cls) -> bool:
+        return cls._ready
+
+    @classmethod
+    def sync(cls, journal, preview_bytes: int):
+        """Сверка с журналом; повторяется, пока журнал менялся во время прохода"""
+        from .config_service import SettingsStore
+
+        cls._preview_bytes = preview_bytes
+        rebuild = SettingsStore.get('message_preview_bytes') != preview_bytes
+        added = removed = 0
+        for _ in range(3):
+            version = journal.version
+            result = cls._sync_pass(journal, preview_bytes, rebuild)
+            added, removed, rebuild = added + result[0], removed + result[1], False
+            if journal.version == version:
+                break
+        SettingsStore.update({'message_preview_bytes': preview_bytes})
+        cls._ready = True
+        logger.info(f"Message index: {len(journal)} сообщений, добавлено {added}, удалено {removed}")
+
+    @classmethod
+    def _sync_pass(cls, journal, preview_bytes: int, rebuild: bool) -> Tuple[int, int]:
+        entries = {entry['id']: entry for entry in journal.entries()}
+
+        def existing_ids():
+            with Database.begin() as connection:
+                if rebuild:
+                    connection.execute(delete(messages))
+                    return set()
+                return set(connection.execute(select(messages.c.id)).scalars())
+
+        existing = Database.run(existing_ids)
+        stale = [{'b_id': msg_id} for msg_id in existing - set(entries)]
+        # Превью читаются из сегментов в пуле потоков, запись в базу - отдельно
+        missing = ExecutorService.run_io(lambda: [
+            cls._values(entry, journal.preview(msg_id, preview_bytes))
+            for msg_id, entry in entries.items() if msg_id not in existing
+        ])
+
+        def write():
+            with Database.begin() as connection:
+                if stale:
+                    connection.execute(delete(messages).where(messages.c.id == bindparam('b_id')), stale)
+                insert = Database.upsert(messages, ['id'])
+                for start in range(0, len(missing), SYNC_BATCH):
+                    connection.execute(insert, missing[start:start + SYNC_BATCH])
+
+        Database.run(write)
+        return len(missing), len(stale)
+
+    @staticmethod
+    def _values(entry: Dict, preview: str) -> Dict:
+        return {'id': entry['id'], 'created_at': entry['timestamp'], 'size': entry['length'], 'preview': preview}
+
+    @classmethod
+    def add(cls, entry: Dict, text: str):
+        """Новое сообщение журнала (превью - из уже известного текста)"""
+        if not cls._ready:
+            return
+        preview = text.encode('utf-8')[:cls._preview_bytes].decode('utf-8', errors='ignore')
+
+        def run():
+            with Database.begin() as connection:
+                connection.execute(Database.upsert(messages, ['id']), [cls._values(entry, preview)])
+        cls._write(run)
+
+    @classmethod
+    def remove(cls, msg_id: int):
+        if not cls._ready:
+            return
+
+        def run():
+            with Database.begin() as connection:
+                connection.execute(delete(messages).where(messages.c.id == msg_id))
+        cls._write(run)
+
+    @classmethod
+    def _write(cls, run):
+        """Ошибка записи отключает индекс до следующей сверки - лента читается из журнала"""
+        try:
+            Database.run(run)
+        except Exception as e:
+            logger.error(f"Message index update failed: {str(e)}")
+            cls._ready = False
+
+    @classmethod
+    def history(cls, limit: Optional[int] = None) -> List[Dict]:
+        """Сообщения, новые первыми: id, created_at, size, preview"""
+        stmt = select(messages).order_by(messages.c.created_at.desc(), messages.c.id.desc())
+        if limit:
+            stmt = stmt.limit(limit)
+
+        def run():
+            with Database.connect() as connection:
+                return connection.execute(stmt).fetchall()
+        return [dict(row._mapping) for row in Database.run(run)]
@@ -0,0 +1,112 @@
+# app/services/job_store.py
+import json
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional
+from sqlalchemy import delete, select, update
+from ..models import YoutubeJob
+from .database_service import Database
+
+logger = logging.getLogger(__name__)
+
+# queued/running/retrying - незавершенные, подлежат возобновлению после рестарта
+ACTIVE_STATUSES = ('queued', 'running', 'retrying')
+FINAL_STATUSES = ('complete', 'failed')
+
+jobs = YoutubeJob.__table__
+
+
+class JobStore:
+    """
+    Таблица задач загрузки YouTube в общей базе (Database).
+    Переживает рестарт контейнера: незавершенные задачи возобновляются
+    при старте с частичных файлов yt-dlp. Запросы выполняются через
+    Database.run - под eventlet SQLite не блокирует хаб.
+    """
+
+    @classmethod
+    def open(cls, legacy_path=None):
+        """Подготовка хранилища; задачи из прежнего .jobs.sqlite3 переносятся в базу один раз"""
+        if not Database.ready():
+            raise RuntimeError("База данных не инициализирована")
+        if legacy_path:
+            Database.run(Database.import_sqlite, legacy_path, jobs)
+
+    @staticmethod
+    def _row(row) -> Optional[Dict]:
+        if row is None:
+            return None
+        job = dict(row._mapping)
+        job['tuning'] = json.loads(job['tuning']) if job['tuning'] else None
+        return job
+
+    @staticmethod
+    def _execute(stmt):
+        def run():
+            with Database.begin() as connection:
+                return connection.execute(stmt).rowcount
+        return Database.run(run)
+
+    @staticmethod
+    def _fetch(stmt) -> List:
+        def run():
+            with Database.connect() as connection:
+                return connection.execute(stmt).fetchall()
+        return Database.run(run)
+
+    @classmethod
+    def create(cls, url: str, download_dir, fmt: Optional[str] = None, tuning: Optional[dict] = None) -> Dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex[:12]
+        cls._execute(jobs.insert().values(
+            id=job_id, url=url, format=fmt, download_dir=str(download_dir),
+            tuning=json.dumps(tuning) if tuning else None, status='queued',
+            bytes_done=0, attempts=0, created_at=now, updated_at=now
+        ))
+        return cls.get(job_id)
+
+    @classmethod
+    def get(cls, job_id: str) -> Optional[Dict]:
+        rows = cls._fetch(select(jobs).where(jobs.c.id == job_id))
+        return cls._row(rows[0]) if rows else None
+
+    @classmethod
+    def update(cls, job_id: str, **fields):
+        if not fields:
+            return
+        fields['updated_at'] = time.time()
+        cls._execute(update(jobs).where(jobs.c.id == job_id).values(**fields))
+
+    @classmethod
+    def start_attempt(cls, job_id: str) -> int:
+        """Отметить начало попытки, вернуть ее номер"""
+        def run():
+            with Database.begin() as connection:
+                connection.execute(
+                    update(jobs).where(jobs.c.id == job_id).values(
+                        status='running', attempts=jobs.c.attempts + 1,
+                        next_attempt_at=None, updated_at=time.time()
+                    )
+                )
+                return connection.execute(select(jobs.c.attempts).where(jobs.c.id == job_id)).scalar()
+        return Database.run(run) or 0
+
+    @classmethod
+    def unfinished(cls) -> List[Dict]:
+        rows = cls._fetch(
+            select(jobs).where(jobs.c.status.in_(ACTIVE_STATUSES)).order_by(jobs.c.created_at)
+        )
+        return [cls._row(row) for row in rows]
+
+    @classmethod
+    def recent(cls, limit: int = 50) -> List[Dict]:
+        rows = cls._fetch(select(jobs).order_by(jobs.c.updated_at.desc()).limit(limit))
+        return [cls._row(row) for row in rows]
+
+    @classmethod
+    def prune(cls, older_than: float) -> int:
+        """Удалить завершенные задачи старше older_than секунд"""
+        return cls._execute(
+            delete(jobs).where(jobs.c.status.in_(FINAL_STATUSES), jobs.c.updated_at < time.time() - older_than)
+        )
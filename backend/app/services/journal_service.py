@@ -0,0 +1,344 @@
+# app/services/journal_service.py
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .executor_service import ExecutorService, make_lock
+
+logger = logging.getLogger(__name__)
+
+# Запись индекса: id, смещение в сегменте, длина, время, флаги
+INDEX_RECORD = struct.Struct('<QQIdB')
+FLAG_MESSAGE = 0
+FLAG_TOMBSTONE = 1
+
+SEGMENT_RE = re.compile(r'^segment_(\d{8})\.log$')
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+
+class _Segment:
+    """Пара файлов сегмента: данные (.log) и индекс (.idx)"""
+
+    def __init__(self, directory: Path, number: int):
+        self.number = number
+        self.log_path = directory / f'segment_{number:08d}.log'
+        self.idx_path = directory / f'segment_{number:08d}.idx'
+        self.log_fd = os.open(self.log_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self.idx_fd = os.open(self.idx_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self.size = os.fstat(self.log_fd).st_size
+        self.live = 0
+        self.dead = 0
+
+    def read_index(self) -> List[Tuple]:
+        """
+        Записи индекса. Оборванная запись в конце и хвост, указывающий за
+        конец данных, отрезаются от файла: следующая запись дописывается
+        (O_APPEND) ровно за последней целой.
+        """
+        data = os.pread(self.idx_fd, os.fstat(self.idx_fd).st_size, 0)
+        whole = len(data) - len(data) % INDEX_RECORD.size
+        if whole != len(data):
+            logger.warning(f"Journal {self.idx_path.name}: torn index record, {len(data) - whole} bytes dropped")
+            os.ftruncate(self.idx_fd, whole)
+        records = []
+        for pos in range(0, whole, INDEX_RECORD.size):
+            record = INDEX_RECORD.unpack_from(data, pos)
+            if record[4] == FLAG_MESSAGE and record[1] + record[2] > self.size:
+                logger.warning(f"Journal {self.log_path.name}: truncated tail at record {record[0]}")
+                os.ftruncate(self.idx_fd, pos)
+                break
+            records.append(record)
+        return records
+
+    def scan(self, size: Optional[int] = None) -> List[Tuple]:
+        """Целые записи индекса (не больше size байт) без проверок и без изменения файла"""
+        if size is None:
+            size = os.fstat(self.idx_fd).st_size
+        data = os.pread(self.idx_fd, size, 0)
+        whole = len(data) - len(data) % INDEX_RECORD.size
+        return [INDEX_RECORD.unpack_from(data, pos) for pos in range(0, whole, INDEX_RECORD.size)]
+
+    def fsync(self):
+        os.fsync(self.log_fd)
+        os.fsync(self.idx_fd)
+
+    def close(self):
+        os.close(self.log_fd)
+        os.close(self.idx_fd)
+
+    def remove(self):
+        self.close()
+        self.log_path.unlink(missing_ok=True)
+        self.idx_path.unlink(missing_ok=True)
+
+
+class MessageJournal:
+    """
+    Append-only журнал текстовых сообщений.
+    Сообщения дописываются в сегменты, индекс (id, offset, length, timestamp)
+    держится в памяти и в .idx файлах. Запись на диск - group commit:
+    один fsync на все сообщения, накопившиеся за интервал.
+    """
+
+    def __init__(self, directory, segment_size: int = 64 * 1024 * 1024,
+                 fsync_policy: str = 'interval', commit_interval: float = 0.05,
+                 compact_ratio: float = 0.3):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        self.directory = Path(directory)
+        self.segment_size = segment_size
+        self.fsync_policy = fsync_policy
+        self.commit_interval = commit_interval
+        self.compact_ratio = compact_ratio
+
+        self._lock = make_lock()
+        self._segments: Dict[int, _Segment] = {}
+        self._index: Dict[int, Tuple[int, int, int, float]] = {}
+        self._active: Optional[_Segment] = None
+        self._next_id = 1
+        self._dirty = set()
+        self._commit_event = threading.Event()
+        self._running = False
+        # Растет при каждом добавлении и удалении (версия для кеша списков)
+        self.version = 0
+        self.stats = {'appends': 0, 'commits': 0, 'compactions': 0}
+
+    # ======================
+    # ОТКРЫТИЕ И ЗАКРЫТИЕ
+    # ======================
+    def open(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        numbers = sorted(
+            int(m.group(1)) for m in map(SEGMENT_RE.match, os.listdir(self.directory)) if m
+        )
+        deleted = set()
+        for number in numbers:
+            segment = _Segment(self.directory, number)
+            self._segments[number] = segment
+            for msg_id, offset, length, ts, flags in segment.read_index():
+                # id надгробия тоже занят: иначе оно удалит новое сообщение с тем же id
+                self._next_id = max(self._next_id, msg_id + 1)
+                if flags == FLAG_TOMBSTONE:
+                    deleted.add(msg_id)
+                    continue
+                previous = self._index.get(msg_id)
+                if previous:
+                    # Копия после прерванной компакции
+                    self._segments[previous[0]].live -= 1
+                    self._segments[previous[0]].dead += 1
+                self._index[msg_id] = (number, offset, length, ts)
+                segment.live += 1
+
+        for msg_id in deleted:
+            entry = self._index.pop(msg_id, None)
+            if entry:
+                self._segments[entry[0]].live -= 1
+                self._segments[entry[0]].dead += 1
+
+        # Компакция пишет в сегмент с большим номером, порядок восстанавливаем по id
+        self._index = dict(sorted(self._index.items()))
+        self._active = self._segments[numbers[-1]] if numbers else self._new_segment()
+        self._running = True
+        logger.info(f"Journal opened: {len(self._index)} messages in {len(self._segments)} segments")
+        return self
+
+    def close(self):
+        self._running = False
+        self.commit()
+        with self._lock:
+            for segment in self._segments.values():
+                segment.close()
+            self._segments.clear()
+
+    def _new_segment(self) -> _Segment:
+        number = max(self._segments, default=0) + 1
+        segment = _Segment(self.directory, number)
+        self._segments[number] = segment
+        return segment
+
+    # ======================
+    # ЗАПИСЬ
+    # ======================
+    def append(self, text: str) -> Dict:
+        """Добавить сообщение; при политике always ждет ближайшего group commit"""
+        data = text.encode('utf-8')
+        ts = time.time()
+        with self._lock:
+            if self._active.size + len(data) > self.segment_size and self._active.size:
+                self._dirty.add(self._active)
+                self._active = self._new_segment()
+            segment = self._active
+            msg_id = self._next_id
+            self._next_id += 1
+
+            offset = segment.size
+            os.write(segment.log_fd, data)
+            os.write(segment.idx_fd, INDEX_RECORD.pack(msg_id, offset, len(data), ts, FLAG_MESSAGE))
+            segment.size += len(data)
+            segment.live += 1
+            self._index[msg_id] = (segment.number, offset, len(data), ts)
+            self._dirty.add(segment)
+            self.version += 1
+            self.stats['appends'] += 1
+            commit_event = self._commit_event
+
+        if self.fsync_policy == 'always':
+            commit_event.wait()
+        return {'id': msg_id, 'timestamp': ts, 'length': len(data)}
+
+    def delete(self, msg_id: int) -> bool:
+        with self._lock:
+            entry = self._index.pop(msg_id, None)
+            if entry is None:
+                return False
+            os.write(self._active.idx_fd, INDEX_RECORD.pack(msg_id, 0, 0, time.time(), FLAG_TOMBSTONE))
+            self._segments[entry[0]].live -= 1
+            self._segments[entry[0]].dead += 1
+            self._dirty.add(self._active)
+            self.version += 1
+            return True
+
+    def _take_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            event, self._commit_event = self._commit_event, threading.Event()
+            return dirty, event
+
+    def _fsync(self, segments):
+        if self.fsync_policy != 'never':
+            for segment in segments:
+                segment.fsync()
+
+    def commit(self):
+        """Синхронный group commit всех измененных сегментов"""
+        dirty, event = self._take_dirty()
+        self._fsync(dirty)
+        event.set()
+
+    def run_committer(self):
+        """
+        Фоновый цикл group commit (запускается через ExecutorService.spawn).
+        fsync уходит в пул потоков, ожидающие писатели будятся из этого гринлета.
+        """
+        while self._running:
+            time.sleep(self.commit_interval)
+            if not self._dirty:
+                continue
+            dirty, event = self._take_dirty()
+            try:
+                ExecutorService.run_io(self._fsync, dirty)
+                self.stats['commits'] += 1
+            except Exception as e:
+                logger.error(f"Journal commit error: {str(e)}")
+            finally:
+                event.set()
+
+    # ======================
+    # ЧТЕНИЕ
+    # ======================
+    def _read(self, msg_id: int, limit: Optional[int] = None) -> Optional[Tuple[bytes, float]]:
+        """Чтение под блокировкой: компакция не закроет сегмент посреди pread"""
+        with self._lock:
+            entry = self._index.get(msg_id)
+            if entry is None:
+                return None
+            number, offset, length, ts = entry
+            size = length if limit is None else min(length, limit)
+            return os.pread(self._segments[number].log_fd, size, offset), ts
+
+    def get(self, msg_id: int) -> Optional[Dict]:
+        result = self._read(msg_id)
+        if result is None:
+            return None
+        data, ts = result
+        return {'id': msg_id, 'timestamp': ts, 'text': data.decode('utf-8', errors='replace')}
+
+    def entries(self, limit: Optional[int] = None, before_id: Optional[int] = None) -> List[Dict]:
+        """Метаданные сообщений, новые первыми"""
+        result = []
+        for msg_id in reversed(list(self._index)):
+            if before_id is not None and msg_id >= before_id:
+                continue
+            number, offset, length, ts = self._index[msg_id]
+            result.append({'id': msg_id, 'timestamp': ts, 'length': length})
+            if limit and len(result) >= limit:
+                break
+        return result
+
+    def preview(self, msg_id: int, limit: int) -> str:
+        result = self._read(msg_id, limit)
+        return result[0].decode('utf-8', errors='ignore') if result else ''
+
+    def __len__(self):
+        return len(self._index)
+
+    # ======================
+    # КОМПАКЦИЯ
+    # ======================
+    def compact(self) -> int:
+        """
+        Переписывает закрытые сегменты без удаленных сообщений.
+        Надгробия из закрытых сегментов отбрасываются, кроме тех, чье
+        сообщение есть и в активном сегменте (копия компакции, ставшая
+        активной после перезапуска) - они переносятся в новый сегмент.
+        Возвращает число освобожденных байт.
+        """
+        with self._lock:
+            sealed = [s for s in self._segments.values() if s is not self._active]
+            total = sum(s.live + s.dead for s in sealed)
+            if not sealed or not total or sum(s.dead for s in sealed) / total < self.compact_ratio:
+                return 0
+            sealed_numbers = {s.number for s in sealed}
+            live = [(i, e) for i, e in self._index.items() if e[0] in sealed_numbers]
+            # Дальше в активный сегмент дописываются только новые id
+            active, active_size = self._active, os.fstat(self._active.idx_fd).st_size
+            # Номер резервируется под блокировкой, чтобы не пересечься с ротацией
+            target = self._new_segment()
+
+        # Чтение и копирование идут без блокировки: закрытые сегменты не меняются
+        tombstones = {
+            record[0]: record[3]
+            for segment in sealed for record in segment.scan() if record[4] == FLAG_TOMBSTONE
+        }
+        if tombstones:
+            outside = {record[0] for record in active.scan(active_size) if record[4] == FLAG_MESSAGE}
+            for msg_id in sorted(tombstones.keys() & outside):
+                os.write(target.idx_fd, INDEX_RECORD.pack(msg_id, 0, 0, tombstones[msg_id], FLAG_TOMBSTONE))
+
+        moved = {}
+        for msg_id, (number, offset, length, ts) in live:
+            data = os.pread(self._segments[number].log_fd, length, offset)
+            os.write(target.log_fd, data)
+            os.write(target.idx_fd, INDEX_RECORD.pack(msg_id, target.size, length, ts, FLAG_MESSAGE))
+            moved[msg_id] = (target.number, target.size, length, ts)
+            target.size += length
+        target.fsync()
+
+        with self._lock:
+            freed = sum(s.size for s in sealed) - target.size
+            for msg_id, entry in moved.items():
+                if msg_id in self._index:
+                    self._index[msg_id] = entry
+                    target.live += 1
+                else:
+                    target.dead += 1
+            for segment in sealed:
+                self._segments.pop(segment.number)
+                segment.remove()
+            self.stats['compactions'] += 1
+
+        logger.info(f"Journal compacted {len(sealed)} segments, freed {freed} bytes")
+        return freed
+
+    def status(self) -> Dict:
+        return {
+            'messages': len(self._index),
+            'segments': len(self._segments),
+            'bytes': sum(s.size for s in self._segments.values()),
+            'fsync_policy': self.fsync_policy,
+            **self.stats
+        }
@@ -0,0 +1,245 @@
+# app/services/lifecycle_service.py
+import itertools
+import logging
+import signal
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+from flask import g, jsonify, request
+from ..core.exceptions import ShuttingDownError
+from .executor_service import make_lock
+
+try:
+    import eventlet
+    import eventlet.hubs
+    import greenlet
+except ImportError:  # запуск без eventlet (скрипты, отладка)
+    eventlet = None
+
+logger = logging.getLogger(__name__)
+
+# Проверки и пробы не считаются работой и принимаются всегда
+HEALTH_PATHS = ('/healthz', '/readyz')
+# Бот обращается к API с localhost - его запросы доводятся до конца и при остановке
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+class Lifecycle:
+    """
+    Жизненный цикл процесса: учет выполняемых операций (HTTP, бот,
+    фоновые задачи), готовность для проверок (/readyz) и мягкая остановка
+    по SIGTERM - новые операции отклоняются, текущие дорабатывают до
+    LIFECYCLE_DRAIN_TIMEOUT, затем останавливаются фоновые сервисы.
+    Незавершенные загрузки YouTube продолжаются после запуска из JobStore.
+    """
+    _operations: Dict[int, Tuple[str, str, float]] = {}
+    _ids = itertools.count(1)
+    _lock = make_lock()
+    _checks: 'OrderedDict[str, Callable[[], Tuple[bool, str]]]' = OrderedDict()
+    _hooks: 'OrderedDict[str, Callable[[], None]]' = OrderedDict()
+    _previous_handlers: Dict[int, object] = {}
+    _main = None
+    _draining = False
+    _stopped = False
+    _drain_timeout = 60.0
+    _started_at = time.time()
+
+    @classmethod
+    def init_app(cls, app):
+        cls._drain_timeout = app.config.get('LIFECYCLE_DRAIN_TIMEOUT', 60)
+        app.before_request(cls._before_request)
+        app.teardown_request(cls._teardown_request)
+
+        # Проверки готовности и порядок остановки сервисов приложения
+        from .database_service import Database
+        from .executor_service import ExecutorService
+        from .file_service import FileService
+        from .watcher_service import WatcherService
+        cls.register_check('executor', ExecutorService.health)
+        cls.register_check('catalog', WatcherService.health)
+        cls.register_check('journal', FileService.journal_health)
+        cls.register_check('database', Database.health)
+        cls.on_shutdown('watcher', WatcherService.stop)
+        cls.on_shutdown('journal', FileService.close_journal)
+        cls.on_shutdown('database', Database.dispose)
+        cls.on_shutdown('executor', lambda: ExecutorService.shutdown(wait=False))
+
+    @classmethod
+    def register_check(cls, name: str, check: Callable[[], Tuple[bool, str]]):
+        """Проверка готовности: возвращает (готово, пояснение)"""
+        cls._checks[name] = check
+
+    @classmethod
+    def on_shutdown(cls, name: str, hook: Callable[[], None], first: bool = False):
+        """Действие после дренажа; выполняются в порядке регистрации (first - раньше остальных)"""
+        cls._hooks[name] = hook
+        if first:
+            cls._hooks.move_to_end(name, last=False)
+
+    @classmethod
+    def draining(cls) -> bool:
+        return cls._draining
+
+    # ======================
+    # ОПЕРАЦИИ
+    # ======================
+    @classmethod
+    def begin(cls, kind: str, name: str = '', force: bool = False) -> int:
+        """Зарегистрировать операцию; при остановке новые отклоняются (кроме force)"""
+        if cls._draining and not force:
+            raise ShuttingDownError("Сервер перезапускается, повторите позже")
+        op_id = next(cls._ids)
+        with cls._lock:
+            cls._operations[op_id] = (kind, name, time.monotonic())
+        return op_id
+
+    @classmethod
+    def end(cls, op_id: int):
+        with cls._lock:
+            cls._operations.pop(op_id, None)
+
+    @classmethod
+    @contextmanager
+    def operation(cls, kind: str, name: str = '', force: bool = False):
+        op_id = cls.begin(kind, name, force)
+        try:
+            yield
+        finally:
+            cls.end(op_id)
+
+    @classmethod
+    def in_flight(cls) -> Dict[str, int]:
+        with cls._lock:
+            return dict(Counter(kind for kind, _, _ in cls._operations.values()))
+
+    @classmethod
+    def _before_request(cls):
+        if request.path in HEALTH_PATHS:
+            return None
+        force = request.remote_addr in LOCAL_ADDRESSES
+        try:
+            g.lifecycle_op = cls.begin('http', f"{request.method} {request.path}", force)
+        except ShuttingDownError as e:
+            response = jsonify({"error": str(e)})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(int(cls._drain_timeout))
+            response.headers['Connection'] = 'close'
+            return response
+        return None
+
+    @classmethod
+    def _teardown_request(cls, exc=None):
+        op_id = g.pop('lifecycle_op', None)
+        if op_id is not None:
+            cls.end(op_id)
+
+    # ======================
+    # СОСТОЯНИЕ
+    # ======================
+    @classmethod
+    def liveness(cls) -> Dict:
+        """Процесс жив и обслуживает хаб (в том числе во время остановки)"""
+        return {
+            'status': 'stopped' if cls._stopped else 'stopping' if cls._draining else 'ok',
+            'uptime': round(time.time() - cls._started_at),
+            'in_flight': cls.in_flight()
+        }
+
+    @classmethod
+    def readiness(cls) -> Tuple[bool, Dict]:
+        """Готовность принимать работу: не идет остановка и все проверки прошли"""
+        checks = {}
+        for name, check in list(cls._checks.items()):
+            try:
+                ok, detail = check()
+            except Exception as e:
+                ok, detail = False, str(e)
+            checks[name] = {'ok': ok, 'detail': detail}
+        ready = not cls._draining and all(c['ok'] for c in checks.values())
+        return ready, {
+            'ready': ready,
+            'draining': cls._draining,
+            'checks': checks,
+            'in_flight': cls.in_flight()
+        }
+
+    # ======================
+    # ОСТАНОВКА
+    # ======================
+    @classmethod
+    def shutdown(cls, reason: str = 'shutdown', timeout: Optional[float] = None):
+        """Дренаж: отказ в новой работе, ожидание текущей до срока, остановка сервисов"""
+        if cls._draining:
+            return
+        cls._draining = True
+        timeout = cls._drain_timeout if timeout is None else timeout
+        logger.info(f"Shutdown ({reason}): ожидание операций до {timeout:g} с: {cls.in_flight()}")
+        cls._notify_clients(timeout)
+
+        deadline = time.monotonic() + timeout
+        reported = time.monotonic()
+        while cls._operations and time.monotonic() < deadline:
+            time.sleep(0.2)
+            if time.monotonic() - reported >= 5:
+                reported = time.monotonic()
+                logger.info(f"Shutdown: выполняются {cls.in_flight()}")
+        if cls._operations:
+            with cls._lock:
+                left = [f"{kind} {name}".strip() for kind, name, _ in cls._operations.values()]
+            logger.warning(f"Shutdown: срок истек, прерываются: {', '.join(left)}")
+
+        for name, hook in list(cls._hooks.items()):
+            try:
+                hook()
+            except Exception as e:
+                logger.error(f"Shutdown hook {name} failed: {str(e)}")
+        cls._stopped = True
+        logger.info("Shutdown: завершено")
+
+    @classmethod
+    def _notify_clients(cls, timeout: float):
+        """Клиенты Socket.IO узнают о перезапуске и переподключаются позже"""
+        from .. import socketio
+        try:
+            socketio.emit('server_shutdown', {'retry_after': int(timeout)})
+        except Exception as e:
+            logger.warning(f"Shutdown notice failed: {str(e)}")
+
+    @classmethod
+    def install_signal_handlers(cls, signals=(signal.SIGTERM, signal.SIGINT)):
+        """
+        SIGTERM/SIGINT запускают дренаж в отдельном гринлете. Прежний
+        обработчик (воркер gunicorn) вызывается после дренажа; без него
+        главный гринлет завершается через SystemExit.
+        """
+        if eventlet is not None:
+            cls._main = greenlet.getcurrent()
+        for sig in signals:
+            cls._previous_handlers[sig] = signal.getsignal(sig)
+            signal.signal(sig, cls._handle_signal)
+
+    @classmethod
+    def _handle_signal(cls, sig, frame):
+        if cls._draining:
+            return
+        if eventlet is None:
+            cls.shutdown(signal.Signals(sig).name)
+            cls._finish(sig)
+            return
+        eventlet.spawn_n(cls._drain_and_finish, sig)
+
+    @classmethod
+    def _drain_and_finish(cls, sig):
+        cls.shutdown(signal.Signals(sig).name)
+        cls._finish(sig)
+
+    @classmethod
+    def _finish(cls, sig):
+        previous = cls._previous_handlers.get(sig)
+        if callable(previous) and previous is not signal.default_int_handler:
+            previous(sig, None)
+        elif cls._main is not None:
+            eventlet.hubs.get_hub().schedule_call_global(0, cls._main.throw, SystemExit(0))
+        else:
+            raise SystemExit(0)
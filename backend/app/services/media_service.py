@@ -0,0 +1,229 @@
+# app/services/media_service.py
+import json
+import logging
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from flask import current_app, has_app_context
+from ..core.exceptions import FileProcessingError
+
+logger = logging.getLogger(__name__)
+
+
+class MediaService:
+    """Пробы и постобработка медиафайлов через ffprobe/ffmpeg"""
+
+    @staticmethod
+    def _config(key: str, default):
+        if has_app_context():
+            return current_app.config.get(key, default)
+        return default
+
+    @staticmethod
+    def available() -> bool:
+        return bool(shutil.which('ffmpeg') and shutil.which('ffprobe'))
+
+    @staticmethod
+    def probe(path: Path) -> Dict:
+        """Контейнер и кодеки первых видео- и аудиопотоков"""
+        cmd = [
+            'ffprobe', '-v', 'error',
+            '-show_entries', 'format=format_name,duration:stream=codec_type,codec_name,width,height,bit_rate',
+            '-of', 'json', str(path)
+        ]
+        try:
+            output = subprocess.run(cmd, capture_output=True, check=True, timeout=60).stdout
+        except (OSError, subprocess.SubprocessError) as e:
+            raise FileProcessingError(f"ffprobe error: {str(e)}")
+
+        data = json.loads(output or b'{}')
+        streams = data.get('streams', [])
+        video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+        audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+        return {
+            'container': data.get('format', {}).get('format_name', ''),
+            'duration': float(data.get('format', {}).get('duration') or 0),
+            'video_codec': video.get('codec_name'),
+            'audio_codec': audio.get('codec_name'),
+            'width': video.get('width'),
+            'height': video.get('height')
+        }
+
+    @classmethod
+    def plan(cls, path: Path, info: Dict) -> Dict[str, str]:
+        """
+        Выбор самого дешевого пути к MP4 с целевыми кодеками (по умолчанию H.264+AAC):
+        skip - уже подходит, remux - меняется только контейнер,
+        reencode - перекодируются только неподходящие потоки.
+        """
+        target_video = set(cls._config('MEDIA_TARGET_VIDEO_CODECS', ['h264']))
+        target_audio = set(cls._config('MEDIA_TARGET_AUDIO_CODECS', ['aac']))
+        is_mp4 = path.suffix.lower() in ('.mp4', '.m4v') and 'mp4' in info['container']
+
+        video_ok = info['video_codec'] is None or info['video_codec'] in target_video
+        audio_ok = info['audio_codec'] is None or info['audio_codec'] in target_audio
+        if is_mp4 and video_ok and audio_ok:
+            return {'action': 'skip', 'video': 'copy', 'audio': 'copy'}
+
+        if video_ok and audio_ok:
+            return {'action': 'remux', 'video': 'copy', 'audio': 'copy'}
+
+        return {
+            'action': 'reencode',
+            'video': 'copy' if video_ok else 'encode',
+            'audio': 'copy' if audio_ok else 'encode'
+        }
+
+    @classmethod
+    def postprocess(cls, path, target_ext: str = 'mp4') -> Dict:
+        """
+        Приводит файл к MP4 самым дешевым способом.
+        Возвращает выбранный путь, итоговый файл и время обработки.
+        Вызывать из рабочего потока (ExecutorService.run_io).
+        """
+        path = Path(path)
+        started = time.monotonic()
+        result = {'input': path.name, 'output': path.name, 'action': 'skip', 'seconds': 0.0}
+
+        if not cls.available():
+            logger.warning("ffmpeg/ffprobe not found, postprocessing skipped")
+            result['action'] = 'unavailable'
+            return result
+
+        info = cls.probe(path)
+        plan = cls.plan(path, info)
+        result.update(plan, video_codec=info['video_codec'], audio_codec=info['audio_codec'])
+
+        if plan['action'] != 'skip':
+            output = path.with_suffix(f'.{target_ext}')
+            tmp_output = path.with_name(f'{path.stem}.tmp.{target_ext}')
+            cmd = ['ffmpeg', '-y', '-v', 'error', '-i', str(path), '-map', '0:v:0?', '-map', '0:a:0?']
+            cmd += ['-c:v', 'copy'] if plan['video'] == 'copy' else cls._video_encode_args()
+            cmd += ['-c:a', 'copy'] if plan['audio'] == 'copy' else ['-c:a', 'aac', '-b:a', '160k']
+            threads = int(cls._config('FFMPEG_THREADS', 0))
+            if threads:
+                cmd += ['-threads', str(threads)]
+            cmd += ['-movflags', '+faststart', str(tmp_output)]
+
+            try:
+                subprocess.run(cmd, capture_output=True, check=True)
+            except subprocess.CalledProcessError as e:
+                tmp_output.unlink(missing_ok=True)
+                raise FileProcessingError(f"ffmpeg {plan['action']} error: {e.stderr.decode(errors='replace')[-500:]}")
+
+            os.replace(tmp_output, output)
+            if output != path:
+                path.unlink(missing_ok=True)
+            result['output'] = output.name
+
+        result['seconds'] = round(time.monotonic() - started, 2)
+        logger.info(
+            f"Postprocess {path.name}: {result['action']} "
+            f"(video={result.get('video')}, audio={result.get('audio')}) in {result['seconds']}s"
+        )
+        return result
+
+    @staticmethod
+    def parse_ladder(spec: str) -> List[Dict]:
+        """'360:800,720:2500' -> [{'height': 360, 'bitrate': 800}, ...] (битрейт в кбит/с)"""
+        ladder = []
+        for item in filter(None, (spec or '').split(',')):
+            height, _, bitrate = item.partition(':')
+            ladder.append({'height': int(height), 'bitrate': int(bitrate or 0)})
+        return sorted(ladder, key=lambda r: r['height'])
+
+    @classmethod
+    def package_hls(cls, path, out_dir, ladder: Optional[List[Dict]] = None, segment_seconds: int = 4) -> Dict:
+        """
+        Нарезка видео в HLS. Без лестницы - одна версия копированием потоков
+        (если кодеки подходят для MPEG-TS), иначе по версии на каждую ступень.
+        Пишет master.m3u8 и <версия>/index.m3u8 с сегментами. Вызывать из рабочего потока.
+        """
+        path, out_dir = Path(path), Path(out_dir)
+        if not cls.available():
+            raise FileProcessingError("ffmpeg/ffprobe не найдены")
+        started = time.monotonic()
+        info = cls.probe(path)
+        if info['video_codec'] is None:
+            raise FileProcessingError("Нет видеопотока")
+
+        tmp_dir = out_dir.with_name(out_dir.name + '.tmp')
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        source_height = info['height'] or 0
+        renditions = [r for r in (ladder or []) if not source_height or r['height'] <= source_height]
+        copy = not renditions and cls.plan(path, info)['action'] != 'reencode'
+        if not renditions:
+            renditions = [{'height': source_height, 'bitrate': 0}]
+
+        variants = []
+        try:
+            for rendition in renditions:
+                name = f"{rendition['height']}p" if rendition['height'] else 'source'
+                (tmp_dir / name).mkdir()
+                cmd = ['ffmpeg', '-y', '-v', 'error', '-i', str(path), '-map', '0:v:0', '-map', '0:a:0?']
+                if copy:
+                    cmd += ['-c', 'copy']
+                else:
+                    cmd += cls._video_encode_args() + ['-c:a', 'aac', '-b:a', '128k']
+                    if rendition['bitrate']:
+                        cmd += ['-b:v', f"{rendition['bitrate']}k", '-maxrate', f"{rendition['bitrate']}k",
+                                '-bufsize', f"{rendition['bitrate'] * 2}k"]
+                    if rendition['height'] and rendition['height'] != source_height:
+                        cmd += ['-vf', f"scale=-2:{rendition['height']}"]
+                    # Ключевой кадр на границе каждого сегмента
+                    cmd += ['-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})']
+                threads = int(cls._config('FFMPEG_THREADS', 0))
+                if threads:
+                    cmd += ['-threads', str(threads)]
+                cmd += [
+                    '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_playlist_type', 'vod',
+                    '-hls_segment_filename', str(tmp_dir / name / 'seg_%05d.ts'),
+                    str(tmp_dir / name / 'index.m3u8')
+                ]
+                try:
+                    subprocess.run(cmd, capture_output=True, check=True)
+                except subprocess.CalledProcessError as e:
+                    raise FileProcessingError(f"ffmpeg hls error: {e.stderr.decode(errors='replace')[-500:]}")
+
+                segments = list((tmp_dir / name).glob('seg_*.ts'))
+                size = sum(s.stat().st_size for s in segments)
+                bandwidth = int(size * 8 / info['duration']) if info['duration'] else rendition['bitrate'] * 1000
+                variants.append({'name': name, 'height': rendition['height'], 'bandwidth': bandwidth or 1})
+
+            lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+            for variant in variants:
+                attrs = f"BANDWIDTH={variant['bandwidth']}"
+                if variant['height'] and info['width'] and info['height']:
+                    width = round(info['width'] * variant['height'] / info['height'] / 2) * 2
+                    attrs += f",RESOLUTION={width}x{variant['height']}"
+                lines += [f'#EXT-X-STREAM-INF:{attrs}', f"{variant['name']}/index.m3u8"]
+            (tmp_dir / 'master.m3u8').write_text('\n'.join(lines) + '\n')
+
+            shutil.rmtree(out_dir, ignore_errors=True)
+            os.replace(tmp_dir, out_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        result = {
+            'mode': 'copy' if copy else 'encode',
+            'variants': variants,
+            'seconds': round(time.monotonic() - started, 2)
+        }
+        logger.info(f"HLS {path.name}: {result['mode']}, {len(variants)} variants in {result['seconds']}s")
+        return result
+
+    @classmethod
+    def _video_encode_args(cls) -> list:
+        """Программное перекодирование в H.264 (без аппаратных кодеков)"""
+        return [
+            '-c:v', 'libx264',
+            '-preset', cls._config('FFMPEG_PRESET', 'veryfast'),
+            '-crf', str(cls._config('FFMPEG_CRF', 23)),
+            '-pix_fmt', 'yuv420p'
+        ]
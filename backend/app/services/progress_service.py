@@ -0,0 +1,181 @@
+# app/services/progress_service.py
+import logging
+import time
+from typing import Dict, List, Optional
+from .executor_service import ExecutorService, make_lock
+from .realtime_service import RealtimeService
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('complete', 'error', 'cancelled')
+
+
+class _CountingStream:
+    """Обертка над входным потоком запроса, считающая принятые байты"""
+
+    def __init__(self, stream, op_id: str):
+        self._stream = stream
+        self._op_id = op_id
+        self._received = 0
+
+    def _count(self, data):
+        self._received += len(data)
+        ProgressReporter.update(self._op_id, self._received)
+        return data
+
+    def read(self, *args):
+        return self._count(self._stream.read(*args))
+
+    def readline(self, *args):
+        return self._count(self._stream.readline(*args))
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class ProgressReporter:
+    """
+    Прогресс долгих операций (загрузки, скачивания).
+    Производители вызывают update из любого потока - это только запись
+    в словарь под блокировкой. Один гринлет-эмиттер раз в 1/PROGRESS_EMIT_HZ
+    отправляет по одному событию на каждую изменившуюся операцию.
+    Завершающие события отправляются всегда, даже если промежуточные
+    были объединены.
+    """
+    _ops: Dict[str, Dict] = {}
+    _dirty: set = set()
+    _lock = make_lock()
+    _interval = 0.25
+    _retention = 60
+    _started = False
+
+    @classmethod
+    def init_app(cls, app):
+        cls._interval = 1 / max(float(app.config.get('PROGRESS_EMIT_HZ', 4)), 0.1)
+        cls._retention = app.config.get('PROGRESS_RETENTION', 60)
+        if not cls._started:
+            cls._started = True
+            ExecutorService.spawn(cls._run_emitter)
+
+    # ======================
+    # ПРОИЗВОДИТЕЛИ
+    # ======================
+    @classmethod
+    def start(cls, op_id: str, kind: str, topic: str, total: Optional[int] = None, **meta):
+        now = time.time()
+        with cls._lock:
+            cls._ops[op_id] = {
+                'op_id': op_id,
+                'kind': kind,
+                'topic': topic,
+                'status': 'running',
+                'current': 0,
+                'total': total,
+                'percent': 0.0 if total else None,
+                'rate': None,
+                'eta': None,
+                'started': now,
+                'updated': now,
+                'meta': meta,
+                '_rate_mark': (time.monotonic(), 0)
+            }
+            cls._dirty.add(op_id)
+
+    @classmethod
+    def update(cls, op_id: str, current: Optional[int] = None, total: Optional[int] = None, **meta):
+        """Дешевое обновление состояния; отправка произойдет на ближайшем тике эмиттера"""
+        with cls._lock:
+            state = cls._ops.get(op_id)
+            if state is None or state['status'] != 'running':
+                return
+            if current is not None:
+                state['current'] = current
+            if total:
+                state['total'] = total
+            if meta:
+                state['meta'].update(meta)
+            cls._dirty.add(op_id)
+
+    @classmethod
+    def finish(cls, op_id: str, status: str = 'complete', **meta):
+        """Завершение операции; событие со статусом уйдет гарантированно"""
+        with cls._lock:
+            state = cls._ops.get(op_id)
+            if state is None:
+                return
+            state['status'] = status if status in TERMINAL_STATUSES else 'complete'
+            state['finished'] = time.time()
+            if state['status'] == 'complete' and state['total']:
+                state['current'] = state['total']
+            state['meta'].update(meta)
+            cls._dirty.add(op_id)
+
+    @classmethod
+    def wrap_stream(cls, op_id: str, stream):
+        return _CountingStream(stream, op_id)
+
+    # ======================
+    # ЭМИТТЕР
+    # ======================
+    @classmethod
+    def _run_emitter(cls):
+        while cls._started:
+            time.sleep(cls._interval)
+            try:
+                for state in cls._collect():
+                    RealtimeService.emit('progress', state, topic=state['topic'])
+            except Exception as e:
+                logger.error(f"Progress emitter error: {str(e)}")
+
+    @classmethod
+    def _collect(cls) -> List[Dict]:
+        """Снимки изменившихся операций с пересчетом скорости; очистка старых завершенных"""
+        now = time.monotonic()
+        with cls._lock:
+            dirty, cls._dirty = cls._dirty, set()
+            states = []
+            for op_id in dirty:
+                state = cls._ops.get(op_id)
+                if state is None:
+                    continue
+                mark_time, mark_bytes = state['_rate_mark']
+                if now - mark_time >= 1.0 or state['status'] != 'running':
+                    elapsed = max(now - mark_time, 1e-6)
+                    state['rate'] = round((state['current'] - mark_bytes) / elapsed)
+                    state['_rate_mark'] = (now, state['current'])
+                if state['total']:
+                    state['percent'] = round(min(state['current'] / state['total'], 1.0) * 100, 1)
+                    if state['rate']:
+                        state['eta'] = round(max(state['total'] - state['current'], 0) / state['rate'])
+                state['updated'] = time.time()
+                states.append(cls._public(state))
+
+            expired = [
+                op_id for op_id, state in cls._ops.items()
+                if state.get('finished') and time.time() - state['finished'] > cls._retention
+                and op_id not in dirty
+            ]
+            for op_id in expired:
+                del cls._ops[op_id]
+        return states
+
+    @staticmethod
+    def _public(state: Dict) -> Dict:
+        public = {k: v for k, v in state.items() if not k.startswith('_')}
+        public['meta'] = dict(state['meta'])
+        return public
+
+    @classmethod
+    def snapshot(cls, topic: Optional[str] = None) -> List[Dict]:
+        """Текущее состояние операций для только что подписавшихся клиентов"""
+        with cls._lock:
+            return [
+                cls._public(state) for state in cls._ops.values()
+                if topic is None or state['topic'] == topic
+            ]
+
+    @classmethod
+    def get(cls, op_id: str) -> Optional[Dict]:
+        with cls._lock:
+            state = cls._ops.get(op_id)
+            return cls._public(state) if state else None
@@ -0,0 +1,343 @@
+# app/services/rate_limit_service.py
+import ipaddress
+import logging
+import math
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+from flask import current_app, jsonify, request
+from .auth_service import AuthException, get_current_user
+from .executor_service import make_lock
+from .realtime_service import RealtimeService
+
+try:
+    import redis
+except ImportError:  # redis не установлен - состояние только в памяти процесса
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Корзина полностью восстанавливается за period - после этого запись не нужна
+PRUNE_EVERY = 1000
+# Слот конкурентности, не освобожденный упавшим процессом, истекает сам (только redis)
+SLOT_TTL = 3600
+# Как часто фоновая задача проверяет, освободился ли слот, секунды
+SLOT_POLL = 1.0
+
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+ACQUIRE_SCRIPT = """
+local used = redis.call('INCR', KEYS[1])
+if used > tonumber(ARGV[1]) then
+    redis.call('DECR', KEYS[1])
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+RELEASE_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') > 0 then
+    redis.call('DECR', KEYS[1])
+end
+return 1
+"""
+
+
+def parse_limit(value: str) -> Tuple[int, float]:
+    """'30/60' - 30 запросов за 60 секунд (емкость корзины и время ее наполнения)"""
+    count, _, period = str(value).partition('/')
+    return int(count), float(period or 60)
+
+
+class MemoryBackend:
+    """Корзины и слоты в памяти процесса: хватает для одного воркера"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._slots: Dict[str, int] = {}
+        self._lock = make_lock()
+        self._calls = 0
+
+    def take(self, key: str, capacity: int, period: float, cost: int = 1) -> float:
+        rate = capacity / period
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, period))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now, period)
+            self._calls += 1
+            if self._calls % PRUNE_EVERY == 0:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now: float):
+        stale = [key for key, (_, updated, period) in self._buckets.items() if now - updated > period]
+        for key in stale:
+            del self._buckets[key]
+
+    def acquire(self, pool: str, limit: int) -> bool:
+        with self._lock:
+            used = self._slots.get(pool, 0)
+            if used >= limit:
+                return False
+            self._slots[pool] = used + 1
+            return True
+
+    def release(self, pool: str):
+        with self._lock:
+            self._slots[pool] = max(0, self._slots.get(pool, 0) - 1)
+
+    def stats(self, pools: List[str]) -> Dict:
+        with self._lock:
+            return {'backend': 'memory', 'buckets': len(self._buckets), 'slots': dict(self._slots)}
+
+
+class RedisBackend:
+    """Общее состояние для нескольких процессов: атомарные Lua-скрипты в Redis"""
+
+    def __init__(self, url: str, prefix: str = 'ratelimit:'):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+        self._take = self.client.register_script(TAKE_SCRIPT)
+        self._acquire = self.client.register_script(ACQUIRE_SCRIPT)
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+
+    def take(self, key: str, capacity: int, period: float, cost: int = 1) -> float:
+        return float(self._take(keys=[self.prefix + key], args=[capacity, capacity / period, time.time(), cost]))
+
+    def acquire(self, pool: str, limit: int) -> bool:
+        return bool(self._acquire(keys=[f"{self.prefix}slots:{pool}"], args=[limit, SLOT_TTL]))
+
+    def release(self, pool: str):
+        self._release(keys=[f"{self.prefix}slots:{pool}"])
+
+    def stats(self, pools: List[str]) -> Dict:
+        values = self.client.mget([f"{self.prefix}slots:{pool}" for pool in pools]) if pools else []
+        return {'backend': 'redis', 'slots': {pool: int(v or 0) for pool, v in zip(pools, values)}}
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов: корзины токенов на IP и на пользователя
+    (по JWT) для каждого класса маршрутов (RATE_LIMITS) и общий лимит
+    одновременных тяжелых операций (RATE_CONCURRENCY). При превышении -
+    429 с Retry-After. Состояние в памяти или в Redis для нескольких процессов;
+    если Redis недоступен, запросы пропускаются.
+    """
+    _backend = None
+    _enabled = False
+    _limits: Dict[str, Tuple[int, float]] = {}
+    _concurrency: Dict[str, int] = {}
+    _exempt: List = []
+    _proxies: List = []
+    _busy_retry_after = 15
+    _last_error = 0.0
+
+    @classmethod
+    def init_app(cls, app):
+        cls._enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        cls._limits = {name: parse_limit(value) for name, value in app.config.get('RATE_LIMITS', {}).items()}
+        cls._concurrency = {pool: int(limit) for pool, limit in app.config.get('RATE_CONCURRENCY', {}).items()}
+        cls._exempt = cls._networks(app.config.get('RATE_LIMIT_EXEMPT', []))
+        cls._proxies = cls._networks(app.config.get('RATE_LIMIT_TRUSTED_PROXIES', []))
+        cls._busy_retry_after = app.config.get('RATE_BUSY_RETRY_AFTER', 15)
+
+        cls._backend = MemoryBackend()
+        if app.config.get('RATE_LIMIT_BACKEND') == 'redis':
+            if redis is None:
+                logger.warning("RATE_LIMIT_BACKEND=redis, но пакет redis не установлен - лимиты в памяти процесса")
+            else:
+                cls._backend = RedisBackend(app.config['RATE_LIMIT_REDIS_URL'])
+        if cls._enabled:
+            logger.info(f"Rate limits ({type(cls._backend).__name__}): {app.config.get('RATE_LIMITS')}")
+
+    @staticmethod
+    def _networks(values) -> List:
+        networks = []
+        for value in values:
+            try:
+                networks.append(ipaddress.ip_network(value.strip(), strict=False))
+            except ValueError:
+                logger.warning(f"Rate limit: неверный адрес {value}")
+        return networks
+
+    @staticmethod
+    def _matches(address: str, networks: List) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in networks)
+
+    @classmethod
+    def _client_address(cls) -> Tuple[str, bool]:
+        """Адрес клиента и признак, что он взят из заголовка прокси"""
+        address = request.remote_addr or ''
+        if cls._matches(address, cls._proxies):
+            forwarded = request.headers.get('X-Real-IP') or request.headers.get('X-Forwarded-For', '').split(',')[-1]
+            if forwarded.strip():
+                return forwarded.strip(), True
+        return address, False
+
+    @classmethod
+    def client_ip(cls) -> str:
+        """Адрес клиента; заголовки прокси учитываются только от доверенного прокси (nginx)"""
+        return cls._client_address()[0]
+
+    @staticmethod
+    def request_user() -> Optional[str]:
+        """id пользователя из Bearer JWT (без токена или с неверным - None)"""
+        header = request.headers.get('Authorization', '')
+        if not header.startswith('Bearer '):
+            return None
+        try:
+            return str(get_current_user(header[7:].strip())['id'])
+        except AuthException:
+            return None
+
+    @classmethod
+    def _call(cls, method: str, *args, default=None):
+        """Вызов хранилища; ошибка Redis не должна ронять запрос"""
+        try:
+            return getattr(cls._backend, method)(*args)
+        except Exception as e:
+            now = time.monotonic()
+            if now - cls._last_error > 60:
+                cls._last_error = now
+                logger.error(f"Rate limit backend error: {str(e)}")
+            return default
+
+    @classmethod
+    def hit(cls, route_class: str, user: Optional[str] = None, cost: int = 1) -> float:
+        """
+        Списать запрос из корзин IP и пользователя.
+        Возвращает 0, если запрос разрешен, иначе - сколько секунд ждать.
+        """
+        limit = cls._limits.get(route_class)
+        if not cls._enabled or limit is None:
+            return 0.0
+        ip, forwarded = cls._client_address()
+        # Исключение - только по адресу самого подключения: заголовок может прислать клиент
+        if not forwarded and cls._matches(ip, cls._exempt):
+            return 0.0
+        capacity, period = limit
+        keys = [f"{route_class}:ip:{ip}"]
+        if user:
+            keys.append(f"{route_class}:user:{user}")
+        waits = [cls._call('take', key, capacity, period, cost, default=0.0) for key in keys]
+        return max(waits)
+
+    @classmethod
+    def hit_socket(cls, route_class: str, sid: str) -> int:
+        """То же для события Socket.IO: пользователь - из сессии подключения; секунды ожидания"""
+        user = (RealtimeService.session(sid) or {}).get('user')
+        wait = cls.hit(route_class, str(user['id']) if user else None)
+        return max(1, math.ceil(wait)) if wait else 0
+
+    @classmethod
+    def acquire(cls, pool: str) -> bool:
+        """Занять слот тяжелой операции (без ожидания)"""
+        limit = cls._concurrency.get(pool)
+        if not cls._enabled or not limit:
+            return True
+        return cls._call('acquire', pool, limit, default=True)
+
+    @classmethod
+    def release(cls, pool: str):
+        if cls._enabled and cls._concurrency.get(pool):
+            cls._call('release', pool)
+
+    @classmethod
+    @contextmanager
+    def slot(cls, pool: str):
+        """Слот тяжелой операции для фоновой задачи: ждет освобождения вместо 429"""
+        while not cls.acquire(pool):
+            time.sleep(SLOT_POLL)
+        try:
+            yield
+        finally:
+            cls.release(pool)
+
+    @classmethod
+    def stats(cls) -> Dict:
+        return {
+            'enabled': cls._enabled,
+            'limits': {name: f"{count}/{period:g}" for name, (count, period) in cls._limits.items()},
+            'concurrency': cls._concurrency,
+            **(cls._call('stats', list(cls._concurrency), default={}) or {})
+        }
+
+    @classmethod
+    def busy_retry_after(cls) -> int:
+        return cls._busy_retry_after
+
+
+def too_many_requests(retry_after: float, message: str = "Слишком много запросов"):
+    seconds = max(1, math.ceil(retry_after))
+    response = jsonify({"error": message, "retry_after": seconds})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+
+def rate_limit(route_class: str):
+    """Корзины токенов класса маршрутов (RATE_LIMITS[route_class]) на IP и пользователя"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            wait = RateLimiter.hit(route_class, RateLimiter.request_user())
+            if wait:
+                return too_many_requests(wait)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def concurrency_limit(pool: str, when: Optional[Callable[[], bool]] = None):
+    """
+    Не больше RATE_CONCURRENCY[pool] одновременных вызовов на сервер;
+    when - условие, при котором запрос считается тяжелым (по умолчанию - всегда)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if when is not None and not when():
+                return view(*args, **kwargs)
+            if not RateLimiter.acquire(pool):
+                return too_many_requests(RateLimiter.busy_retry_after(), "Сервер занят, повторите позже")
+            try:
+                return view(*args, **kwargs)
+            finally:
+                RateLimiter.release(pool)
+        return wrapper
+    return decorator
+
+
+def large_upload() -> bool:
+    """Тело запроса не меньше RATE_LARGE_UPLOAD_BYTES"""
+    return (request.content_length or 0) >= current_app.config.get('RATE_LARGE_UPLOAD_BYTES', 10 * 1024 * 1024)
@@ -0,0 +1,187 @@
+# app/services/realtime_service.py
+import logging
+import uuid
+from collections import defaultdict
+from typing import Dict, Optional, Set
+from flask import current_app
+from flask_socketio import join_room, leave_room
+from itsdangerous import BadSignature, URLSafeSerializer
+from .auth_service import AuthException, get_current_user
+from .executor_service import make_lock
+
+logger = logging.getLogger(__name__)
+
+# Темы, на которые клиент подписан, если при подключении не передал свои
+DEFAULT_TOPICS = ('files', 'messages', 'youtube')
+DEVICE_TOKEN_SALT = 'realtime-device'
+
+
+class RealtimeService:
+    """
+    Адресная рассылка событий Socket.IO.
+    Личность клиента проверяется один раз при подключении (JWT),
+    клиент попадает в комнаты user:<id> и device:<id>, а реестр подписок
+    хранит, кто слушает какую тему. События уходят только в комнату темы;
+    если подписчиков нет, событие не отправляется вовсе.
+    """
+    _sessions: Dict[str, Dict] = {}
+    _topics: Dict[str, Set[str]] = defaultdict(set)
+    _lock = make_lock()
+
+    @staticmethod
+    def user_room(user_id) -> str:
+        return f'user:{user_id}'
+
+    @staticmethod
+    def device_room(device_id) -> str:
+        return f'device:{device_id}'
+
+    @staticmethod
+    def topic_room(topic: str) -> str:
+        return f'topic:{topic}'
+
+    @staticmethod
+    def _device_serializer() -> URLSafeSerializer:
+        return URLSafeSerializer(current_app.config['SECRET_KEY'], salt=DEVICE_TOKEN_SALT)
+
+    @classmethod
+    def device_from_token(cls, token) -> Optional[str]:
+        """Идентификатор устройства из подписанного сервером токена; None - токен чужой или испорчен"""
+        if not token:
+            return None
+        try:
+            device = cls._device_serializer().loads(str(token))
+        except BadSignature:
+            return None
+        return device if isinstance(device, str) else None
+
+    @classmethod
+    def issue_device(cls) -> Dict[str, str]:
+        device = uuid.uuid4().hex
+        return {'device': device, 'device_token': cls._device_serializer().dumps(device)}
+
+    @staticmethod
+    def authenticate(auth: Optional[dict], args) -> Optional[Dict]:
+        """
+        Пользователь по токену из auth.token или ?token=.
+        Без токена - анонимный клиент (если SOCKET_AUTH_REQUIRED выключен).
+        """
+        token = (auth or {}).get('token') or args.get('token')
+        if not token:
+            if current_app.config.get('SOCKET_AUTH_REQUIRED'):
+                raise ConnectionRefusedError('unauthorized')
+            return None
+        try:
+            return get_current_user(token)
+        except AuthException as e:
+            raise ConnectionRefusedError(str(e))
+
+    @classmethod
+    def connect(cls, sid: str, auth: Optional[dict], args, namespace: str = '/') -> Dict:
+        """
+        Регистрация подключения: комнаты пользователя, устройства и подписки.
+        Идентификатор устройства выдает сервер: клиент предъявляет подписанный
+        device_token, без него (или с поддельным) получает новый - чужую
+        комнату device:<id> и передачи устройства занять нельзя.
+        """
+        user = cls.authenticate(auth, args)
+        auth = auth or {}
+        token = auth.get('device_token') or args.get('device_token')
+        device = cls.device_from_token(token)
+        issued = {'device': device, 'device_token': token} if device else cls.issue_device()
+        session = {'user': user, **issued, 'topics': set(), 'namespace': namespace}
+        with cls._lock:
+            cls._sessions[sid] = session
+
+        if user:
+            join_room(cls.user_room(user['id']), sid=sid, namespace=namespace)
+        join_room(cls.device_room(session['device']), sid=sid, namespace=namespace)
+        for topic in auth.get('topics') or DEFAULT_TOPICS:
+            cls.subscribe(sid, topic)
+        return session
+
+    @classmethod
+    def disconnect(cls, sid: str):
+        with cls._lock:
+            session = cls._sessions.pop(sid, None)
+            if session is None:
+                return
+            for topic in session['topics']:
+                subscribers = cls._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(sid)
+                    if not subscribers:
+                        del cls._topics[topic]
+
+    @classmethod
+    def session(cls, sid: str) -> Optional[Dict]:
+        return cls._sessions.get(sid)
+
+    @classmethod
+    def subscribe(cls, sid: str, topic: str) -> bool:
+        with cls._lock:
+            session = cls._sessions.get(sid)
+            if session is None or topic in session['topics']:
+                return False
+            session['topics'].add(topic)
+            cls._topics[topic].add(sid)
+        join_room(cls.topic_room(topic), sid=sid, namespace=session['namespace'])
+        return True
+
+    @classmethod
+    def unsubscribe(cls, sid: str, topic: str) -> bool:
+        with cls._lock:
+            session = cls._sessions.get(sid)
+            if session is None or topic not in session['topics']:
+                return False
+            session['topics'].discard(topic)
+            subscribers = cls._topics.get(topic, set())
+            subscribers.discard(sid)
+            if not subscribers:
+                cls._topics.pop(topic, None)
+        leave_room(cls.topic_room(topic), sid=sid, namespace=session['namespace'])
+        return True
+
+    @classmethod
+    def subscribers(cls, topic: str) -> int:
+        return len(cls._topics.get(topic, ()))
+
+    @classmethod
+    def emit(cls, event: str, data=None, topic: Optional[str] = None, user_id=None,
+             device: Optional[str] = None, skip_sid: Optional[str] = None, namespace: str = '/') -> bool:
+        """
+        Событие подписчикам темы, пользователю или устройству.
+        Возвращает False, если получателей нет и отправка пропущена.
+        """
+        from .. import socketio
+
+        if topic is not None:
+            with cls._lock:
+                namespaces = {
+                    cls._sessions[sid]['namespace']
+                    for sid in cls._topics.get(topic, ()) if sid in cls._sessions
+                }
+            if not namespaces:
+                return False
+            for ns in namespaces:
+                socketio.emit(event, data, to=cls.topic_room(topic), skip_sid=skip_sid, namespace=ns)
+            return True
+
+        if user_id is not None:
+            room = cls.user_room(user_id)
+        elif device is not None:
+            room = cls.device_room(device)
+        else:
+            raise ValueError("Не указан получатель события")
+
+        socketio.emit(event, data, to=room, skip_sid=skip_sid, namespace=namespace)
+        return True
+
+    @classmethod
+    def stats(cls) -> Dict:
+        with cls._lock:
+            return {
+                'connections': len(cls._sessions),
+                'authenticated': sum(1 for s in cls._sessions.values() if s['user']),
+                'topics': {topic: len(sids) for topic, sids in cls._topics.items()}
+            }
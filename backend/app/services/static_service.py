@@ -0,0 +1,156 @@
+# app/services/static_service.py
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional
+from flask import Response, request, send_file
+from ..core.compression import ENCODING_SUFFIXES, choose_encoding, compress, compressible, supported_encodings
+from .executor_service import ExecutorService
+
+logger = logging.getLogger(__name__)
+
+# Имена сборки Vite с хешем содержимого: index-DSlQXyEP.js
+HASHED_NAME_RE = re.compile(r'[-.][A-Za-z0-9_-]{8,}\.[a-z0-9]+$')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+
+class StaticAssets:
+    """
+    Раздача собранного фронтенда (frontend/dist) по манифесту.
+    Манифест строится при старте: размер, ETag по содержимому, тип,
+    предсжатые варианты br/gzip. Мелкие файлы и сжатые варианты держатся
+    в памяти, SPA-маршруты разрешаются в index.html без обращения к диску.
+    """
+    _root: Optional[Path] = None
+    _manifest: Dict[str, Dict] = {}
+    _memory_max = 256 * 1024
+    _compress_min = 1024
+    _compress_max = 8 * 1024 * 1024
+
+    @classmethod
+    def init_app(cls, app):
+        root = Path(app.config.get('STATIC_DIST_DIR') or os.path.join(app.root_path, '../frontend/dist')).resolve()
+        cls._memory_max = app.config.get('STATIC_MEMORY_MAX', 256 * 1024)
+        cls._compress_min = app.config.get('STATIC_COMPRESS_MIN', 1024)
+        cls._compress_max = app.config.get('STATIC_COMPRESS_MAX', 8 * 1024 * 1024)
+        # Манифест общий для всех экземпляров приложения в процессе
+        if root != cls._root or not cls._manifest:
+            cls._root = root
+            cls.reload()
+
+        app.add_url_rule('/', 'index', cls.serve, defaults={'path': ''})
+        app.add_url_rule('/<path:path>', 'serve_static', cls.serve)
+
+    @classmethod
+    def reload(cls):
+        """Пересобрать манифест (после новой сборки фронтенда)"""
+        if not cls._root.is_dir():
+            logger.warning(f"Frontend dist not found: {cls._root}")
+            cls._manifest = {}
+            return
+
+        manifest = {}
+        for path in cls._root.rglob('*'):
+            if not path.is_file() or path.suffix in ('.br', '.gz'):
+                continue
+            rel = path.relative_to(cls._root).as_posix()
+            manifest[rel] = cls._entry(path, rel)
+        cls._manifest = manifest
+        logger.info(f"Static manifest: {len(manifest)} files from {cls._root}")
+
+        # Недостающие сжатые варианты считаются в фоне, до готовности отдается оригинал
+        ExecutorService.spawn(cls._precompress, list(manifest.values()))
+
+    @classmethod
+    def _entry(cls, path: Path, rel: str) -> Dict:
+        data = path.read_bytes()
+        mimetype = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        entry = {
+            'path': str(path),
+            'size': len(data),
+            'mimetype': mimetype,
+            'etag': hashlib.sha256(data).hexdigest()[:20],
+            'immutable': bool(HASHED_NAME_RE.search(path.name)) and rel.startswith('assets/'),
+            'data': data if len(data) <= cls._memory_max else None,
+            'variants': {}
+        }
+        # Варианты, сжатые при сборке, берутся с диска
+        for encoding, suffix in ENCODING_SUFFIXES.items():
+            compressed = path.with_name(path.name + suffix)
+            if compressed.is_file():
+                entry['variants'][encoding] = {'path': str(compressed), 'size': compressed.stat().st_size, 'data': None}
+        return entry
+
+    @classmethod
+    def _precompress(cls, entries):
+        for entry in entries:
+            if not compressible(entry['mimetype']) or not cls._compress_min <= entry['size'] <= cls._compress_max:
+                continue
+            for encoding in supported_encodings():
+                if encoding in entry['variants']:
+                    continue
+                try:
+                    data = entry['data'] or Path(entry['path']).read_bytes()
+                    compressed = ExecutorService.run_cpu(compress, data, encoding)
+                except Exception as e:
+                    logger.error(f"Precompress {entry['path']} ({encoding}) failed: {str(e)}")
+                    continue
+                # Сжатие, не давшее выигрыша, не используется
+                if len(compressed) < entry['size'] * 0.95:
+                    entry['variants'][encoding] = {'path': None, 'size': len(compressed), 'data': compressed}
+
+    @classmethod
+    def resolve(cls, path: str) -> Optional[Dict]:
+        """Запись манифеста; маршруты SPA (без расширения) ведут на index.html"""
+        path = path.strip('/') or 'index.html'
+        if path.startswith(('api/', 'socket.io/')):
+            return None
+        entry = cls._manifest.get(path) or cls._manifest.get(f'{path}/index.html')
+        if entry is None and '.' not in path.rsplit('/', 1)[-1]:
+            entry = cls._manifest.get('index.html')
+        return entry
+
+    @classmethod
+    def serve(cls, path: str):
+        entry = cls.resolve(path)
+        if entry is None:
+            return Response('Not Found', status=404, mimetype='text/plain')
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), list(entry['variants']))
+        etag = f"{entry['etag']}-{encoding}" if encoding else entry['etag']
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': IMMUTABLE_CACHE if entry['immutable'] else REVALIDATE_CACHE,
+            'Vary': 'Accept-Encoding'
+        }
+
+        if etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+
+        variant = entry['variants'][encoding] if encoding else entry
+        if encoding:
+            headers['Content-Encoding'] = encoding
+
+        if variant['data'] is not None:
+            response = Response(variant['data'], mimetype=entry['mimetype'])
+        else:
+            response = send_file(variant['path'], mimetype=entry['mimetype'], conditional=False, etag=False)
+        response.headers.update(headers)
+        response.content_length = variant['size']
+        return response
+
+    @classmethod
+    def status(cls) -> Dict:
+        return {
+            'root': str(cls._root),
+            'files': len(cls._manifest),
+            'in_memory': sum(1 for e in cls._manifest.values() if e['data'] is not None),
+            'compressed': {
+                encoding: sum(1 for e in cls._manifest.values() if encoding in e['variants'])
+                for encoding in ENCODING_SUFFIXES
+            }
+        }
@@ -0,0 +1,456 @@
+# app/services/storage_service.py
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+from ..core.exceptions import InvalidFileError
+from .executor_service import make_lock
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # boto3 не установлен - доступен только локальный диск
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _check_key(key: str) -> str:
+    """Ключ - плоское имя файла без путей и скрытых префиксов"""
+    if not key or '/' in key or '\\' in key or key.startswith('.'):
+        raise InvalidFileError(f"Недопустимое имя: {key}")
+    return key
+
+
+class StorageDriver:
+    """
+    Хранилище загруженных файлов: put (поток), get (диапазон), stat,
+    list (постранично), delete, move. url() возвращает прямую ссылку, если
+    драйвер умеет отдавать файлы мимо приложения, иначе None.
+    """
+    name = 'base'
+
+    def put(self, key: str, stream: BinaryIO, size: Optional[int] = None,
+            content_type: Optional[str] = None) -> Dict:
+        raise NotImplementedError
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> Dict:
+        """Готовый файл с диска; исходный файл после вызова не нужен"""
+        with open(path, 'rb') as f:
+            entry = self.put(key, f, os.path.getsize(path), content_type)
+        os.unlink(path)
+        return entry
+
+    def get(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Содержимое [start, end] (end включительно, как в Range)"""
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def list(self, cursor: Optional[str] = None, limit: int = 1000) -> Tuple[List[Dict], Optional[str]]:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def move(self, key: str, new_key: str) -> bool:
+        """Переименование без перезаписи: FileExistsError, если new_key занят"""
+        raise NotImplementedError
+
+    def url(self, key: str, download_name: Optional[str] = None, expires: int = 3600) -> Optional[str]:
+        return None
+
+    def local_path(self, key: str) -> Optional[str]:
+        return None
+
+
+class LocalStorage(StorageDriver):
+    """Папка на диске (UPLOAD_FOLDER); скрытые файлы и папки (.hls, .upload-*) не видны"""
+    name = 'local'
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.root / _check_key(key)
+
+    def put(self, key, stream, size=None, content_type=None):
+        path = self._path(key)
+        # Запись во временный файл и атомарная замена: читатели не видят недописанный файл
+        tmp_path = self.root / f".upload-{uuid.uuid4().hex}"
+        try:
+            with open(tmp_path, 'wb') as f:
+                shutil.copyfileobj(stream, f, CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return self.stat(key)
+
+    def put_file(self, key, path, content_type=None):
+        # Файл уже в папке загрузок - перенос без копирования
+        os.replace(path, self._path(key))
+        return self.stat(key)
+
+    def get(self, key, start=0, end=None):
+        with open(self._path(key), 'rb') as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    @staticmethod
+    def _entry(name: str, stat: os.stat_result) -> Dict:
+        return {
+            'key': name,
+            'size': stat.st_size,
+            'modified': stat.st_mtime,
+            'created': stat.st_ctime,
+            'etag': f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        }
+
+    def stat(self, key):
+        try:
+            stat = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        return self._entry(key, stat)
+
+    def list(self, cursor=None, limit=1000):
+        names = sorted(
+            entry.name for entry in os.scandir(self.root)
+            if entry.is_file() and not entry.name.startswith('.') and (cursor is None or entry.name > cursor)
+        )
+        items = []
+        for name in names[:limit]:
+            try:
+                items.append(self._entry(name, os.stat(self.root / name)))
+            except FileNotFoundError:
+                continue
+        return items, (names[limit - 1] if len(names) > limit else None)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def move(self, key, new_key):
+        path, new_path = self._path(key), self._path(new_key)
+        if new_path.exists():
+            raise FileExistsError(new_key)
+        try:
+            os.rename(path, new_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def local_path(self, key):
+        path = self._path(key)
+        return str(path) if path.is_file() else None
+
+
+class S3Storage(StorageDriver):
+    """
+    S3-совместимое хранилище (AWS, MinIO). Большие файлы загружаются
+    multipart-частями, скачивание идет по presigned-ссылкам мимо приложения.
+    """
+    name = 's3'
+
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, multipart_threshold: int = 16 * 1024 * 1024,
+                 part_size: int = 16 * 1024 * 1024):
+        if boto3 is None:
+            raise RuntimeError("Для STORAGE_BACKEND=s3 нужен пакет boto3")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.part_size = part_size
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            # MinIO и большинство совместимых серверов требуют path-style адресацию
+            config=BotoConfig(signature_version='s3v4', s3={'addressing_style': 'path'})
+        )
+        self.transfer = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=part_size,
+            max_concurrency=4,
+            use_threads=True
+        )
+
+    def _key(self, key: str) -> str:
+        return self.prefix + _check_key(key)
+
+    def put(self, key, stream, size=None, content_type=None):
+        extra = {'ContentType': content_type} if content_type else {}
+        self.client.upload_fileobj(stream, self.bucket, self._key(key), ExtraArgs=extra, Config=self.transfer)
+        return self.stat(key)
+
+    def get(self, key, start=0, end=None):
+        params = {'Bucket': self.bucket, 'Key': self._key(key)}
+        if start or end is not None:
+            params['Range'] = f"bytes={start}-{'' if end is None else end}"
+        body = self.client.get_object(**params)['Body']
+        try:
+            yield from body.iter_chunks(CHUNK_SIZE)
+        finally:
+            body.close()
+
+    @staticmethod
+    def _entry(key: str, size: int, modified: datetime, etag: str) -> Dict:
+        # S3 не хранит время создания - используется время последней записи
+        return {
+            'key': key,
+            'size': size,
+            'modified': modified.timestamp(),
+            'created': modified.timestamp(),
+            'etag': etag.strip('"')
+        }
+
+    def stat(self, key):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return self._entry(key, head['ContentLength'], head['LastModified'], head['ETag'])
+
+    def list(self, cursor=None, limit=1000):
+        params = {'Bucket': self.bucket, 'Prefix': self.prefix, 'MaxKeys': limit}
+        if cursor:
+            params['ContinuationToken'] = cursor
+        response = self.client.list_objects_v2(**params)
+        items = [
+            self._entry(obj['Key'][len(self.prefix):], obj['Size'], obj['LastModified'], obj['ETag'])
+            for obj in response.get('Contents', [])
+            if '/' not in obj['Key'][len(self.prefix):]
+        ]
+        return items, response.get('NextContinuationToken')
+
+    def delete(self, key):
+        if self.stat(key) is None:
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        return True
+
+    def move(self, key, new_key):
+        # Переименования в S3 нет: копия на стороне сервера (multipart для больших) и удаление
+        if self.stat(new_key) is not None:
+            raise FileExistsError(new_key)
+        if self.stat(key) is None:
+            return False
+        source = {'Bucket': self.bucket, 'Key': self._key(key)}
+        self.client.copy(source, self.bucket, self._key(new_key), Config=self.transfer)
+        self.client.delete_object(**source)
+        return True
+
+    def url(self, key, download_name=None, expires=3600):
+        params = {'Bucket': self.bucket, 'Key': self._key(key)}
+        if download_name:
+            params['ResponseContentDisposition'] = f"attachment; filename*=UTF-8''{quote(download_name)}"
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=expires)
+
+    # Прямая загрузка клиентом: части идут в S3 по presigned-ссылкам, минуя приложение
+    def create_multipart(self, key: str, size: int, content_type: Optional[str] = None,
+                         expires: int = 3600) -> Dict:
+        extra = {'ContentType': content_type} if content_type else {}
+        upload = self.client.create_multipart_upload(Bucket=self.bucket, Key=self._key(key), **extra)
+        parts = max(1, -(-size // self.part_size))
+        return {
+            'upload_id': upload['UploadId'],
+            'part_size': self.part_size,
+            'urls': [
+                self.client.generate_presigned_url('upload_part', Params={
+                    'Bucket': self.bucket, 'Key': self._key(key),
+                    'UploadId': upload['UploadId'], 'PartNumber': number
+                }, ExpiresIn=expires)
+                for number in range(1, parts + 1)
+            ]
+        }
+
+    def complete_multipart(self, key: str, upload_id: str, parts: List[Dict]) -> Dict:
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self._key(key), UploadId=upload_id,
+            MultipartUpload={'Parts': [
+                {'PartNumber': int(p['part_number']), 'ETag': p['etag']}
+                for p in sorted(parts, key=lambda p: int(p['part_number']))
+            ]}
+        )
+        return self.stat(key)
+
+    def abort_multipart(self, key: str, upload_id: str):
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self._key(key), UploadId=upload_id)
+
+
+class StorageService:
+    """
+    Точка доступа к хранилищу загрузок (STORAGE_BACKEND=local|s3).
+    Код, которому нужен путь на диске (окна текста, хеши, отправка в Telegram),
+    получает его через local_copy: для S3 объект скачивается в кеш и
+    переиспользуется, пока не изменится его ETag.
+    """
+    _driver: Optional[StorageDriver] = None
+    _cache_dir: Optional[Path] = None
+    _cached: Dict[str, str] = {}
+    _generation = 0
+    _lock = make_lock()
+    _url_expires = 3600
+
+    @classmethod
+    def init_app(cls, app):
+        backend = app.config.get('STORAGE_BACKEND', 'local')
+        if backend == 's3':
+            cls._driver = S3Storage(
+                app.config['S3_BUCKET'],
+                prefix=app.config.get('S3_PREFIX', ''),
+                endpoint_url=app.config.get('S3_ENDPOINT_URL'),
+                region=app.config.get('S3_REGION'),
+                access_key=app.config.get('S3_ACCESS_KEY'),
+                secret_key=app.config.get('S3_SECRET_KEY'),
+                multipart_threshold=app.config.get('S3_MULTIPART_THRESHOLD', 16 * 1024 * 1024),
+                part_size=app.config.get('S3_PART_SIZE', 16 * 1024 * 1024)
+            )
+        else:
+            cls._driver = LocalStorage(app.config['UPLOAD_FOLDER'])
+        cls._cache_dir = Path(app.config.get('STORAGE_CACHE_DIR') or Path(app.instance_path) / 'storage_cache')
+        cls._url_expires = app.config.get('STORAGE_URL_EXPIRES', 3600)
+        logger.info(f"Storage backend: {cls._driver.name}")
+
+    @classmethod
+    def driver(cls) -> StorageDriver:
+        return cls._driver
+
+    @classmethod
+    def is_local(cls) -> bool:
+        return isinstance(cls._driver, LocalStorage)
+
+    @classmethod
+    def generation(cls) -> int:
+        """Счетчик изменений через это приложение (версия списка для не-локальных драйверов)"""
+        return cls._generation
+
+    @classmethod
+    def _bump(cls, key: str):
+        with cls._lock:
+            cls._generation += 1
+            cls._cached.pop(key, None)
+
+    # Все методы ниже блокирующие - вызывать из run_io
+    @classmethod
+    def put(cls, key: str, stream: BinaryIO, size: Optional[int] = None,
+            content_type: Optional[str] = None) -> Dict:
+        entry = cls._driver.put(key, stream, size, content_type)
+        cls._bump(key)
+        return entry
+
+    @classmethod
+    def put_file(cls, key: str, path: str, content_type: Optional[str] = None) -> Dict:
+        entry = cls._driver.put_file(key, path, content_type)
+        cls._bump(key)
+        return entry
+
+    @classmethod
+    def delete(cls, key: str) -> bool:
+        removed = cls._driver.delete(key)
+        cls._bump(key)
+        if cls._cache_dir is not None:
+            (cls._cache_dir / key).unlink(missing_ok=True)
+        return removed
+
+    @classmethod
+    def move(cls, key: str, new_key: str) -> bool:
+        moved = cls._driver.move(key, new_key)
+        cls._bump(key)
+        cls._bump(new_key)
+        if cls._cache_dir is not None:
+            (cls._cache_dir / key).unlink(missing_ok=True)
+        return moved
+
+    @classmethod
+    def stat(cls, key: str) -> Optional[Dict]:
+        return cls._driver.stat(key)
+
+    @classmethod
+    def list_all(cls, page_size: int = 1000) -> List[Dict]:
+        items, cursor = cls._driver.list(None, page_size)
+        while cursor:
+            page, cursor = cls._driver.list(cursor, page_size)
+            items.extend(page)
+        return items
+
+    @classmethod
+    def url(cls, key: str, download_name: Optional[str] = None) -> Optional[str]:
+        return cls._driver.url(key, download_name, cls._url_expires)
+
+    @classmethod
+    def local_path(cls, key: str) -> Optional[str]:
+        return cls._driver.local_path(key)
+
+    @classmethod
+    def supports_multipart(cls) -> bool:
+        return isinstance(cls._driver, S3Storage)
+
+    @classmethod
+    def create_multipart(cls, key: str, size: int, content_type: Optional[str] = None) -> Dict:
+        return cls._driver.create_multipart(key, size, content_type, cls._url_expires)
+
+    @classmethod
+    def complete_multipart(cls, key: str, upload_id: str, parts: List[Dict]) -> Dict:
+        entry = cls._driver.complete_multipart(key, upload_id, parts)
+        cls._bump(key)
+        return entry
+
+    @classmethod
+    def abort_multipart(cls, key: str, upload_id: str):
+        cls._driver.abort_multipart(key, upload_id)
+
+    @classmethod
+    def local_copy(cls, key: str) -> Optional[str]:
+        """Путь на диске к актуальной версии объекта; None, если объекта нет"""
+        path = cls._driver.local_path(key)
+        if path is not None or cls.is_local():
+            return path
+
+        entry = cls._driver.stat(key)
+        if entry is None:
+            return None
+        path = cls._cache_dir / _check_key(key)
+        with cls._lock:
+            fresh = cls._cached.get(key) == entry['etag'] and path.is_file()
+        if fresh:
+            return str(path)
+
+        cls._cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cls._cache_dir / f".{key}.{uuid.uuid4().hex}"
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in cls._driver.get(key):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        with cls._lock:
+            cls._cached[key] = entry['etag']
+        return str(path)
@@ -0,0 +1,116 @@
+# app/services/tag_store.py
+import logging
+import re
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import and_, bindparam, delete, select
+from ..core.exceptions import InvalidFileError
+from ..models import FileTag
+from .database_service import Database
+
+logger = logging.getLogger(__name__)
+
+TAG_RE = re.compile(r'^[\w-]{1,32}$')
+
+file_tags = FileTag.__table__
+# Больше имен - фильтр в Python, чтобы не упираться в лимит параметров запроса
+IN_LIST_LIMIT = 500
+
+
+def check_tags(tags: Iterable[str]) -> List[str]:
+    """Теги - короткие слова (буквы, цифры, _ и -), регистр не важен"""
+    result = []
+    for tag in tags:
+        tag = str(tag).strip().lstrip('#').lower()
+        if not TAG_RE.match(tag):
+            raise InvalidFileError(f"Недопустимый тег: {tag}")
+        result.append(tag)
+    return result
+
+
+class TagStore:
+    """
+    Теги файлов в общей базе (Database). Хранятся отдельно от файлов,
+    поэтому работают и для S3; при удалении и переименовании файла теги
+    переносятся сервисом файлов. version растет с каждым изменением.
+    """
+    version = 0
+
+    @classmethod
+    def open(cls, legacy_path=None):
+        """Теги из прежнего tags.sqlite3 переносятся в базу один раз"""
+        if legacy_path and Database.ready():
+            Database.run(Database.import_sqlite, legacy_path, file_tags)
+
+    @classmethod
+    def _write(cls, stmt, rows: List[Dict]):
+        if not rows:
+            return
+
+        def run():
+            with Database.begin() as connection:
+                connection.execute(stmt, rows)
+        Database.run(run)
+        cls.version += 1
+
+    @staticmethod
+    def _fetch(stmt) -> List:
+        if not Database.ready():
+            return []
+
+        def run():
+            with Database.connect() as connection:
+                return connection.execute(stmt).fetchall()
+        return Database.run(run)
+
+    @classmethod
+    def add(cls, names: Iterable[str], tags: Iterable[str]):
+        tags = list(tags)
+        cls._write(Database.upsert(file_tags, ['name', 'tag']),
+                   [{'name': name, 'tag': tag} for name in names for tag in tags])
+
+    @classmethod
+    def remove(cls, names: Iterable[str], tags: Iterable[str]):
+        tags = list(tags)
+        stmt = delete(file_tags).where(and_(
+            file_tags.c.name == bindparam('b_name'), file_tags.c.tag == bindparam('b_tag')
+        ))
+        cls._write(stmt, [{'b_name': name, 'b_tag': tag} for name in names for tag in tags])
+
+    @classmethod
+    def drop(cls, names: Iterable[str]):
+        cls._write(delete(file_tags).where(file_tags.c.name == bindparam('b_name')),
+                   [{'b_name': name} for name in names])
+
+    @classmethod
+    def rename(cls, name: str, new_name: str):
+        """Теги переходят к новому имени (совпадающие с уже имеющимися не дублируются)"""
+        def run():
+            with Database.begin() as connection:
+                tags = connection.execute(select(file_tags.c.tag).where(file_tags.c.name == name)).scalars().all()
+                if not tags:
+                    return False
+                connection.execute(delete(file_tags).where(file_tags.c.name == name))
+                connection.execute(Database.upsert(file_tags, ['name', 'tag']),
+                                   [{'name': new_name, 'tag': tag} for tag in tags])
+                return True
+        if Database.run(run):
+            cls.version += 1
+
+    @classmethod
+    def tags_of(cls, names: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+        """Теги файлов names (или всех файлов с тегами)"""
+        stmt = select(file_tags.c.name, file_tags.c.tag).order_by(file_tags.c.name, file_tags.c.tag)
+        wanted = set(names) if names is not None else None
+        if wanted is not None and len(wanted) <= IN_LIST_LIMIT:
+            stmt = stmt.where(file_tags.c.name.in_(wanted))
+        rows = cls._fetch(stmt)
+        result: Dict[str, List[str]] = {}
+        for name, tag in rows:
+            if wanted is None or name in wanted:
+                result.setdefault(name, []).append(tag)
+        return result
+
+    @classmethod
+    def names_with(cls, tag: str) -> List[str]:
+        rows = cls._fetch(select(file_tags.c.name).where(file_tags.c.tag == tag).order_by(file_tags.c.name))
+        return [row[0] for row in rows]
@@ -0,0 +1,107 @@
+# app/services/telegram_cache_service.py
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from .executor_service import make_lock
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramFileCache:
+    """
+    Соответствие сохраненного файла (имя + хеш содержимого) и file_id в Telegram.
+    Повторная отправка по file_id не загружает байты заново.
+    Запись проверяется по size/mtime, при расхождении mtime - по хешу.
+    """
+    _path: Optional[Path] = None
+    _entries: Dict[str, Dict] = {}
+    _lock = make_lock()
+
+    @classmethod
+    def init_app(cls, app):
+        cls._path = Path(app.config.get('TELEGRAM_FILE_CACHE', Path(app.instance_path) / 'telegram_file_ids.json'))
+        cls._entries = cls._load()
+        logger.info(f"Telegram file cache: {len(cls._entries)} entries")
+
+    @classmethod
+    def _load(cls) -> Dict[str, Dict]:
+        try:
+            if cls._path.exists():
+                with open(cls._path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.error(f"Telegram cache load error: {str(e)}")
+        return {}
+
+    @classmethod
+    def _save(cls):
+        """Атомарная запись: временный файл + os.replace (вызывается под блокировкой)"""
+        if cls._path is None:
+            return
+        try:
+            cls._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cls._path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(cls._entries, f)
+            os.replace(tmp_path, cls._path)
+        except Exception as e:
+            logger.error(f"Telegram cache save error: {str(e)}")
+
+    @staticmethod
+    def _hash(filepath) -> str:
+        from .file_service import _hash_file
+        return _hash_file(str(filepath))
+
+    @classmethod
+    def lookup(cls, filename: str, filepath) -> Optional[Tuple[str, str]]:
+        """(kind, file_id) для актуальной версии файла или None. Блокирующий вызов"""
+        with cls._lock:
+            entry = cls._entries.get(filename)
+        if entry is None:
+            return None
+
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            cls.invalidate(filename)
+            return None
+
+        if stat.st_size != entry['size']:
+            cls.invalidate(filename)
+            return None
+        if stat.st_mtime_ns != entry['mtime_ns']:
+            # Файл перезаписан: тот же размер еще не значит то же содержимое
+            if cls._hash(filepath) != entry['hash']:
+                cls.invalidate(filename)
+                return None
+            with cls._lock:
+                entry['mtime_ns'] = stat.st_mtime_ns
+                cls._save()
+        return entry['kind'], entry['file_id']
+
+    @classmethod
+    def remember(cls, filename: str, filepath, kind: str, file_id: str, content_hash: Optional[str] = None):
+        """Запомнить file_id для текущей версии файла. Блокирующий вызов"""
+        try:
+            stat = os.stat(filepath)
+            entry = {
+                'file_id': file_id,
+                'kind': kind,
+                'hash': content_hash or cls._hash(filepath),
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns
+            }
+        except OSError as e:
+            logger.error(f"Telegram cache remember error: {str(e)}")
+            return
+        with cls._lock:
+            cls._entries[filename] = entry
+            cls._save()
+
+    @classmethod
+    def invalidate(cls, filename: str):
+        with cls._lock:
+            if cls._entries.pop(filename, None) is not None:
+                cls._save()
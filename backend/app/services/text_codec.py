@@ -0,0 +1,336 @@
+# app/services/text_codec.py
+import io
+import logging
+import os
+import random
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+from .executor_service import ExecutorService, make_lock, thread_sleep
+from .watcher_service import WatcherService
+
+try:
+    import zstandard as zstd
+except ImportError:  # zstandard не установлен - тексты хранятся как есть
+    zstd = None
+
+logger = logging.getLogger(__name__)
+
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+FRAME_HEADER_MAX = 18
+# Словарь дает выигрыш на коротких сообщениях; длинные сжимаются и без него
+DICT_MESSAGE_LIMIT = 64 * 1024
+DICT_SAMPLES = 2000
+# Словари хранятся рядом с текстами, которые ими сжаты (скрытая папка - не попадает в списки)
+DICT_DIR = '.zstd_dicts'
+
+
+def is_compressed_data(data: bytes) -> bool:
+    return data[:4] == ZSTD_MAGIC
+
+
+class TextCodec:
+    """
+    Сжатие текстовых сообщений на диске (TEXT_COMPRESSION=zstd).
+    Файл сохраняет имя .txt, внутри - кадр zstd: чтение распознает его
+    по магическому числу и распаковывает прозрачно, несжатые файлы читаются
+    как раньше. Короткие сообщения сжимаются общим словарем, обученным на
+    сохраненных текстах; словари лежат по dict_id рядом с данными и не
+    удаляются, поэтому переобучение не ломает уже сжатые файлы. Словарем
+    сжимаются только тексты, если его файл уже записан на диск.
+    """
+    _enabled = False
+    _level = 9
+    _min_bytes = 128
+    _max_bytes = 1024 * 1024
+    _dict_dir: Optional[Path] = None
+    _dicts: Dict[int, 'zstd.ZstdCompressionDict'] = {}
+    _current = None
+    _lock = make_lock()
+    _migration_started = False
+
+    @classmethod
+    def init_app(cls, app):
+        cls._level = app.config.get('TEXT_ZSTD_LEVEL', 9)
+        cls._min_bytes = app.config.get('TEXT_COMPRESS_MIN_BYTES', 128)
+        cls._max_bytes = app.config.get('TEXT_COMPRESS_MAX_BYTES', 1024 * 1024)
+        cls._dict_dir = Path(app.config.get('TEXT_ZSTD_DICT_DIR') or Path(app.config['UPLOAD_FOLDER']) / DICT_DIR)
+        if zstd is None:
+            if app.config.get('TEXT_COMPRESSION') == 'zstd':
+                logger.warning("TEXT_COMPRESSION=zstd, но пакет zstandard не установлен - сжатие выключено")
+            return
+        cls._adopt_legacy_dicts(Path(app.instance_path) / 'zstd_dicts')
+        cls._load_dicts()
+        cls._enabled = app.config.get('TEXT_COMPRESSION') == 'zstd'
+        if cls._enabled:
+            logger.info(f"Text compression: zstd level {cls._level}, словарей: {len(cls._dicts)}")
+        if cls._enabled and app.config.get('TEXT_COMPRESS_MIGRATE') and not cls._migration_started:
+            cls._migration_started = True
+            ExecutorService.spawn(cls._run_migration, app.config['UPLOAD_FOLDER'])
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return cls._enabled
+
+    @classmethod
+    def _adopt_legacy_dicts(cls, legacy_dir: Path):
+        """Словари прежних версий (instance/zstd_dicts, не на томе) копируются к данным"""
+        if not legacy_dir.is_dir() or legacy_dir.resolve() == cls._dict_dir.resolve():
+            return
+        for path in legacy_dir.glob('*.dict'):
+            target = cls._dict_dir / path.name
+            if not target.exists():
+                cls._write_dict(target, path.read_bytes())
+                logger.info(f"zstd: словарь {path.name} перенесен в {cls._dict_dir}")
+
+    @staticmethod
+    def _write_dict(target: Path, data: bytes):
+        """Атомарная запись с fsync: словарь либо целиком на диске, либо его нет"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+
+    @classmethod
+    def _persisted(cls, dictionary) -> bool:
+        return (cls._dict_dir / f"{dictionary.dict_id()}.dict").is_file()
+
+    @classmethod
+    def _load_dicts(cls):
+        if not cls._dict_dir.is_dir():
+            return
+        files = sorted(cls._dict_dir.glob('*.dict'), key=lambda p: p.stat().st_mtime)
+        with cls._lock:
+            for path in files:
+                dictionary = zstd.ZstdCompressionDict(path.read_bytes())
+                cls._dicts[dictionary.dict_id()] = dictionary
+                cls._current = dictionary
+
+    # ======================
+    # СЖАТИЕ И РАСПАКОВКА
+    # ======================
+    @classmethod
+    def compress(cls, data: bytes) -> bytes:
+        """Кадр zstd, если сжатие включено и окупается; иначе данные как есть"""
+        if not cls._enabled or not cls._min_bytes <= len(data) <= cls._max_bytes or is_compressed_data(data):
+            return data
+        dictionary = cls._current if len(data) <= DICT_MESSAGE_LIMIT else None
+        if dictionary is not None and not cls._persisted(dictionary):
+            # Без файла словаря текст нельзя будет прочитать после рестарта
+            logger.error(f"zstd: словарь {dictionary.dict_id()} отсутствует в {cls._dict_dir}, сжатие без словаря")
+            with cls._lock:
+                if cls._current is dictionary:
+                    cls._current = None
+            dictionary = None
+        packed = zstd.ZstdCompressor(level=cls._level, dict_data=dictionary).compress(data)
+        return packed if len(packed) < len(data) else data
+
+    @classmethod
+    def decompress(cls, data: bytes) -> bytes:
+        if not is_compressed_data(data):
+            return data
+        return zstd.ZstdDecompressor(dict_data=cls._frame_dict(data)).decompress(data)
+
+    @classmethod
+    def _frame_dict(cls, header: bytes):
+        """Словарь, которым сжат кадр (None - без словаря)"""
+        if zstd is None:
+            raise RuntimeError("Файл сжат zstd, а пакет zstandard не установлен")
+        dict_id = zstd.get_frame_parameters(header).dict_id
+        if not dict_id:
+            return None
+        dictionary = cls._dicts.get(dict_id)
+        if dictionary is None:
+            raise RuntimeError(f"Нет словаря zstd {dict_id} в {cls._dict_dir}")
+        return dictionary
+
+    @classmethod
+    def open(cls, path) -> BinaryIO:
+        """Файл для чтения байтов: сжатый распаковывается в память (он не больше max_bytes)"""
+        f = open(path, 'rb')
+        if not is_compressed_data(f.read(4)):
+            f.seek(0)
+            return f
+        f.seek(0)
+        with f:
+            return io.BytesIO(cls.decompress(f.read()))
+
+    @classmethod
+    def read(cls, path) -> bytes:
+        with open(path, 'rb') as f:
+            return cls.decompress(f.read())
+
+    @staticmethod
+    def size(path) -> int:
+        """Размер текста после распаковки (для сжатого - из заголовка кадра)"""
+        with open(path, 'rb') as f:
+            header = f.read(FRAME_HEADER_MAX)
+            if is_compressed_data(header) and zstd is not None:
+                size = zstd.frame_content_size(header)
+                if size >= 0:
+                    return size
+        return os.path.getsize(path)
+
+    @staticmethod
+    def is_compressed(path) -> bool:
+        with open(path, 'rb') as f:
+            return is_compressed_data(f.read(4))
+
+    @classmethod
+    def decode_stream(cls, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Поток байтов файла из хранилища: сжатый собирается и распаковывается, обычный идет как есть"""
+        chunks = iter(chunks)
+        first = next(chunks, b'')
+        if not is_compressed_data(first):
+            if first:
+                yield first
+            yield from chunks
+            return
+        yield cls.decompress(first + b''.join(chunks))
+
+    @classmethod
+    def decode_prefix(cls, chunks: Iterable[bytes], limit: int, size: int) -> Tuple[bytes, int]:
+        """
+        Начало текста (до limit байт) из потока хранилища и полный размер текста.
+        Поток читается только до нужного объема: сжатый кадр распаковывается
+        потоково, size (размер объекта) нужен для несжатого текста.
+        """
+        chunks = iter(chunks)
+        try:
+            data = next(chunks, b'')
+            if not is_compressed_data(data):
+                while len(data) < limit:
+                    chunk = next(chunks, b'')
+                    if not chunk:
+                        break
+                    data += chunk
+                return data[:limit], size
+
+            content_size = zstd.frame_content_size(data[:FRAME_HEADER_MAX]) if zstd is not None else -1
+            decompressor = zstd.ZstdDecompressor(dict_data=cls._frame_dict(data)).decompressobj()
+            text = decompressor.decompress(data)
+            while len(text) < limit and not decompressor.eof:
+                chunk = next(chunks, b'')
+                if not chunk:
+                    break
+                text += decompressor.decompress(chunk)
+            if content_size < 0:
+                # Размер не записан в кадр: известен, только если кадр дочитан целиком
+                content_size = len(text) if decompressor.eof else limit + 1
+            return text[:limit], content_size
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    # ======================
+    # СЛОВАРЬ И МИГРАЦИЯ
+    # ======================
+    @classmethod
+    def train(cls, paths: List[str], dict_size: int = 112 * 1024) -> Optional[int]:
+        """
+        Обучение словаря на коротких текстах (случайная выборка).
+        Возвращает dict_id или None, если образцов слишком мало.
+        Блокирующий вызов - выполнять в run_io.
+        """
+        if zstd is None:
+            raise RuntimeError("Пакет zstandard не установлен")
+        paths = list(paths)
+        random.shuffle(paths)
+        samples = []
+        for path in paths:
+            if len(samples) >= DICT_SAMPLES:
+                break
+            try:
+                data = cls.read(path)
+            except (OSError, RuntimeError):
+                continue
+            if 0 < len(data) <= DICT_MESSAGE_LIMIT:
+                samples.append(data)
+        if len(samples) < 20:
+            return None
+
+        try:
+            dictionary = zstd.train_dictionary(dict_size, samples, level=cls._level)
+        except zstd.ZstdError:  # образцов мало для словаря такого размера
+            return None
+        dict_id = dictionary.dict_id()
+        cls._write_dict(cls._dict_dir / f"{dict_id}.dict", dictionary.as_bytes())
+        with cls._lock:
+            cls._dicts[dict_id] = dictionary
+            cls._current = dictionary
+        return dict_id
+
+    @classmethod
+    def compress_file(cls, path) -> int:
+        """
+        Сжатие файла на месте с сохранением времени изменения.
+        Возвращает сэкономленные байты (0 - файл оставлен как есть).
+        """
+        path = Path(path)
+        stat = path.stat()
+        if not cls._min_bytes <= stat.st_size <= cls._max_bytes:
+            return 0
+        data = path.read_bytes()
+        packed = cls.compress(data)
+        if packed is data:
+            return 0
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        try:
+            tmp_path.write_bytes(packed)
+            os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            # Файл могли изменить, пока он сжимался - тогда он остается как есть
+            if path.stat().st_mtime_ns != stat.st_mtime_ns:
+                return 0
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return len(data) - len(packed)
+
+    @classmethod
+    def migrate(cls, folder, train: bool = True, pause: float = 0.0) -> Dict:
+        """
+        Сжатие уже сохраненных .txt в папке (блокирующий вызов, без логов -
+        выполняется в потоке ОС). Если словаря еще нет, сначала обучает его
+        на этих же файлах.
+        """
+        paths = sorted(str(p) for p in Path(folder).glob('*.txt') if not p.name.startswith('.'))
+        result = {'files': len(paths), 'compressed': 0, 'saved_bytes': 0, 'errors': 0,
+                  'last_error': None, 'dict_id': None}
+        if train and cls._current is None:
+            result['dict_id'] = cls.train(paths)
+        for path in paths:
+            try:
+                saved = cls.compress_file(path)
+            except (OSError, RuntimeError) as e:
+                result['errors'] += 1
+                result['last_error'] = f"{os.path.basename(path)}: {str(e)}"
+                continue
+            if saved:
+                result['compressed'] += 1
+                result['saved_bytes'] += saved
+                # Размер файла изменился - без рассылки file_modified на каждый файл
+                WatcherService.absorb([path])
+            if pause:
+                thread_sleep(pause)
+        return result
+
+    @classmethod
+    def _run_migration(cls, folder: str):
+        """Фоновое сжатие при старте: в пуле потоков, с паузами, чтобы не забивать диск"""
+        try:
+            result = ExecutorService.run_io(cls.migrate, folder, True, 0.005)
+            if result['dict_id']:
+                logger.info(f"zstd: обучен словарь {result['dict_id']}")
+            if result['errors']:
+                logger.warning(f"zstd: ошибок при сжатии: {result['errors']}, последняя: {result['last_error']}")
+            logger.info(
+                f"zstd: миграция завершена, сжато {result['compressed']} из {result['files']}, "
+                f"сэкономлено {result['saved_bytes'] // 1024} КБ"
+            )
+        except Exception as e:
+            logger.error(f"zstd: ошибка миграции: {str(e)}")
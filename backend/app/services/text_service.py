@@ -0,0 +1,181 @@
+# app/services/text_service.py
+import logging
+import os
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from .executor_service import ExecutorService, make_lock
+from .text_codec import TextCodec
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _utf8_start(data: bytes) -> int:
+    """Сдвиг до начала ближайшего целого UTF-8 символа"""
+    i = 0
+    while i < len(data) and i < 4 and (data[i] & 0xC0) == 0x80:
+        i += 1
+    return i
+
+
+def _utf8_end(data: bytes) -> int:
+    """Длина префикса без оборванного в конце UTF-8 символа"""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0x80 == 0:
+            return len(data)
+        if byte & 0xC0 == 0xC0:
+            needed = 2 if byte & 0xE0 == 0xC0 else 3 if byte & 0xF0 == 0xE0 else 4
+            return len(data) if back >= needed else len(data) - back
+    return len(data)
+
+
+class TextService:
+    """
+    Постраничное чтение больших текстовых файлов.
+    Индекс смещений строк строится при первом обращении и кешируется
+    до изменения файла (mtime/size). Сжатые zstd файлы читаются через
+    TextCodec - смещения и размеры относятся к распакованному тексту.
+    """
+    _index: 'OrderedDict[str, Tuple[int, int, array]]' = OrderedDict()
+    _lock = make_lock()
+    MAX_CACHED = 64
+
+    @classmethod
+    def line_index(cls, path) -> array:
+        """Смещения начала строк (offsets[i] - байт начала строки i)"""
+        path = str(path)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with cls._lock:
+            cached = cls._index.get(path)
+            if cached and cached[:2] == key:
+                cls._index.move_to_end(path)
+                return cached[2]
+
+        offsets = ExecutorService.run_io(cls._build_index, path)
+        with cls._lock:
+            cls._index[path] = (*key, offsets)
+            while len(cls._index) > cls.MAX_CACHED:
+                cls._index.popitem(last=False)
+        return offsets
+
+    @staticmethod
+    def _build_index(path: str) -> array:
+        offsets = array('Q', [0])
+        position = 0
+        with TextCodec.open(path) as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                start = chunk.find(b'\n')
+                while start != -1:
+                    offsets.append(position + start + 1)
+                    start = chunk.find(b'\n', start + 1)
+                position += len(chunk)
+        # Последний перевод строки не открывает новую строку
+        if len(offsets) > 1 and offsets[-1] == position:
+            offsets.pop()
+        return offsets
+
+    @classmethod
+    def read_bytes(cls, path, offset: int = 0, limit: int = 64 * 1024) -> Dict:
+        """Окно по байтам, выровненное по границам UTF-8 символов"""
+        path = str(path)
+
+        def reader():
+            size = TextCodec.size(path)
+            with TextCodec.open(path) as f:
+                f.seek(max(offset, 0))
+                data = f.read(max(limit, 0) + 4)
+            start = _utf8_start(data) if offset > 0 else 0
+            window = data[start:start + limit]
+            if offset + start + len(window) < size:
+                window = window[:_utf8_end(window)]
+            return size, offset + start, window
+
+        size, start, window = ExecutorService.run_io(reader)
+        next_offset = start + len(window)
+        return {
+            'content': window.decode('utf-8', errors='replace'),
+            'offset': start,
+            'next_offset': next_offset if next_offset < size else None,
+            'total_bytes': size
+        }
+
+    @classmethod
+    def read_lines(cls, path, line: int = 0, count: int = 200) -> Dict:
+        """Окно по строкам через индекс смещений"""
+        offsets = cls.line_index(path)
+        total = len(offsets)
+        line = min(max(line, 0), total)
+        end_line = min(line + max(count, 0), total)
+        start = offsets[line] if line < total else TextCodec.size(path)
+        end = offsets[end_line] if end_line < total else TextCodec.size(path)
+
+        def reader():
+            with TextCodec.open(path) as f:
+                f.seek(start)
+                return f.read(end - start)
+
+        data = ExecutorService.run_io(reader)
+        return {
+            'content': data.decode('utf-8', errors='replace'),
+            'line': line,
+            'next_line': end_line if end_line < total else None,
+            'total_lines': total
+        }
+
+    @classmethod
+    def read_window(cls, path, args, max_bytes: int, max_lines: int) -> Optional[Dict]:
+        """
+        Окно по параметрам запроса: ?offset=&limit= (байты) или ?line=&lines= (строки).
+        None, если параметров окна нет.
+        """
+        if 'line' in args or 'lines' in args:
+            count = min(args.get('lines', 200, type=int), max_lines)
+            return cls.read_lines(path, args.get('line', 0, type=int), count)
+        if 'offset' in args or 'limit' in args:
+            limit = min(args.get('limit', 64 * 1024, type=int), max_bytes)
+            return cls.read_bytes(path, args.get('offset', 0, type=int), limit)
+        return None
+
+    @staticmethod
+    def window_headers(window: Dict) -> Dict[str, str]:
+        """Метаданные окна для ответа text/plain"""
+        headers = {}
+        for key in ('offset', 'next_offset', 'total_bytes', 'line', 'next_line', 'total_lines'):
+            if key in window:
+                value = window[key]
+                headers['X-' + key.replace('_', '-').title()] = '' if value is None else str(value)
+        return headers
+
+    @staticmethod
+    def stream(path, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Потоковая отдача файла кусками, каждый кусок читается в пуле потоков"""
+        f = TextCodec.open(path)
+        try:
+            while True:
+                chunk = ExecutorService.run_io(f.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            f.close()
+
+    @classmethod
+    def preview(cls, path: Path, limit: int) -> Tuple[str, Optional[int]]:
+        """Начало файла (не более limit байт) и смещение продолжения"""
+        size = TextCodec.size(path)
+        with TextCodec.open(path) as f:
+            data = f.read(limit)
+        return cls.preview_data(data, size)
+
+    @staticmethod
+    def preview_data(data: bytes, size: int) -> Tuple[str, Optional[int]]:
+        """Превью из начала текста размером size: обрезка по символу и смещение продолжения"""
+        if len(data) < size:
+            data = data[:_utf8_end(data)]
+            return data.decode('utf-8', errors='replace'), len(data)
+        return data.decode('utf-8', errors='replace'), None
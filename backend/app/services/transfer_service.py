@@ -0,0 +1,261 @@
+# app/services/transfer_service.py
+import hashlib
+import logging
+import re
+import time
+import uuid
+import zlib
+from typing import Dict, Optional, Tuple
+from ..core.exceptions import InvalidFileError
+from .executor_service import ExecutorService, make_lock
+from .file_service import FileService
+from .lifecycle_service import Lifecycle
+from .progress_service import ProgressReporter
+from .rate_limit_service import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Engine.IO по умолчанию не принимает сообщения больше 1 МБ (max_http_buffer_size)
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 900 * 1024
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+REAPER_INTERVAL = 30
+
+
+def file_checksums(path: str, sha256: bool, chunk_size: int = 1024 * 1024) -> Tuple[int, Optional[str]]:
+    """CRC32 и (по запросу) SHA-256 файла за один проход"""
+    crc = 0
+    digest = hashlib.sha256() if sha256 else None
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            crc = zlib.crc32(chunk, crc)
+            if digest is not None:
+                digest.update(chunk)
+    return crc, digest.hexdigest() if digest is not None else None
+
+
+class TransferService:
+    """
+    Загрузка файлов частями по уже открытому Socket.IO-соединению.
+    Клиент держит не больше window неподтвержденных частей; каждая часть
+    проверяется по CRC32 и пишется на свое место во временный файл через
+    FileService, весь файл в конце сверяется по CRC32 (и SHA-256, если
+    клиент его прислал). Передача привязана к пользователю или устройству
+    и продолжается после переподключения; прогресс видят все устройства
+    (тема files). Брошенные передачи удаляются через TRANSFER_IDLE_TIMEOUT.
+    """
+    _transfers: Dict[str, Dict] = {}
+    _lock = make_lock()
+    _chunk_size = 256 * 1024
+    _window = 8
+    _max_bytes = 100 * 1024 * 1024
+    _large_bytes = 10 * 1024 * 1024
+    _idle_timeout = 300
+    _reaper_started = False
+
+    @classmethod
+    def init_app(cls, app):
+        cls._chunk_size = min(max(app.config.get('TRANSFER_CHUNK_SIZE', 256 * 1024), MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+        cls._window = max(1, app.config.get('TRANSFER_WINDOW', 8))
+        cls._max_bytes = app.config.get('TRANSFER_MAX_BYTES', 100 * 1024 * 1024)
+        cls._large_bytes = app.config.get('RATE_LARGE_UPLOAD_BYTES', 10 * 1024 * 1024)
+        cls._idle_timeout = app.config.get('TRANSFER_IDLE_TIMEOUT', 300)
+        if not cls._reaper_started:
+            cls._reaper_started = True
+            ExecutorService.spawn(cls._run_reaper)
+
+    @staticmethod
+    def owner(session: Dict) -> str:
+        """Владелец передачи: пользователь из JWT или устройство (переживает переподключение)"""
+        user = session.get('user')
+        return f"user:{user['id']}" if user else f"device:{session['device']}"
+
+    @classmethod
+    def _get(cls, transfer_id, owner: str) -> Dict:
+        with cls._lock:
+            transfer = cls._transfers.get(str(transfer_id))
+        if transfer is None or transfer['owner'] != owner:
+            raise InvalidFileError("Передача не найдена или истекла")
+        return transfer
+
+    @staticmethod
+    def _public(transfer: Dict) -> Dict:
+        return {
+            'upload_id': transfer['id'],
+            'chunk_size': transfer['chunk_size'],
+            'chunks': transfer['chunks'],
+            'received': sorted(transfer['received'])
+        }
+
+    # ======================
+    # ПРОТОКОЛ
+    # ======================
+    @classmethod
+    def start(cls, sid: str, owner: str, data: Dict) -> Dict:
+        """
+        upload_start {name, size, type?, chunk_size?, upload_id?}: новая передача
+        или продолжение прежней (upload_id) - в ответе уже принятые части
+        """
+        if data.get('upload_id'):
+            transfer = cls._get(data['upload_id'], owner)
+            transfer['updated'] = time.monotonic()
+            return {**cls._public(transfer), 'window': cls._window}
+
+        name = FileService.sanitize_filename(str(data.get('name') or ''))
+        size = data.get('size')
+        if not name or name.startswith('.'):
+            raise InvalidFileError("Недопустимое имя файла")
+        # Пустой файл - передача без частей: upload_start, сразу upload_finish
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            raise InvalidFileError("Неверный размер файла")
+        if size > cls._max_bytes:
+            raise InvalidFileError(f"Файл больше {cls._max_bytes // (1024 * 1024)} МБ - загрузите его через HTTP")
+        wait = RateLimiter.hit_socket('upload', sid)
+        if wait:
+            raise InvalidFileError(f"Слишком много загрузок, повторите через {wait} с")
+        large = size >= cls._large_bytes
+        if large and not RateLimiter.acquire('upload'):
+            raise InvalidFileError("Сервер занят, повторите позже")
+
+        chunk_size = cls._chunk_size
+        if isinstance(data.get('chunk_size'), int):
+            chunk_size = min(max(data['chunk_size'], MIN_CHUNK_SIZE), cls._chunk_size)
+        transfer_id = uuid.uuid4().hex
+        try:
+            op_id = Lifecycle.begin('transfer', name)
+        except Exception:
+            if large:
+                RateLimiter.release('upload')
+            raise
+        try:
+            path = ExecutorService.run_io(FileService.open_transfer, transfer_id, size)
+        except Exception:
+            Lifecycle.end(op_id)
+            if large:
+                RateLimiter.release('upload')
+            raise
+
+        transfer = {
+            'id': transfer_id,
+            'owner': owner,
+            'name': name,
+            'size': size,
+            'content_type': data.get('type') or None,
+            'chunk_size': chunk_size,
+            'chunks': (size + chunk_size - 1) // chunk_size,
+            'received': set(),
+            'bytes': 0,
+            'path': path,
+            'op_id': op_id,
+            'large': large,
+            'progress_id': f"transfer:{transfer_id}",
+            'updated': time.monotonic()
+        }
+        with cls._lock:
+            cls._transfers[transfer_id] = transfer
+        ProgressReporter.start(transfer['progress_id'], 'upload', topic='files', total=size, filename=name)
+        return {**cls._public(transfer), 'window': cls._window}
+
+    @classmethod
+    def chunk(cls, owner: str, data: Dict) -> Dict:
+        """upload_chunk {upload_id, index, data, crc32}: часть пишется на место и подтверждается"""
+        transfer = cls._get(data.get('upload_id'), owner)
+        index, payload = data.get('index'), data.get('data')
+        if not isinstance(index, int) or not 0 <= index < transfer['chunks']:
+            raise InvalidFileError("Неверный номер части")
+        if not isinstance(payload, (bytes, bytearray)):
+            raise InvalidFileError("Часть должна быть двоичной")
+
+        offset = index * transfer['chunk_size']
+        expected = min(transfer['chunk_size'], transfer['size'] - offset)
+        # Поврежденная часть не записывается - клиент отправит ее повторно
+        if len(payload) != expected or zlib.crc32(payload) != data.get('crc32'):
+            return {'index': index, 'ok': False, 'error': 'checksum'}
+        transfer['updated'] = time.monotonic()
+        if index in transfer['received']:
+            return {'index': index, 'ok': True}
+
+        ExecutorService.run_io(FileService.write_transfer, transfer['path'], offset, bytes(payload))
+        with cls._lock:
+            if index not in transfer['received']:
+                transfer['received'].add(index)
+                transfer['bytes'] += len(payload)
+            received = transfer['bytes']
+        ProgressReporter.update(transfer['progress_id'], received)
+        return {'index': index, 'ok': True, 'received': received}
+
+    @classmethod
+    def finish(cls, owner: str, data: Dict) -> Dict:
+        """
+        upload_finish {upload_id, crc32, sha256?}: сверка всего файла и перенос в хранилище.
+        При несовпадении передача удаляется целиком.
+        """
+        transfer = cls._get(data.get('upload_id'), owner)
+        missing = transfer['chunks'] - len(transfer['received'])
+        if missing:
+            raise InvalidFileError(f"Не получено частей: {missing}")
+        sha256 = str(data.get('sha256') or '').lower() or None
+        if sha256 is not None and not SHA256_RE.match(sha256):
+            raise InvalidFileError("Неверный SHA-256")
+        with cls._lock:
+            if cls._transfers.pop(transfer['id'], None) is None:
+                raise InvalidFileError("Передача уже завершается")
+
+        try:
+            crc, digest = ExecutorService.run_io(file_checksums, transfer['path'], sha256 is not None)
+            if crc != data.get('crc32') or digest != sha256:
+                raise InvalidFileError("Контрольная сумма файла не совпадает")
+            filename = FileService.store_transfer(transfer['path'], transfer['name'], transfer['content_type'])
+        except Exception as e:
+            cls._close(transfer, 'error', error=str(e))
+            raise
+        cls._close(transfer, 'complete', filename=filename)
+        return {'filename': filename, 'size': transfer['size'], 'verified': 'sha256' if sha256 else 'crc32'}
+
+    @classmethod
+    def abort(cls, owner: str, data: Dict) -> Dict:
+        transfer = cls._get(data.get('upload_id'), owner)
+        with cls._lock:
+            cls._transfers.pop(transfer['id'], None)
+        cls._close(transfer, 'cancelled')
+        return {'upload_id': transfer['id'], 'status': 'cancelled'}
+
+    @classmethod
+    def _close(cls, transfer: Dict, status: str, **meta):
+        """Освобождение передачи: временный файл (если остался), слот, операция, прогресс"""
+        FileService.discard_transfer(transfer['path'])
+        if transfer['large']:
+            RateLimiter.release('upload')
+        Lifecycle.end(transfer['op_id'])
+        ProgressReporter.finish(transfer['progress_id'], status, **meta)
+
+    # ======================
+    # ОЧИСТКА
+    # ======================
+    @classmethod
+    def _run_reaper(cls):
+        """Удаление брошенных передач и временных файлов, оставшихся от прошлого запуска"""
+        folder = FileService.transfer_dir()
+        if folder.is_dir():
+            for path in folder.glob('*.part'):
+                FileService.discard_transfer(str(path))
+        while True:
+            time.sleep(REAPER_INTERVAL)
+            deadline = time.monotonic() - cls._idle_timeout
+            with cls._lock:
+                expired = [t for t in cls._transfers.values() if t['updated'] < deadline]
+                for transfer in expired:
+                    del cls._transfers[transfer['id']]
+            for transfer in expired:
+                logger.info(f"Transfer {transfer['name']} expired ({len(transfer['received'])}/{transfer['chunks']})")
+                cls._close(transfer, 'error', error='timeout')
+
+    @classmethod
+    def stats(cls) -> Dict:
+        with cls._lock:
+            return {
+                'active': len(cls._transfers),
+                'bytes': sum(t['bytes'] for t in cls._transfers.values()),
+                'chunk_size': cls._chunk_size,
+                'window': cls._window
+            }
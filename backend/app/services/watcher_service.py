@@ -0,0 +1,350 @@
+# app/services/watcher_service.py
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from .executor_service import ExecutorService, make_lock, thread_sleep
+from .index_service import FileIndex
+from .realtime_service import RealtimeService
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog не установлен - остается опрос
+    FileSystemEventHandler = object
+    Observer = None
+
+try:
+    from watchdog.observers.inotify_c import Inotify
+except Exception:  # нет watchdog или не Linux - под eventlet остается опрос
+    Inotify = None
+
+try:
+    from eventlet.patcher import original
+    _select = original('select').select
+    _Thread = original('threading').Thread
+except ImportError:  # запуск без eventlet (скрипты, отладка)
+    import select as _select_module
+    import threading as _threading
+    _select = _select_module.select
+    _Thread = _threading.Thread
+
+logger = logging.getLogger(__name__)
+
+# Временные файлы загрузок и редакторов не попадают в каталог
+IGNORED_SUFFIXES = ('.part', '.tmp', '.ytdl', '.swp', '.crdownload')
+# Повтор сверки индекса в базе после ошибки, секунды
+INDEX_RETRY_INTERVAL = 60
+
+
+def _ignored(name: str) -> bool:
+    return name.startswith('.') or name.endswith(IGNORED_SUFFIXES)
+
+
+def _file_info(path: str) -> Optional[Dict]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+    return {
+        "name": os.path.basename(path),
+        "path": path,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "created": datetime.fromtimestamp(stat.st_ctime)
+    }
+
+
+class FileCatalog:
+    """Список файлов отслеживаемых папок в памяти; revision растет с каждым изменением"""
+
+    def __init__(self):
+        self.revision = 0
+        self._files: Dict[str, Dict[str, Dict]] = {}
+        self._lock = make_lock()
+
+    def load(self, folder: str, name: str):
+        """Начальное заполнение (один раз при старте)"""
+        files = {}
+        for entry in os.scandir(folder):
+            if entry.is_file() and not _ignored(entry.name):
+                info = _file_info(entry.path)
+                if info:
+                    files[entry.path] = info
+        with self._lock:
+            self._files[name] = files
+            self.revision += 1
+
+    def get(self, folder: str, path: str) -> Optional[Dict]:
+        with self._lock:
+            return self._files.get(folder, {}).get(path)
+
+    def paths(self, folder: str) -> List[str]:
+        with self._lock:
+            return list(self._files.get(folder, {}))
+
+    def apply(self, folder: str, path: str, info: Optional[Dict]) -> Optional[str]:
+        """Применить новое состояние файла; вернуть тип изменения или None"""
+        with self._lock:
+            files = self._files.setdefault(folder, {})
+            old = files.get(path)
+            if info is None:
+                if old is None:
+                    return None
+                del files[path]
+                change = 'deleted'
+            elif old is None:
+                files[path] = info
+                change = 'added'
+            elif (old['size'], old['mtime']) != (info['size'], info['mtime']):
+                files[path] = info
+                change = 'modified'
+            else:
+                return None
+            self.revision += 1
+            return change
+
+    def list(self, folder: str) -> List[Dict]:
+        with self._lock:
+            files = list(self._files.get(folder, {}).values())
+        return sorted(files, key=lambda f: f['created'])
+
+
+class _EventHandler(FileSystemEventHandler):
+    """События watchdog (поток наблюдателя) складываются в очередь без блокировок хаба"""
+
+    def __init__(self, pending: deque):
+        self.pending = pending
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        self.pending.append(event.src_path)
+        dest = getattr(event, 'dest_path', None)
+        if dest:
+            self.pending.append(dest)
+
+
+class _InotifyReader:
+    """
+    inotify в потоке ОС - для работы под eventlet. Observer watchdog после
+    monkey_patch становится гринлетом и блокирует хаб в read_events, поэтому
+    здесь дескрипторы inotify читаются из настоящего потока после select,
+    а пути складываются в общую очередь, которую разбирает дебаунсер хаба.
+    """
+
+    def __init__(self, folders: List[str], pending: deque):
+        self.pending = pending
+        self._inotify = [Inotify(folder.encode()) for folder in folders]
+        self._running = True
+        self._thread = _Thread(target=self._run, name='watcher-inotify', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        by_fd = {inotify.fd: inotify for inotify in self._inotify}
+        while self._running:
+            try:
+                # Таймаут - чтобы поток замечал stop()
+                readable, _, _ = _select(list(by_fd), [], [], 1.0)
+                for fd in readable:
+                    for event in by_fd[fd].read_events():
+                        if not event.is_directory:
+                            self.pending.append(os.fsdecode(event.src_path))
+            except Exception as e:
+                if self._running:
+                    logger.error(f"Watcher inotify error: {str(e)}")
+                    thread_sleep(1)
+        for inotify in self._inotify:
+            inotify.close()
+
+    def stop(self):
+        self._running = False
+
+
+class WatcherService:
+    """
+    Наблюдение за UPLOAD_FOLDER и YT_DOWNLOAD_FOLDER.
+    inotify через watchdog, без него - периодический опрос.
+    Изменения сглаживаются (debounce) и рассылаются событиями
+    file_added / file_deleted / file_modified; каталог дублируется
+    в таблицу files (FileIndex) для выборок по индексам.
+    """
+    catalog = FileCatalog()
+    _folders: Dict[str, str] = {}
+    _pending: deque = deque()
+    _observer = None
+    _started = False
+    _mode = 'off'
+
+    @classmethod
+    def init_app(cls, app):
+        mode = app.config.get('WATCHER_MODE', 'auto')
+        if cls._started or mode == 'off':
+            return
+        cls._started = True
+        cls._folders = {
+            'uploads': app.config['UPLOAD_FOLDER'],
+            'youtube': str(app.config.get('YT_DOWNLOAD_FOLDER', ''))
+        }
+        cls._folders = {name: folder for name, folder in cls._folders.items() if folder}
+        for name, folder in cls._folders.items():
+            os.makedirs(folder, exist_ok=True)
+            cls.catalog.load(folder, name)
+
+        debounce = app.config.get('WATCHER_DEBOUNCE_MS', 300) / 1000
+        green = ExecutorService.green()
+        if mode in ('auto', 'inotify') and green and Inotify is not None:
+            cls._observer = _InotifyReader(list(cls._folders.values()), cls._pending)
+            cls._observer.start()
+            cls._mode = 'inotify'
+        elif mode in ('auto', 'inotify') and not green and Observer is not None:
+            cls._observer = Observer()
+            handler = _EventHandler(cls._pending)
+            for folder in cls._folders.values():
+                cls._observer.schedule(handler, folder, recursive=False)
+            cls._observer.daemon = True
+            cls._observer.start()
+            cls._mode = 'inotify'
+        else:
+            if mode == 'inotify':
+                logger.warning("inotify недоступен (нет watchdog или не Linux), используется опрос")
+            cls._mode = 'polling'
+            ExecutorService.spawn(cls._run_poller, app.config.get('WATCHER_POLL_INTERVAL', 2))
+
+        ExecutorService.spawn(cls._run_debouncer, debounce)
+        ExecutorService.spawn(cls._run_indexer)
+        logger.info(f"File watcher started ({cls._mode}): {', '.join(cls._folders.values())}")
+
+    @classmethod
+    def active(cls) -> bool:
+        return cls._started
+
+    @classmethod
+    def _folder_of(cls, path: str) -> Optional[str]:
+        parent = os.path.dirname(os.path.abspath(path))
+        for name, folder in cls._folders.items():
+            if os.path.abspath(folder) == parent:
+                return name
+        return None
+
+    @classmethod
+    def _run_poller(cls, interval: float):
+        """Опрос папок: в очередь попадают новые и пропавшие файлы и все известные"""
+        while cls._started:
+            time.sleep(interval)
+            for name, folder in cls._folders.items():
+                try:
+                    names = ExecutorService.run_io(os.listdir, folder)
+                except OSError as e:
+                    logger.error(f"Watcher poll error: {str(e)}")
+                    continue
+                current = {os.path.join(folder, n) for n in names}
+                cls._pending.extend(current | set(cls.catalog.paths(name)))
+
+    @classmethod
+    def _run_debouncer(cls, debounce: float):
+        """Путь обрабатывается, когда по нему нет событий дольше debounce"""
+        last_seen: Dict[str, float] = {}
+        while cls._started:
+            time.sleep(debounce / 2)
+            now = time.monotonic()
+            while cls._pending:
+                last_seen[cls._pending.popleft()] = now
+            ready = [path for path, seen in last_seen.items() if now - seen >= debounce]
+            if not ready:
+                continue
+            for path in ready:
+                del last_seen[path]
+            try:
+                # stat в пуле потоков, запись в индекс и рассылка - из гринлета хаба
+                changes = ExecutorService.run_io(cls._reconcile, ready)
+                cls._index(changes)
+                cls._emit(changes)
+            except Exception as e:
+                logger.error(f"Watcher error: {str(e)}")
+
+    @classmethod
+    def _run_indexer(cls):
+        """Сверка таблицы files с каталогом при запуске и повторно, если запись в базу не удалась"""
+        while cls._started:
+            for name in cls._folders:
+                if not FileIndex.ready(name):
+                    try:
+                        FileIndex.sync(name, cls.catalog)
+                    except Exception as e:
+                        logger.error(f"File index sync {name} failed: {str(e)}")
+            time.sleep(INDEX_RETRY_INTERVAL)
+
+    @classmethod
+    def _index(cls, changes: List[tuple]):
+        if changes:
+            FileIndex.apply([
+                (change, folder, cls.catalog.get(folder, path) or {'name': os.path.basename(path)})
+                for change, folder, path in changes
+            ])
+
+    @classmethod
+    def _reconcile(cls, paths: List[str]) -> List[tuple]:
+        """Сверка путей с каталогом; возвращает (изменение, папка, путь)"""
+        changes = []
+        for path in paths:
+            folder = cls._folder_of(path)
+            if folder is None or _ignored(os.path.basename(path)):
+                continue
+            change = cls.catalog.apply(folder, path, _file_info(path))
+            if change:
+                changes.append((change, folder, path))
+        return changes
+
+    @classmethod
+    def absorb(cls, paths: List[str]):
+        """
+        Учесть в каталоге изменения, сделанные самим приложением, без рассылки
+        file_*: о них сообщают одним событием. Можно вызывать и из рабочего потока пула.
+        """
+        if cls._started:
+            cls._index(ExecutorService.run_io(cls._reconcile, paths))
+
+    @classmethod
+    def _emit(cls, changes: List[tuple]):
+        for change, folder, path in changes:
+            info = cls.catalog.get(folder, path) or {"name": os.path.basename(path)}
+            RealtimeService.emit(f'file_{change}', {
+                'folder': folder,
+                'name': info['name'],
+                'size': info.get('size'),
+                'mtime': info.get('mtime'),
+                'revision': cls.catalog.revision
+            }, topic='files')
+
+    @classmethod
+    def list_files(cls, folder: str = 'uploads') -> List[Dict]:
+        return cls.catalog.list(folder)
+
+    @classmethod
+    def status(cls) -> Dict:
+        return {
+            'mode': cls._mode,
+            'revision': cls.catalog.revision,
+            'folders': {name: len(cls.catalog.paths(name)) for name in cls._folders}
+        }
+
+    @classmethod
+    def health(cls) -> Tuple[bool, str]:
+        """Каталог загружен (при WATCHER_MODE=off списки читаются с диска)"""
+        if not cls._started:
+            return True, 'off'
+        return True, f"{cls._mode}, {sum(len(cls.catalog.paths(name)) for name in cls._folders)} files"
+
+    @classmethod
+    def stop(cls):
+        cls._started = False
+        if cls._observer is not None:
+            cls._observer.stop()
+            cls._observer = None
@@ -1,16 +1,156 @@
+import os
+import random
 import re
 import time
+import uuid
 import requests
 import yt_dlp
+from yt_dlp.postprocessor import PostProcessor
+from collections import OrderedDict
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, List, Optional, Tuple
 from flask import current_app
-from tenacity import retry, stop_after_attempt, wait_exponential
 from ..core.exceptions import YouTubeDownloadError
+from .executor_service import ExecutorService, make_lock, thread_sleep
+from .media_service import MediaService
+from .hls_service import HlsService
+from .job_store import JobStore
+from .lifecycle_service import Lifecycle
+from .progress_service import ProgressReporter
+from .rate_limit_service import RateLimiter
+from .realtime_service import RealtimeService
 from socket import gaierror
 from urllib3.exceptions import NewConnectionError
 
+# Частичные файлы yt-dlp: title.f137.mp4.part, .ytdl, фрагменты .part-Frag12
+PARTIAL_RE = re.compile(r'\.(part|ytdl)$|\.part-Frag\d+(\.part)?$')
+# title.f137.mp4 -> title: общий префикс всех файлов одной загрузки
+FORMAT_SUFFIX_RE = re.compile(r'(\.f[\w-]+)?\.\w+$')
+
+
+class BandwidthLimiter:
+    """
+    Общий лимит скорости на все активные загрузки.
+    Лимит делится между задачами пропорционально приоритету,
+    недоиспользованная доля задач с собственным потолком отдается остальным.
+    Ограничение применяется из progress hook, поэтому действует и на
+    фрагментные загрузки, и меняется на лету при старте/завершении задач.
+    """
+
+    def __init__(self, limit: int = 0):
+        self.limit = limit
+        self._jobs: Dict[str, dict] = {}
+        self._lock = make_lock()
+
+    def configure(self, limit: int):
+        with self._lock:
+            self.limit = max(0, int(limit))
+            self._rebalance()
+
+    def register(self, job_id: str, priority: int, cap: Optional[int] = None):
+        with self._lock:
+            self._jobs[job_id] = {
+                'priority': max(1, int(priority)),
+                'cap': int(cap) if cap else None,
+                'rate': None,
+                'ref_time': time.monotonic(),
+                'ref_bytes': 0,
+                'bytes': 0,
+                'streams': {},
+                'started': time.monotonic()
+            }
+            self._rebalance()
+
+    def unregister(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            self._rebalance()
+            return job
+
+    def _rebalance(self):
+        """Распределение лимита (water-filling по приоритетам)"""
+        now = time.monotonic()
+        remaining = list(self._jobs.values())
+        budget = float(self.limit) if self.limit else None
+
+        for job in remaining:
+            job['rate'] = job['cap']
+            # Сдвигаем точку отсчета, чтобы новый лимит не "доплачивал" за прошлое
+            job['ref_time'], job['ref_bytes'] = now, job['bytes']
+
+        if budget is None:
+            return
+
+        while remaining:
+            weight = sum(j['priority'] for j in remaining)
+            capped = [j for j in remaining if j['cap'] and j['cap'] <= budget * j['priority'] / weight]
+            if not capped:
+                for job in remaining:
+                    # 0 в throttle означает "без ограничения" - доля не меньше 1 байт/с
+                    job['rate'] = max(1, int(budget * job['priority'] / weight))
+                return
+            for job in capped:
+                job['rate'] = job['cap']
+                budget -= job['cap']
+                remaining.remove(job)
+
+    def throttle(self, job_id: str, downloaded_bytes: int, stream: Optional[str] = None):
+        """
+        Вызывается из потока загрузки: засыпает, если задача превысила свою долю.
+        downloaded_bytes считается yt-dlp заново для каждого файла задачи
+        (видео и аудио при слиянии форматов) - байты суммируются по stream.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['streams'][stream] = downloaded_bytes
+            job['bytes'] = sum(job['streams'].values())
+            rate = job['rate']
+            if not rate:
+                return
+            expected = (job['bytes'] - job['ref_bytes']) / rate
+            delay = expected - (time.monotonic() - job['ref_time'])
+        if delay > 0:
+            thread_sleep(min(delay, 1.0))
+
+    def status(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'limit': self.limit,
+                'jobs': {
+                    job_id: {
+                        'priority': job['priority'],
+                        'cap': job['cap'],
+                        'rate': job['rate'],
+                        'bytes': job['bytes'],
+                        'throughput': int(job['bytes'] / max(now - job['started'], 1e-6))
+                    }
+                    for job_id, job in self._jobs.items()
+                }
+            }
+
+
+class RemuxFirstPP(PostProcessor):
+    """Постпроцессор yt-dlp: skip/remux/reencode через MediaService"""
+
+    def run(self, info):
+        result = MediaService.postprocess(info['filepath'])
+        filepath = Path(info['filepath']).with_name(result['output'])
+        info['filepath'] = str(filepath)
+        info['ext'] = filepath.suffix.lstrip('.')
+        info['postprocess'] = result
+        return [], info
+
+
 class YouTubeService:
+    # Последние пакетные загрузки: batch_id -> состояние
+    _batches: 'OrderedDict[str, dict]' = OrderedDict()
+    _MAX_BATCHES = 50
+    _background_started = False
+    bandwidth = BandwidthLimiter()
+
     @staticmethod
     def validate_url(url: str) -> bool:
         """Проверка валидности YouTube URL"""
@@ -20,38 +160,234 @@ class YouTubeService:
         ]
         return any(re.match(p, url) for p in patterns)
 
+    @staticmethod
+    def validate_playlist_url(url: str) -> bool:
+        """Проверка ссылки на плейлист"""
+        return bool(re.match(r'^https?://(www\.|music\.)?youtube\.com/playlist\?(.*&)?list=', url))
+
+    @classmethod
+    def init_app(cls, app):
+        cls.bandwidth.configure(app.config.get('YT_BANDWIDTH_LIMIT', 0))
+        JobStore.open(app.config.get('YT_JOB_DB') or Path(app.config['YT_DOWNLOAD_FOLDER']) / '.jobs.sqlite3')
+        # create_app вызывается в процессе дважды (сервер и бот) - фон запускаем один раз
+        if not cls._background_started:
+            cls._background_started = True
+            with app.app_context():
+                ExecutorService.spawn(cls._resume_jobs)
+                ExecutorService.spawn(cls._run_partial_gc)
+
     @classmethod
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    def download_video(cls, url: str, download_dir: Path) -> Tuple[str, str]:
+    def download_video(cls, url: str, download_dir: Path, tuning: Optional[dict] = None) -> Tuple[str, str]:
+        """Загрузка одного видео, возвращает (имя файла, заголовок)"""
+        result = cls.download(url, download_dir, tuning)
+        return result['filename'], result['title']
+
+    @classmethod
+    def download(cls, url: str, download_dir: Path, tuning: Optional[dict] = None) -> dict:
         """
-        Основной метод загрузки с автоматическим переключением
-        между yt-dlp и RapidAPI при ошибках
+        Основной метод загрузки: задача сохраняется в JobStore и переживает рестарт,
+        при ошибках yt-dlp - повторы с экспоненциальной паузой, затем RapidAPI
         """
+        job = JobStore.create(url, download_dir, current_app.config['YDL_OPTS'].get('format'), tuning)
+        return cls.run_job(job)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """Пауза перед следующей попыткой: base * 2^(n-1), не больше максимума, с разбросом"""
+        config = current_app.config
+        delay = min(config.get('YT_JOB_BACKOFF_BASE', 2.0) * 2 ** (attempt - 1), config.get('YT_JOB_BACKOFF_MAX', 300))
+        return delay * random.uniform(0.5, 1.0)
+
+    @classmethod
+    def run_job(cls, job: dict, ydl_opts: Optional[dict] = None, fallback: bool = True) -> dict:
+        """
+        Выполнение задачи из JobStore до успеха или исчерпания попыток.
+        yt-dlp продолжает загрузку с частичного файла (.part), поэтому
+        повтор и возобновление после рестарта не начинают с нуля.
+        При остановке сервера новые задачи не начинаются и остаются в очереди.
+        """
+        with Lifecycle.operation('youtube', job['id']):
+            return cls._run_job(job, ydl_opts, fallback)
+
+    @classmethod
+    def _run_job(cls, job: dict, ydl_opts: Optional[dict], fallback: bool) -> dict:
+        job_id, url = job['id'], job['url']
+        download_dir = Path(job['download_dir'])
+        max_attempts = current_app.config.get('YT_JOB_MAX_ATTEMPTS', 3)
+
+        # Возобновленная задача дожидается паузы, назначенной до рестарта
+        wait = (job.get('next_attempt_at') or 0) - time.time()
+        if wait > 0:
+            time.sleep(wait)
+
+        error = None
+        while True:
+            attempt = JobStore.start_attempt(job_id)
+            try:
+                result = ExecutorService.run_io(cls._download_ytdlp, url, download_dir, ydl_opts, job['tuning'], job_id)
+                JobStore.update(job_id, status='complete', output_path=str(download_dir / result['filename']),
+                                bytes_done=result['bytes'], last_error=None)
+                return result
+            except Exception as e:
+                error = e
+            if attempt >= max_attempts:
+                break
+            delay = cls._backoff(attempt)
+            current_app.logger.warning(f"Job {job_id}: attempt {attempt} failed ({str(error)}), retry in {delay:.1f}s")
+            JobStore.update(job_id, status='retrying', last_error=str(error), next_attempt_at=time.time() + delay)
+            time.sleep(delay)
+
+        if not fallback:
+            JobStore.update(job_id, status='failed', last_error=str(error))
+            raise error
+
+        current_app.logger.warning(f"yt-dlp failed: {str(error)}, trying RapidAPI")
+        started = time.monotonic()
         try:
-            return cls._download_ytdlp(url, download_dir)
+            filename, title = ExecutorService.run_io(cls._download_via_rapidapi, url, download_dir)
         except Exception as e:
-            current_app.logger.warning(f"yt-dlp failed: {str(e)}, trying RapidAPI")
-            return cls._download_via_rapidapi(url, download_dir)
+            JobStore.update(job_id, status='failed', last_error=str(e))
+            raise
+        result = cls._job_result(filename, title, download_dir / filename, time.monotonic() - started)
+        JobStore.update(job_id, status='complete', output_path=str(download_dir / filename),
+                        bytes_done=result['bytes'], last_error=None)
+        return result
+
+    @staticmethod
+    def normalize_tuning(tuning: Optional[dict]) -> dict:
+        """Параметры загрузки задачи поверх глобальных настроек"""
+        if tuning is not None and not isinstance(tuning, dict):
+            raise YouTubeDownloadError("tuning должен быть объектом")
+        tuning = tuning or {}
+        config = current_app.config
+        try:
+            result = {
+                'concurrent_fragments': int(tuning.get('concurrent_fragments') or config.get('YT_CONCURRENT_FRAGMENTS', 1)),
+                'chunk_size': int(tuning.get('chunk_size') or config.get('YT_HTTP_CHUNK_SIZE', 0)),
+                'ratelimit': int(tuning.get('ratelimit') or 0),
+                'priority': int(tuning.get('priority') or config.get('YT_DEFAULT_PRIORITY', 5))
+            }
+        except (TypeError, ValueError):
+            raise YouTubeDownloadError("Параметры tuning должны быть целыми числами")
+        if not 1 <= result['concurrent_fragments'] <= 32:
+            raise YouTubeDownloadError("concurrent_fragments должен быть от 1 до 32")
+        if not 1 <= result['priority'] <= 10:
+            raise YouTubeDownloadError("priority должен быть от 1 до 10")
+        if result['chunk_size'] < 0:
+            raise YouTubeDownloadError("chunk_size не может быть отрицательным")
+        if result['ratelimit'] < 0:
+            raise YouTubeDownloadError("ratelimit не может быть отрицательным")
+        result['ratelimit'] = result['ratelimit'] or None
+        return result
 
     @classmethod
-    def _download_ytdlp(cls, url: str, download_dir: Path) -> Tuple[str, str]:
-        """Загрузка через yt-dlp с настройками из конфига"""
-        ydl_opts = {
+    def _build_ydl_opts(cls, download_dir: Path) -> dict:
+        """Опции yt-dlp из конфига для загрузки в download_dir"""
+        return {
             **current_app.config['YDL_OPTS'],
             'outtmpl': str(download_dir / '%(title)s.%(ext)s'),
             'progress_hooks': [cls._progress_hook],
             'noplaylist': True,
         }
 
+    @classmethod
+    def _download_ytdlp(cls, url: str, download_dir: Path, ydl_opts: Optional[dict] = None,
+                        tuning: Optional[dict] = None, job_id: Optional[str] = None) -> dict:
+        """Загрузка через yt-dlp с настройками из конфига"""
+        tuning = cls.normalize_tuning(tuning)
+        persisted = job_id is not None
+        job_id = job_id or uuid.uuid4().hex[:12]
+        base_opts = ydl_opts or cls._build_ydl_opts(download_dir)
+        checkpoint = {'time': 0.0}
+
+        def job_hook(d: dict):
+            if d['status'] == 'downloading' and d.get('downloaded_bytes') is not None:
+                cls.bandwidth.throttle(job_id, d['downloaded_bytes'], d.get('filename'))
+                # Состояние в JobStore не чаще раза в несколько секунд
+                now = time.monotonic()
+                if persisted and now - checkpoint['time'] >= 5:
+                    checkpoint['time'] = now
+                    JobStore.update(
+                        job_id,
+                        output_path=d.get('filename'),
+                        bytes_done=d['downloaded_bytes'],
+                        total_bytes=d.get('total_bytes') or d.get('total_bytes_estimate')
+                    )
+                # Вызывается на каждый чанк: только обновление состояния, отправку делает эмиттер
+                ProgressReporter.update(
+                    job_id,
+                    d['downloaded_bytes'],
+                    d.get('total_bytes') or d.get('total_bytes_estimate'),
+                    format_id=(d.get('info_dict') or {}).get('format_id')
+                )
+
+        ydl_opts = {
+            **base_opts,
+            'concurrent_fragment_downloads': tuning['concurrent_fragments'],
+            'http_chunk_size': tuning['chunk_size'] or None,
+            'progress_hooks': [*base_opts.get('progress_hooks', []), job_hook]
+        }
+
+        cls.bandwidth.register(job_id, tuning['priority'], tuning['ratelimit'])
+        ProgressReporter.start(job_id, 'youtube', topic='youtube', url=url)
+        started = time.monotonic()
+        status, error = 'error', None
         try:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                if current_app.config.get('MEDIA_POSTPROCESS') == 'remux_first':
+                    ydl.add_post_processor(RemuxFirstPP(ydl), when='post_process')
                 info = ydl.extract_info(url, download=True)
-                filename = ydl.prepare_filename(info)
-                return Path(filename).name, info.get('title', 'video')
+                filename = cls._final_filename(ydl, info)
+            job = cls.bandwidth.unregister(job_id) or {}
+            result = cls._job_result(
+                Path(filename).name, info.get('title', 'video'),
+                Path(filename), time.monotonic() - started,
+                downloaded=job.get('bytes'), tuning=tuning
+            )
+            result['postprocess'] = cls._postprocess_info(info)
+            status = 'complete'
+            ProgressReporter.update(job_id, filename=result['filename'], title=result['title'])
+            return result
         except (gaierror, NewConnectionError) as e:
-            raise YouTubeDownloadError("Ошибка подключения. Проверьте интернет и настройки прокси")
+            error = "Ошибка подключения. Проверьте интернет и настройки прокси"
+            raise YouTubeDownloadError(error)
         except Exception as e:
-            raise YouTubeDownloadError(f"yt-dlp error: {str(e)}")
+            error = f"yt-dlp error: {str(e)}"
+            raise YouTubeDownloadError(error)
+        finally:
+            cls.bandwidth.unregister(job_id)
+            ProgressReporter.finish(job_id, status, error=error)
+
+    @staticmethod
+    def _final_filename(ydl, info: dict) -> str:
+        """Путь итогового файла после слияния и постобработки"""
+        downloads = info.get('requested_downloads') or []
+        if downloads and downloads[-1].get('filepath'):
+            return downloads[-1]['filepath']
+        return info.get('filepath') or ydl.prepare_filename(info)
+
+    @staticmethod
+    def _postprocess_info(info: dict) -> Optional[dict]:
+        downloads = info.get('requested_downloads') or []
+        for entry in [*downloads, info]:
+            if entry.get('postprocess'):
+                return entry['postprocess']
+        return None
+
+    @staticmethod
+    def _job_result(filename: str, title: str, path: Path, seconds: float,
+                    downloaded: Optional[int] = None, tuning: Optional[dict] = None) -> dict:
+        """Итог задачи с фактической пропускной способностью"""
+        if not downloaded:
+            downloaded = path.stat().st_size if path.exists() else 0
+        return {
+            'filename': filename,
+            'title': title,
+            'bytes': downloaded,
+            'seconds': round(seconds, 2),
+            'throughput': int(downloaded / seconds) if seconds > 0 else None,
+            'tuning': tuning
+        }
 
     @classmethod
     def _download_via_rapidapi(cls, url: str, download_dir: Path) -> Tuple[str, str]:
@@ -98,16 +434,164 @@ class YouTubeService:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             return ydl.extract_info(url, download=False)
 
+    # ======================
+    # ПАКЕТНАЯ ЗАГРУЗКА
+    # ======================
+    @classmethod
+    def start_batch(cls, urls: List[str], download_dir: Path, parallel: Optional[int] = None,
+                    tuning: Optional[dict] = None) -> dict:
+        """
+        Запускает фоновую загрузку списка ссылок и/или плейлистов.
+        Прогресс уходит событиями youtube_batch_progress / youtube_batch_complete.
+        """
+        urls = list(OrderedDict.fromkeys(u.strip() for u in urls if u and u.strip()))
+        invalid = [u for u in urls if not (cls.validate_url(u) or cls.validate_playlist_url(u))]
+        if not urls:
+            raise YouTubeDownloadError("Список ссылок пуст")
+        if invalid:
+            raise YouTubeDownloadError(f"Некорректные ссылки: {', '.join(invalid)}")
+
+        # Параметры проверяются до регистрации пакета: ошибка не оставляет его в 'expanding'
+        limit = current_app.config.get('YT_BATCH_PARALLEL', 3)
+        try:
+            parallel = int(parallel or limit)
+        except (TypeError, ValueError):
+            raise YouTubeDownloadError("parallel должен быть целым числом")
+        # Клиент может только уменьшить параллельность пакета
+        parallel = max(1, min(parallel, limit))
+        tuning = cls.normalize_tuning(tuning)
+
+        batch_id = uuid.uuid4().hex[:12]
+        batch = {
+            'batch_id': batch_id,
+            'status': 'expanding',
+            'urls': urls,
+            'items': [],
+            'done': 0,
+            'failed': 0,
+            'total': 0,
+            'started': time.time(),
+            'elapsed': None
+        }
+        cls._batches[batch_id] = batch
+        while len(cls._batches) > cls._MAX_BATCHES:
+            cls._batches.popitem(last=False)
+
+        ExecutorService.spawn(cls._run_batch, batch, Path(download_dir), parallel, tuning)
+        return cls.get_batch(batch_id)
+
+    @classmethod
+    def get_batch(cls, batch_id: str) -> Optional[dict]:
+        batch = cls._batches.get(batch_id)
+        if batch is None:
+            return None
+        return {**batch, 'items': [dict(item) for item in batch['items']]}
+
+    @classmethod
+    def expand_entries(cls, urls: List[str]) -> List[Dict[str, str]]:
+        """
+        Разворачивает плейлисты в список видео плоской экстракцией
+        (без запроса страницы каждого видео). Одиночные ссылки не трогаются.
+        """
+        entries = []
+        playlist_urls = [u for u in urls if cls.validate_playlist_url(u)]
+        ydl_opts = {
+            'quiet': True,
+            'skip_download': True,
+            'extract_flat': 'in_playlist',
+            'proxy': current_app.config['YDL_OPTS'].get('proxy')
+        }
+
+        playlists = {}
+        if playlist_urls:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                for url in playlist_urls:
+                    info = ydl.extract_info(url, download=False)
+                    playlists[url] = [
+                        {
+                            'url': e.get('url') or f"https://www.youtube.com/watch?v={e['id']}",
+                            'title': e.get('title')
+                        }
+                        for e in (info.get('entries') or []) if e
+                    ]
+
+        for url in urls:
+            entries.extend(playlists.get(url, [{'url': url, 'title': None}]))
+
+        unique = OrderedDict((e['url'], e) for e in entries)
+        limit = current_app.config.get('YT_BATCH_MAX_ITEMS', 50)
+        return list(unique.values())[:limit]
+
+    @classmethod
+    def _run_batch(cls, batch: dict, download_dir: Path, parallel: int, tuning: dict):
+        """Фоновое выполнение пакета: разворот, параллельная загрузка, отчет"""
+        try:
+            entries = ExecutorService.run_io(cls.expand_entries, batch['urls'])
+        except Exception as e:
+            batch.update(status='error', error=str(e), elapsed=time.time() - batch['started'])
+            RealtimeService.emit('youtube_batch_complete', cls.get_batch(batch['batch_id']), topic='youtube')
+            return
+
+        batch['items'] = [
+            {'index': i, 'url': e['url'], 'title': e['title'], 'status': 'queued'}
+            for i, e in enumerate(entries)
+        ]
+        batch.update(status='downloading', total=len(entries))
+        RealtimeService.emit('youtube_batch_progress', cls._batch_event(batch), topic='youtube')
+
+        # Одна конфигурация yt-dlp на весь пакет
+        ydl_opts = cls._build_ydl_opts(download_dir)
+
+        def download(item):
+            # Общий лимит одновременных загрузок (RATE_CONCURRENCY['youtube']) - и для пакетов
+            with RateLimiter.slot('youtube'):
+                item['status'] = 'downloading'
+                RealtimeService.emit('youtube_batch_progress', cls._batch_event(batch, item), topic='youtube')
+                job = JobStore.create(item['url'], download_dir, ydl_opts.get('format'), tuning)
+                item['job_id'] = job['id']
+                return cls.run_job(job, ydl_opts, fallback=False)
+
+        for item, result, error in ExecutorService.imap_unordered(download, batch['items'], parallel):
+            if error is None:
+                item.update(
+                    status='complete',
+                    filename=result['filename'],
+                    title=result['title'],
+                    throughput=result['throughput'],
+                    postprocess=result.get('postprocess')
+                )
+                batch['done'] += 1
+                HlsService.schedule_auto('youtube', result['filename'])
+            else:
+                current_app.logger.warning(f"Batch {batch['batch_id']}: {item['url']} failed: {str(error)}")
+                item.update(status='error', error=str(error))
+                batch['failed'] += 1
+            RealtimeService.emit('youtube_batch_progress', cls._batch_event(batch, item), topic='youtube')
+
+        batch.update(
+            status='complete' if not batch['failed'] else ('partial' if batch['done'] else 'error'),
+            elapsed=round(time.time() - batch['started'], 2)
+        )
+        RealtimeService.emit('youtube_batch_complete', cls.get_batch(batch['batch_id']), topic='youtube')
+
+    @staticmethod
+    def _batch_event(batch: dict, item: Optional[dict] = None) -> dict:
+        return {
+            'batch_id': batch['batch_id'],
+            'status': batch['status'],
+            'done': batch['done'],
+            'failed': batch['failed'],
+            'total': batch['total'],
+            'item': dict(item) if item else None
+        }
+
     @staticmethod
     def _progress_hook(d: dict):
-        """Хук для отслеживания прогресса загрузки"""
-        if d['status'] == 'downloading':
-            progress = {
-                'percent': d.get('_percent_str', '0%'),
-                'speed': d.get('_speed_str', 'N/A'),
-                'eta': d.get('_eta_str', 'N/A')
-            }
-            current_app.logger.info(f"Прогресс загрузки: {progress}")
+        """Хук для логирования загрузки (промежуточный прогресс идет через ProgressReporter)"""
+        if d['status'] == 'finished':
+            current_app.logger.info(
+                f"Загрузка завершена: {d.get('filename')} ({d.get('_total_bytes_str', 'N/A')})"
+            )
 
     @classmethod
     def search_videos(cls, query: str) -> dict:
@@ -142,4 +626,76 @@ class YouTubeService:
                 'duration': item['lengthSeconds'],
                 'viewCount': item['viewCount']
             } for item in data.get('contents', []) if item.get('videoId')]
-        }
\ No newline at end of file
+        }
+
+    # ======================
+    # ВОЗОБНОВЛЕНИЕ И УБОРКА
+    # ======================
+    @classmethod
+    def _resume_jobs(cls):
+        """Возобновление задач, прерванных рестартом, с их частичных файлов"""
+        jobs = JobStore.unfinished()
+        if not jobs:
+            return
+        current_app.logger.info(f"Resuming {len(jobs)} YouTube job(s)")
+
+        def resume(job):
+            with RateLimiter.slot('youtube'):
+                result = cls.run_job(job)
+            HlsService.schedule_auto('youtube', result['filename'])
+            RealtimeService.emit('youtube_progress', {
+                'status': 'complete',
+                'filename': result['filename'],
+                'title': result['title'],
+                'throughput': result['throughput'],
+                'job_id': job['id']
+            }, topic='youtube')
+
+        parallel = current_app.config.get('YT_BATCH_PARALLEL', 3)
+        for job, _, error in ExecutorService.imap_unordered(resume, jobs, parallel):
+            if error is not None:
+                current_app.logger.error(f"Resumed job {job['id']} failed: {str(error)}")
+
+    @staticmethod
+    def collect_partials(download_dir, max_age: float) -> int:
+        """
+        Удаление брошенных частичных файлов старше max_age секунд.
+        Файлы незавершенных задач не трогаются независимо от возраста.
+        """
+        protected = {
+            FORMAT_SUFFIX_RE.sub('', Path(job['output_path']).name)
+            for job in JobStore.unfinished() if job['output_path']
+        }
+        now = time.time()
+        removed = 0
+        for entry in os.scandir(download_dir):
+            if not entry.is_file() or not PARTIAL_RE.search(entry.name):
+                continue
+            if any(entry.name.startswith(prefix) for prefix in protected):
+                continue
+            try:
+                if now - entry.stat().st_mtime < max_age:
+                    continue
+                os.remove(entry.path)
+                removed += 1
+            except OSError as e:
+                current_app.logger.warning(f"Partial GC: {entry.name}: {str(e)}")
+        return removed
+
+    @classmethod
+    def _run_partial_gc(cls):
+        config = current_app.config
+        interval = config.get('YT_PARTIAL_GC_INTERVAL', 3600)
+        # Первый проход - после старта возобновленных задач
+        time.sleep(60)
+        while True:
+            try:
+                removed = ExecutorService.run_io(
+                    cls.collect_partials, config['YT_DOWNLOAD_FOLDER'], config.get('YT_PARTIAL_MAX_AGE', 86400)
+                )
+                pruned = JobStore.prune(config.get('YT_JOB_RETENTION', 7 * 86400))
+                if removed or pruned:
+                    current_app.logger.info(f"Partial GC: {removed} file(s) removed, {pruned} job(s) pruned")
+            except Exception as e:
+                current_app.logger.error(f"Partial GC error: {str(e)}")
+            time.sleep(interval)
@@ -1,32 +1,107 @@
 # backend/app/socket_handlers.py
-from flask_socketio import Namespace
-from app.services.auth_service import validate_token  # Создайте этот сервис
+from flask import current_app, request
+from flask_socketio import Namespace, emit
+from app.services.progress_service import ProgressReporter
+from app.services.lifecycle_service import Lifecycle
+from app.services.rate_limit_service import RateLimiter
+from app.services.realtime_service import RealtimeService
+from app.services.transfer_service import TransferService
+from app.core.exceptions import InvalidFileError, ShuttingDownError
 
-from flask_socketio import Namespace
 
-class ChatNamespace(Namespace):
-    def on_connect(self):
+class RealtimeNamespace(Namespace):
+    """Подключение с проверкой токена и подписки на темы событий"""
+
+    def on_connect(self, auth=None):
+        # ConnectionRefusedError отклоняет подключение с причиной для клиента
+        if Lifecycle.draining():
+            raise ConnectionRefusedError('shutting down')
+        session = RealtimeService.connect(request.sid, auth, request.args, self.namespace)
+        user = session['user']
+        current_app.logger.info(
+            f"Client connected: {user['username'] if user else 'anonymous'} ({session['device']})"
+        )
+        emit('connection_status', {
+            'status': 'connected',
+            'user': user,
+            'topics': sorted(session['topics']),
+            # Клиент сохраняет токен и предъявляет его при следующих подключениях
+            'device_token': session['device_token']
+        })
+        self._send_progress_snapshot(session['topics'])
+
+    def _send_progress_snapshot(self, topics):
+        """Текущий прогресс операций по темам для только что подписавшегося клиента"""
+        operations = [op for topic in topics for op in ProgressReporter.snapshot(topic)]
+        if operations:
+            emit('progress_snapshot', {'operations': operations})
+
+    def on_disconnect(self):
+        RealtimeService.disconnect(request.sid)
+
+    def on_subscribe(self, data):
+        topics = data.get('topics', []) if isinstance(data, dict) else [data]
+        added = [str(topic) for topic in topics if RealtimeService.subscribe(request.sid, str(topic))]
+        self._send_progress_snapshot(added)
+        return {'topics': sorted(RealtimeService.session(request.sid)['topics'])}
+
+    def on_unsubscribe(self, data):
+        topics = data.get('topics', []) if isinstance(data, dict) else [data]
+        for topic in topics:
+            RealtimeService.unsubscribe(request.sid, str(topic))
+        return {'topics': sorted(RealtimeService.session(request.sid)['topics'])}
+
+    def on_new_message(self, data):
+        wait = RateLimiter.hit_socket('message', request.sid)
+        if wait:
+            emit('error', {'message': "Слишком много сообщений", 'retry_after': wait})
+            return
+        RealtimeService.emit('new_message', data, topic='messages', skip_sid=request.sid)
+
+    # Загрузка файла частями: ответ на каждое событие приходит в ack
+    def on_upload_start(self, data):
+        return self._transfer(TransferService.start, request.sid, data)
+
+    def on_upload_chunk(self, data):
+        return self._transfer(TransferService.chunk, data)
+
+    def on_upload_finish(self, data):
+        result = self._transfer(TransferService.finish, data)
+        if 'filename' in result:
+            from app.routes.api import notify_file_change
+            from app.services.hls_service import HlsService
+            from app.services.image_service import ImageService
+            HlsService.schedule_auto('uploads', result['filename'])
+            ImageService.schedule_auto(result['filename'])
+            notify_file_change('added', result['filename'], result['size'])
+        return result
+
+    def on_upload_abort(self, data):
+        return self._transfer(TransferService.abort, data)
+
+    def _transfer(self, handler, *args):
+        data = args[-1]
+        if not isinstance(data, dict):
+            return {'error': "Неверный формат запроса"}
+        owner = TransferService.owner(RealtimeService.session(request.sid))
         try:
-            print('Client connected')
+            return handler(*args[:-1], owner, data)
+        except (InvalidFileError, ShuttingDownError) as e:
+            return {'error': str(e)}
         except Exception as e:
-            print(f'Connection error: {str(e)}')
-            self.disconnect()
+            current_app.logger.error(f"Transfer error: {str(e)}")
+            return {'error': "Ошибка передачи файла"}
 
-    def on_disconnect(self):
-        print('Client disconnected')
 
+class ChatNamespace(RealtimeNamespace):
     def on_message(self, data):
         try:
             # Обработка сообщения
-            self.emit('response', {'status': 'received'})
+            self.emit('response', {'status': 'received'}, to=request.sid)
         except Exception as e:
-            self.emit('error', {'message': str(e)})
-
-# Инициализация в extensions.py
-from flask_socketio import SocketIO
+            self.emit('error', {'message': str(e)}, to=request.sid)
 
-socketio = SocketIO(cors_allowed_origins="*")
 
-def init_socketio(app):
-    socketio.init_app(app)
-    socketio.on_namespace(ChatNamespace('/chat'))
\ No newline at end of file
+def init_socketio(socketio):
+    socketio.on_namespace(RealtimeNamespace('/'))
+    socketio.on_namespace(ChatNamespace('/chat'))
@@ -1,12 +1,18 @@
+import io
 import os
+import re
+import hashlib
 import logging
 import asyncio
 import socket
 import requests
+import tempfile
 import threading
 from pathlib import Path
 from functools import wraps
+from urllib.parse import urlencode
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -16,7 +22,13 @@ from telegram.ext import (
     filters
 )
 from app import create_app
-from app.services.file_service import FileService
+from app.services.file_service import FileService, EXPORT_TYPES
+from app.services.lifecycle_service import Lifecycle
+from app.services.storage_service import StorageService
+from app.services.telegram_cache_service import TelegramFileCache
+from app.services.realtime_service import RealtimeService
+from app.services.text_service import TextService
+from app.services.text_codec import TextCodec
 from dotenv import load_dotenv
 
 # ======================
@@ -25,11 +37,31 @@ from dotenv import load_dotenv
 load_dotenv(Path(__file__).parent.parent / '.env')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 API_BASE_URL = os.getenv('API_BASE_URL', 'http://localhost:8080/api')
+BATCH_POLL_INTERVAL = 5
+SELECT_PAGE_SIZE = 8
+TELEGRAM_TEXT_LIMIT = 4000
+# Больше ботам отправлять нельзя - такие архивы отдаются ссылкой
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024
+EXPORT_DATE_RE = re.compile(r'^\d{4}-\d{2}(-\d{2})?$')
+# Тип вложения -> метод повторной отправки по file_id
+SEND_METHODS = {
+    'document': 'reply_document',
+    'video': 'reply_video',
+    'audio': 'reply_audio',
+    'animation': 'reply_animation',
+    'photo': 'reply_photo'
+}
+
+# Альбомы: сообщения с одним media_group_id собираются за окно MEDIA_GROUP_WINDOW
+MEDIA_GROUP_WINDOW = 1.0
+MEDIA_DOWNLOAD_CONCURRENCY = int(os.getenv('BOT_DOWNLOAD_CONCURRENCY', 4))
 
 # Глобальные переменные
 application = None
 bot_thread = None
 event_loop = None
+media_groups = {}
+download_semaphore = None
 
 # Инициализация Flask app context
 flask_app = create_app()
@@ -49,9 +81,14 @@ def get_frontend_url():
         return "http://localhost:3000"
 
 def ensure_flask_context(func):
+    """Контекст Flask и учет обработчика как операции (при остановке новые не начинаются)"""
     @wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        with flask_app.app_context():
+        if Lifecycle.draining():
+            if update.effective_message:
+                await update.effective_message.reply_text("⏳ Сервер перезапускается, повторите через минуту")
+            return
+        with flask_app.app_context(), Lifecycle.operation('bot', func.__name__, force=True):
             return await func(update, context)
     return wrapper
 
@@ -68,6 +105,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "📋 *Команды:*\n"
         "• `/save текст` - Сохранить текст\n"
         "• `/history` - История файлов\n"
+        "• `/yt ссылки` - Скачать видео или плейлист\n"
+        "• `/export [2024-05 | с по] [тип] [файлы]` - ZIP-архив\n"
+        "• `/select [тег]` - Выбрать несколько файлов\n"
+        "• `/tag тег -тег` - Теги для выбранных файлов\n"
         "• Отправьте файл для сохранения"
     )
     await update.message.reply_text(message, parse_mode='Markdown')
@@ -113,7 +154,10 @@ async def get_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     InlineKeyboardButton("📥 Скачать", callback_data=f"download:{item['filename']}"),
                     InlineKeyboardButton("🗑 Удалить", callback_data=f"delete:{item['filename']}")
                 ],
-                [InlineKeyboardButton("📋 Копировать", callback_data=f"copy:{item['filename']}")]
+                [
+                    InlineKeyboardButton("📋 Копировать", callback_data=f"copy:{item['filename']}"),
+                    InlineKeyboardButton("📖 Читать", callback_data=f"read:0:{item['filename']}")
+                ]
             ])
             
             await update.message.reply_text(
@@ -127,30 +171,372 @@ async def get_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⚠️ Ошибка сервера")
 
 @ensure_flask_context
-async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик загрузки файлов"""
+async def youtube_batch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /yt: пакетная загрузка видео и плейлистов"""
     try:
-        file = await update.message.effective_attachment.get_file()
-        filename = FileService.sanitize_filename(
-            update.message.effective_attachment.file_name
+        urls = list(context.args)
+        if not urls:
+            return await update.message.reply_text("❌ Укажите одну или несколько ссылок")
+
+        response = requests.post(
+            f"{API_BASE_URL}/youtube/batch",
+            json={"urls": urls},
+            timeout=10
         )
-        
+        if response.status_code != 202:
+            return await update.message.reply_text(f"❌ Ошибка: {response.json().get('error', response.text)}")
+
+        batch_id = response.json()['batch_id']
+        status = await update.message.reply_text("⏳ Загрузка запущена...")
+
+        batch = {}
+        shown = status.text
+        while True:
+            await asyncio.sleep(BATCH_POLL_INTERVAL)
+            batch = requests.get(f"{API_BASE_URL}/youtube/batch/{batch_id}", timeout=5).json()
+            if batch.get('status') not in ('expanding', 'downloading'):
+                break
+            progress = f"⏳ Загружено {batch['done']}/{batch['total']}, ошибок: {batch['failed']}"
+            # Telegram отклоняет правку без изменений (BadRequest: Message is not modified)
+            if progress != shown:
+                await status.edit_text(progress)
+                shown = progress
+
+        lines = [f"✅ Готово: {batch.get('done', 0)}/{batch.get('total', 0)}"]
+        for item in batch.get('items', []):
+            if item['status'] == 'error':
+                lines.append(f"❌ {item.get('title') or item['url']}: {item.get('error', '')[:100]}")
+        if batch.get('error'):
+            lines.append(f"❌ {batch['error']}")
+        await status.edit_text("\n".join(lines))
+
+    except Exception as e:
+        logger.error(f"Ошибка пакетной загрузки: {str(e)}")
+        await update.message.reply_text("⚠️ Ошибка сервера")
+
+def read_page(filepath: Path, offset: int) -> dict:
+    """
+    Страница файла для сообщения: не больше TELEGRAM_TEXT_LIMIT символов,
+    по возможности до конца строки. next_offset - байт сразу за отправленным
+    текстом, поэтому "Далее" ничего не пропускает.
+    """
+    # Символ UTF-8 занимает до 4 байт - окна хватает на полную страницу
+    window = TextService.read_bytes(filepath, offset, TELEGRAM_TEXT_LIMIT * 4)
+    text, next_offset = window['content'], window['next_offset']
+    if len(text) > TELEGRAM_TEXT_LIMIT:
+        text = text[:TELEGRAM_TEXT_LIMIT]
+        newline = text.rfind('\n')
+        if newline >= TELEGRAM_TEXT_LIMIT // 2:
+            text = text[:newline + 1]
+        next_offset = window['offset'] + len(text.encode('utf-8'))
+    return {'content': text, 'next_offset': next_offset, 'total_bytes': window['total_bytes']}
+
+def post_batch(operations: list, atomic: bool = False) -> dict:
+    """Пакет операций над файлами одним запросом (POST /files/batch)"""
+    response = requests.post(
+        f"{API_BASE_URL}/files/batch",
+        json={"operations": operations, "atomic": atomic},
+        timeout=120
+    )
+    if response.status_code not in (200, 409):
+        raise RuntimeError(response.json().get('error', response.text))
+    return response.json()
+
+def batch_summary(result: dict, done_label: str) -> str:
+    done = sum(1 for item in result['results'] if item['status'] == 'ok')
+    errors = [item for item in result['results'] if item['status'] == 'error']
+    lines = [f"{done_label}: {done}, ошибок: {len(errors)}"]
+    lines.extend(f"❌ {item['name']}: {item['error']}" for item in errors[:5])
+    return "\n".join(lines)
+
+def selection_view(selection: dict):
+    """Текст и клавиатура режима выбора: файлы текущей страницы и действия"""
+    names, selected, page = selection['names'], selection['selected'], selection['page']
+    pages = (len(names) + SELECT_PAGE_SIZE - 1) // SELECT_PAGE_SIZE
+    start = page * SELECT_PAGE_SIZE
+    rows = [
+        [InlineKeyboardButton(f"{'✅' if i in selected else '⬜'} {names[i][:40]}", callback_data=f"sel:t:{i}")]
+        for i in range(start, min(start + SELECT_PAGE_SIZE, len(names)))
+    ]
+    rows.append([
+        InlineKeyboardButton("◀️", callback_data=f"sel:p:{(page - 1) % pages}"),
+        InlineKeyboardButton("☑️ Страница", callback_data="sel:a"),
+        InlineKeyboardButton("▶️", callback_data=f"sel:p:{(page + 1) % pages}")
+    ])
+    rows.append([
+        InlineKeyboardButton(f"🗑 Удалить ({len(selected)})", callback_data="sel:d"),
+        InlineKeyboardButton("❌ Отмена", callback_data="sel:x")
+    ])
+    text = f"Выбрано {len(selected)} из {len(names)} • страница {page + 1}/{pages}"
+    return text, InlineKeyboardMarkup(rows)
+
+@ensure_flask_context
+async def select_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /select: выбор нескольких файлов (/select тег - только с тегом)"""
+    try:
+        params = {"tag": context.args[0]} if context.args else None
+        response = requests.get(f"{API_BASE_URL}/files", params=params, timeout=10)
+        if response.status_code != 200:
+            return await update.message.reply_text("❌ Ошибка загрузки списка файлов")
+
+        names = [f['name'] for f in reversed(response.json())]
+        if not names:
+            return await update.message.reply_text("📂 Файлов нет")
+        context.user_data['selection'] = {'names': names, 'selected': set(), 'page': 0}
+        text, keyboard = selection_view(context.user_data['selection'])
+        await update.message.reply_text(text, reply_markup=keyboard)
+
+    except Exception as e:
+        logger.error(f"Ошибка выбора файлов: {str(e)}")
+        await update.message.reply_text("⚠️ Ошибка сервера")
+
+async def selection_callback(query, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки режима выбора: отметка, страницы, удаление выбранного одним пакетом"""
+    selection = context.user_data.get('selection')
+    if selection is None:
+        return await query.message.edit_text("⌛ Выбор устарел, вызовите /select заново")
+
+    _, action, *arg = query.data.split(':')
+    selected = selection['selected']
+    if action == 't':
+        selected.symmetric_difference_update({int(arg[0])})
+    elif action == 'p':
+        selection['page'] = int(arg[0])
+    elif action == 'a':
+        start = selection['page'] * SELECT_PAGE_SIZE
+        page = set(range(start, min(start + SELECT_PAGE_SIZE, len(selection['names']))))
+        if page <= selected:
+            selected.difference_update(page)
+        else:
+            selected.update(page)
+    elif action == 'x':
+        context.user_data.pop('selection', None)
+        return await query.message.edit_text("Выбор отменен")
+    elif action == 'd':
+        if not selected:
+            return
+        keyboard = InlineKeyboardMarkup([[
+            InlineKeyboardButton(f"✅ Удалить {len(selected)}", callback_data="sel:D"),
+            InlineKeyboardButton("↩️ Назад", callback_data=f"sel:p:{selection['page']}")
+        ]])
+        return await query.message.edit_text(f"Удалить выбранные файлы ({len(selected)})?", reply_markup=keyboard)
+    elif action == 'D':
+        names = [selection['names'][i] for i in sorted(selected)]
+        context.user_data.pop('selection', None)
+        await query.message.edit_text(f"⏳ Удаляю {len(names)}...")
+        result = await asyncio.to_thread(post_batch, [{"op": "delete", "names": names}])
+        return await query.message.edit_text(batch_summary(result, "🗑 Удалено"))
+
+    text, keyboard = selection_view(selection)
+    await query.message.edit_text(text, reply_markup=keyboard)
+
+@ensure_flask_context
+async def tag_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /tag: теги для файлов, выбранных через /select (-тег - снять)"""
+    selection = context.user_data.get('selection')
+    if not selection or not selection['selected']:
+        return await update.message.reply_text("❌ Сначала выберите файлы: /select")
+    add = [arg for arg in context.args if not arg.startswith('-')]
+    remove = [arg[1:] for arg in context.args if arg.startswith('-')]
+    if not add and not remove:
+        return await update.message.reply_text("❌ Укажите теги: /tag работа -черновик")
+
+    try:
+        names = [selection['names'][i] for i in sorted(selection['selected'])]
+        result = await asyncio.to_thread(
+            post_batch, [{"op": "tag", "names": names, "add": add, "remove": remove}], True
+        )
+        await update.message.reply_text(batch_summary(result, "🏷 Отмечено"))
+    except RuntimeError as e:
+        await update.message.reply_text(f"❌ Ошибка: {str(e)}")
+    except Exception as e:
+        logger.error(f"Ошибка установки тегов: {str(e)}")
+        await update.message.reply_text("⚠️ Ошибка сервера")
+
+def export_params(args) -> dict:
+    """Аргументы /export: даты (YYYY-MM или YYYY-MM-DD), тип файлов, остальное - имена"""
+    params, dates, names = {}, [], []
+    for arg in args:
+        if EXPORT_DATE_RE.match(arg):
+            dates.append(arg)
+        elif arg.lower() in EXPORT_TYPES:
+            params['type'] = arg.lower()
+        else:
+            names.append(arg)
+    if dates:
+        params['from'], params['to'] = dates[0], dates[-1]
+    if names:
+        params['names'] = ','.join(names)
+    return params
+
+def download_export(params: dict):
+    """Скачать архив во временный файл; None - если он больше лимита Telegram"""
+    with requests.get(f"{API_BASE_URL}/files/export", params=params, stream=True, timeout=30) as response:
+        if response.status_code != 200:
+            raise RuntimeError(response.json().get('error', response.text))
+        if int(response.headers.get('Content-Length') or 0) > TELEGRAM_UPLOAD_LIMIT:
+            return None
+
+        archive = tempfile.TemporaryFile()
+        size = 0
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            size += len(chunk)
+            if size > TELEGRAM_UPLOAD_LIMIT:
+                archive.close()
+                return None
+            archive.write(chunk)
+        archive.seek(0)
+        return archive, response.headers.get('X-Export-Files', '?')
+
+@ensure_flask_context
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /export: ZIP-архив файлов за период, по типу или списку имен"""
+    params = export_params(context.args)
+    status = await update.message.reply_text("⏳ Собираю архив...")
+    try:
+        result = await asyncio.to_thread(download_export, params)
+        if result is None:
+            url = f"{get_frontend_url()}/api/files/export?{urlencode(params)}"
+            return await status.edit_text(f"📦 Архив больше 50 МБ, скачайте по ссылке:\n{url}")
+
+        archive, count = result
+        with archive:
+            await update.message.reply_document(
+                document=archive,
+                filename=f"export_{params.get('from', 'all')}.zip",
+                caption=f"📦 Файлов: {count}"
+            )
+        await status.delete()
+
+    except RuntimeError as e:
+        await status.edit_text(f"❌ Ошибка: {str(e)}")
+    except Exception as e:
+        logger.error(f"Ошибка выгрузки архива: {str(e)}")
+        await status.edit_text("⚠️ Ошибка сервера")
+
+async def download_attachment(message) -> dict:
+    """Скачивание вложения из Telegram и сохранение в папку загрузок"""
+    kind, attachment, filename = attachment_info(message)
+    async with get_download_semaphore():
+        file = await attachment.get_file()
         file_bytes = await file.download_as_bytearray()
-        
-        response = requests.post(
+        response = await asyncio.to_thread(
+            requests.post,
             f"{API_BASE_URL}/files/upload",
             files={'file': (filename, file_bytes)},
             timeout=20
         )
-        
-        if response.status_code == 200:
-            await update.message.reply_text(f"✅ Файл сохранен: {filename}")
-        else:
-            await update.message.reply_text(f"❌ Ошибка: {response.text}")
 
+    if response.status_code != 200:
+        raise RuntimeError(response.text)
+
+    # Файл уже лежит на серверах Telegram - запоминаем его file_id
+    saved_name = response.json().get('filename', filename)
+    # Для удаленного хранилища file_id запомнится при первой отправке из кеша
+    saved_path = StorageService.local_path(saved_name)
+    if saved_path is not None:
+        await asyncio.to_thread(
+            lambda: TelegramFileCache.remember(
+                saved_name, saved_path, kind, attachment.file_id,
+                hashlib.sha256(file_bytes).hexdigest()
+            )
+        )
+    return {'filename': saved_name, 'size': len(file_bytes), 'kind': kind}
+
+def attachment_info(message):
+    """(тип, вложение, имя файла); фото и видео с телефона приходят без имени"""
+    if message.photo:
+        photo = message.photo[-1]
+        return 'photo', photo, f"photo_{message.date:%Y-%m-%d_%H-%M-%S}_{photo.file_unique_id}.jpg"
+    for kind, ext in (('video', 'mp4'), ('audio', 'mp3'), ('document', 'bin')):
+        attachment = getattr(message, kind)
+        if attachment:
+            name = attachment.file_name or f"{kind}_{message.date:%Y-%m-%d_%H-%M-%S}_{attachment.file_unique_id}.{ext}"
+            return kind, attachment, FileService.sanitize_filename(name)
+    raise ValueError("Неподдерживаемое вложение")
+
+def get_download_semaphore() -> asyncio.Semaphore:
+    global download_semaphore
+    if download_semaphore is None:
+        download_semaphore = asyncio.Semaphore(MEDIA_DOWNLOAD_CONCURRENCY)
+    return download_semaphore
+
+def notify_files_added(files: list):
+    """Одно событие Socket.IO на всю пачку файлов"""
+    RealtimeService.emit('files_batch_added', {'files': files, 'count': len(files)}, topic='files')
+
+@ensure_flask_context
+async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик загрузки файлов, фото и видео; альбомы собираются в пачку"""
+    message = update.message
+    if message.media_group_id:
+        group = media_groups.setdefault(message.media_group_id, {'messages': [], 'last': 0.0})
+        group['messages'].append(message)
+        group['last'] = asyncio.get_running_loop().time()
+        if len(group['messages']) == 1:
+            group['task'] = asyncio.create_task(flush_media_group(message.media_group_id))
+        return
+
+    try:
+        saved = await download_attachment(message)
+        await asyncio.to_thread(notify_files_added, [saved])
+        await message.reply_text(f"✅ Файл сохранен: {saved['filename']}")
     except Exception as e:
         logger.error(f"Ошибка загрузки файла: {str(e)}")
-        await update.message.reply_text("⚠️ Ошибка загрузки файла")
+        await message.reply_text("⚠️ Ошибка загрузки файла")
+
+async def flush_media_group(group_id: str):
+    """Ждет окончания альбома и скачивает все файлы параллельно"""
+    loop = asyncio.get_running_loop()
+    while loop.time() - media_groups[group_id]['last'] < MEDIA_GROUP_WINDOW:
+        await asyncio.sleep(MEDIA_GROUP_WINDOW)
+    messages = media_groups.pop(group_id)['messages']
+
+    with flask_app.app_context():
+        results = await asyncio.gather(
+            *(download_attachment(m) for m in messages),
+            return_exceptions=True
+        )
+        saved = [r for r in results if not isinstance(r, Exception)]
+        for error in (r for r in results if isinstance(r, Exception)):
+            logger.error(f"Ошибка загрузки файла альбома: {str(error)}")
+
+        if saved:
+            await asyncio.to_thread(notify_files_added, saved)
+        text = f"✅ Сохранено файлов: {len(saved)} из {len(messages)}"
+        if saved:
+            text += "\n" + "\n".join(f"• {item['filename']}" for item in saved)
+        await messages[0].reply_text(text)
+
+async def send_stored_file(message, filename: str, filepath: Path):
+    """Отправка файла: по кешированному file_id, иначе загрузкой с запоминанием file_id"""
+    caption = f"📥 {filename}"
+    cached = await asyncio.to_thread(TelegramFileCache.lookup, filename, filepath)
+    if cached:
+        kind, file_id = cached
+        try:
+            send = getattr(message, SEND_METHODS.get(kind, 'reply_document'))
+            return await send(file_id, caption=caption)
+        except BadRequest as e:
+            logger.warning(f"file_id для {filename} недействителен: {str(e)}")
+            TelegramFileCache.invalidate(filename)
+
+    if filename.endswith('.txt') and TextCodec.is_compressed(filepath):
+        document = io.BytesIO(await asyncio.to_thread(TextCodec.read, filepath))
+    else:
+        document = open(filepath, 'rb')
+    with document as f:
+        sent = await message.reply_document(document=f, filename=filename, caption=caption)
+
+    kind, attachment = next(
+        ((kind, getattr(sent, kind)) for kind in SEND_METHODS if getattr(sent, kind, None)),
+        (None, None)
+    )
+    if attachment:
+        if isinstance(attachment, tuple):
+            attachment = attachment[-1]
+        await asyncio.to_thread(TelegramFileCache.remember, filename, filepath, kind, attachment.file_id)
+    return sent
 
 # ======================
 # ОБРАБОТЧИКИ КНОПОК
@@ -162,19 +548,23 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     try:
-        action, filename = query.data.split(':')
+        if query.data.startswith('sel:'):
+            return await selection_callback(query, context)
+
+        action, filename = query.data.split(':', 1)
+        offset = 0
+        if action == 'read':
+            offset, filename = filename.split(':', 1)
+            offset = int(offset)
         filename = FileService.sanitize_filename(filename)
-        upload_folder = flask_app.config['UPLOAD_FOLDER']
-        filepath = Path(upload_folder) / filename
+        resolved = FileService.resolve_path(filename)
+        filepath = Path(resolved) if resolved else Path(flask_app.config['UPLOAD_FOLDER']) / filename
 
         if action == 'download':
             if not filepath.exists():
                 return await query.message.reply_text("❌ Файл не найден")
             
-            await query.message.reply_document(
-                document=open(filepath, 'rb'),
-                caption=f"📥 {filename}"
-            )
+            await send_stored_file(query.message, filename, filepath)
 
         elif action == 'delete':
             response = requests.delete(f"{API_BASE_URL}/files/delete/{filename}")
@@ -184,14 +574,26 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await query.message.reply_text(f"❌ Ошибка: {response.text}")
 
         elif action == 'copy':
-            response = requests.get(f"{API_BASE_URL}/files/content/{filename}")
-            if response.status_code != 200:
+            if not filepath.exists():
                 return await query.message.reply_text("❌ Ошибка копирования")
             
-            content = response.json().get('content', '')
-            FileService.copy_to_clipboard(content)
+            FileService.copy_file_to_clipboard(filename)
             await query.message.reply_text("✅ Текст скопирован в буфер")
 
+        elif action == 'read':
+            if not filepath.exists():
+                return await query.message.reply_text("❌ Файл не найден")
+
+            page = read_page(filepath, offset)
+            keyboard = None
+            if page['next_offset'] is not None:
+                percent = page['next_offset'] * 100 // max(page['total_bytes'], 1)
+                keyboard = InlineKeyboardMarkup([[InlineKeyboardButton(
+                    f"➡️ Далее ({percent}%)",
+                    callback_data=f"read:{page['next_offset']}:{filename}"
+                )]])
+            await query.message.reply_text(page['content'] or "(пусто)", reply_markup=keyboard)
+
     except Exception as e:
         logger.error(f"Ошибка обработки кнопки: {str(e)}")
         await query.message.reply_text("⚠️ Ошибка обработки запроса")
@@ -207,23 +609,33 @@ def run_bot():
         event_loop = asyncio.new_event_loop()
         asyncio.set_event_loop(event_loop)
         
-        application = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+        # Обновления обрабатываются параллельно: несколько файлов не ждут друг друга
+        application = ApplicationBuilder().token(TELEGRAM_TOKEN).concurrent_updates(True).build()
         
         # Регистрация обработчиков
         handlers = [
             CommandHandler("start", start),
             CommandHandler("save", save_text_command),
             CommandHandler("history", get_history),
-            MessageHandler(filters.Document.ALL, handle_file),
+            CommandHandler("yt", youtube_batch_command),
+            CommandHandler("export", export_command),
+            CommandHandler("select", select_command),
+            CommandHandler("tag", tag_command),
+            MessageHandler(
+                filters.Document.ALL | filters.PHOTO | filters.VIDEO | filters.AUDIO,
+                handle_file
+            ),
             CallbackQueryHandler(button_handler)
         ]
         
         application.add_handlers(handlers)
         
         logger.info("Бот запущен")
+        # Сигналы обрабатывает Lifecycle: бот останавливается после дренажа
         application.run_polling(
             drop_pending_updates=True,
-            close_loop=False
+            close_loop=False,
+            stop_signals=None
         )
     except Exception as e:
         logger.error(f"Ошибка бота: {str(e)}")
@@ -245,18 +657,29 @@ def start_bot():
             name="TelegramBot"
         )
         bot_thread.start()
+        if TELEGRAM_TOKEN:  # без токена бот не нужен и не влияет на готовность
+            Lifecycle.register_check('bot', bot_health)
+        Lifecycle.on_shutdown('bot', stop_bot, first=True)
         logger.info("Бот запущен в отдельном потоке")
     except Exception as e:
         logger.error(f"Ошибка запуска бота: {str(e)}")
         raise
 
+def bot_health():
+    """Бот подключен: поток жив и polling запущен"""
+    if not (bot_thread and bot_thread.is_alive()):
+        return False, 'thread stopped'
+    if application is None or not application.running:
+        return False, 'starting'
+    return True, 'polling'
+
 def stop_bot():
-    """Остановка бота"""
+    """Остановка бота: polling завершается в его цикле событий, поток дожидается выхода"""
     global application, bot_thread
     
     try:
-        if application:
-            application.stop()
+        if application and application.running and event_loop:
+            event_loop.call_soon_threadsafe(application.stop_running)
             logger.info("Бот остановлен")
         if bot_thread and bot_thread.is_alive():
             bot_thread.join(timeout=5)
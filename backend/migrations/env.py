@@ -0,0 +1,57 @@
+# migrations/env.py
+import logging
+
+from alembic import context
+from flask import current_app
+
+config = context.config
+logger = logging.getLogger('alembic.env')
+
+# База и метаданные моделей - из расширения Flask-Migrate (Database.init_app)
+target_db = current_app.extensions['migrate'].db
+
+
+def get_engine():
+    return target_db.engine
+
+
+config.set_main_option('sqlalchemy.url', get_engine().url.render_as_string(hide_password=False).replace('%', '%%'))
+
+
+def run_migrations_offline():
+    """SQL миграций без подключения к базе (flask db upgrade --sql)"""
+    context.configure(
+        url=config.get_main_option('sqlalchemy.url'),
+        target_metadata=target_db.metadata,
+        literal_binds=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # Пустая автогенерация не создает файл миграции
+    def process_revision_directives(context, revision, directives):
+        if getattr(config.cmd_opts, 'autogenerate', False):
+            script = directives[0]
+            if script.upgrade_ops.is_empty():
+                directives[:] = []
+                logger.info('No changes in schema detected.')
+
+    conf_args = current_app.extensions['migrate'].configure_args
+    conf_args.setdefault('process_revision_directives', process_revision_directives)
+
+    engine = get_engine()
+    # SQLite не умеет ALTER большинства ограничений - изменения через пересоздание таблицы
+    conf_args.setdefault('render_as_batch', engine.dialect.name == 'sqlite')
+
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_db.metadata, **conf_args)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
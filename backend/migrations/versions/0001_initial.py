@@ -0,0 +1,91 @@
+"""Общая база: файлы, теги, сообщения, задачи YouTube, настройки
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('folder', sa.String(length=32), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('mtime', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('folder', 'name', name='files_folder_name')
+    )
+    op.create_index('files_folder_created', 'files', ['folder', 'created_at'])
+
+    op.create_table(
+        'file_tags',
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('tag', sa.String(length=32), nullable=False),
+        sa.PrimaryKeyConstraint('name', 'tag')
+    )
+    op.create_index('file_tags_tag', 'file_tags', ['tag'])
+
+    op.create_table(
+        'messages',
+        sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('created_at', sa.Float(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('preview', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('messages_created', 'messages', ['created_at'])
+
+    op.create_table(
+        'youtube_jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('format', sa.String(length=255), nullable=True),
+        sa.Column('download_dir', sa.Text(), nullable=False),
+        sa.Column('output_path', sa.Text(), nullable=True),
+        sa.Column('tuning', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('bytes_done', sa.BigInteger(), nullable=False),
+        sa.Column('total_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('next_attempt_at', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('youtube_jobs_status', 'youtube_jobs', ['status'])
+    op.create_index('youtube_jobs_updated', 'youtube_jobs', ['updated_at'])
+
+    op.create_table(
+        'settings',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('value', sa.Text(), nullable=False),
+        sa.Column('updated_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('settings')
+    op.drop_index('youtube_jobs_updated', table_name='youtube_jobs')
+    op.drop_index('youtube_jobs_status', table_name='youtube_jobs')
+    op.drop_table('youtube_jobs')
+    op.drop_index('messages_created', table_name='messages')
+    op.drop_table('messages')
+    op.drop_index('file_tags_tag', table_name='file_tags')
+    op.drop_table('file_tags')
+    op.drop_index('files_folder_created', table_name='files')
+    op.drop_table('files')
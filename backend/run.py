@@ -5,9 +5,14 @@ import os
 import logging
 from app import create_app, socketio
 from app.telegram_bot import start_bot, stop_bot
+from app.services.lifecycle_service import Lifecycle
+
+# Воркеры пула процессов (spawn) импортируют этот файл как __mp_main__:
+# им нужны только функции для run_cpu, а не приложение с ботом и фоновыми сервисами
+POOL_WORKER = __name__ == '__mp_main__'
 
 # Инициализация приложения и логгера на верхнем уровне
-app = create_app()
+app = None if POOL_WORKER else create_app()
 logger = logging.getLogger(__name__)
 
 def configure_logging():
@@ -59,6 +64,9 @@ def run_server():
         logger.info(f"Локальный адрес: http://localhost:{server_info['port']}")
         logger.info("="*50 + "\n")
 
+        # SIGTERM/SIGINT: дренаж текущих операций, затем выход из socketio.run
+        Lifecycle.install_signal_handlers()
+
         # Запуск SocketIO сервера
         socketio.run(
             app,
@@ -75,12 +83,16 @@ def run_server():
         raise
     finally:
         stop_bot()
+        # Без сигнала (ошибка, остановка сервера) хуки дренажа еще не вызывались
+        Lifecycle.shutdown('exit', timeout=0)
 
 if __name__ == "__main__":
     configure_logging()
     run_server()
-else:
+elif not POOL_WORKER:
     # Инициализация для Gunicorn
     configure_logging()
     start_bot()
+    # Воркер gunicorn уже поставил свои обработчики - они вызываются после дренажа
+    Lifecycle.install_signal_handlers()
     logger.info("Приложение инициализировано в режиме WSGI")
\ No newline at end of file
@@ -0,0 +1,180 @@
+# tests/test_journal.py
+import os
+import threading
+
+import pytest
+
+from app.services.journal_service import INDEX_RECORD, MessageJournal
+
+
+@pytest.fixture
+def journal_dir(tmp_path):
+    return tmp_path / 'journal'
+
+
+def open_journal(directory, **kwargs):
+    return MessageJournal(directory, fsync_policy='never', **kwargs).open()
+
+
+def texts(journal):
+    return [journal.get(entry['id'])['text'] for entry in reversed(journal.entries())]
+
+
+def idx_path(directory, number=1):
+    return directory / f'segment_{number:08d}.idx'
+
+
+def log_path(directory, number=1):
+    return directory / f'segment_{number:08d}.log'
+
+
+def test_reopen_keeps_messages_and_deletions(journal_dir):
+    journal = open_journal(journal_dir)
+    first = journal.append('первое')
+    journal.append('второе')
+    journal.delete(first['id'])
+    journal.close()
+
+    journal = open_journal(journal_dir)
+    assert texts(journal) == ['второе']
+    assert journal.append('третье')['id'] == 3
+    journal.close()
+
+
+def test_torn_index_record_is_truncated_before_next_append(journal_dir):
+    """Оборванная запись индекса не сдвигает следующую"""
+    journal = open_journal(journal_dir)
+    journal.append('a')
+    journal.append('b')
+    journal.close()
+    with open(idx_path(journal_dir), 'ab') as f:
+        f.write(INDEX_RECORD.pack(3, 2, 1, 0.0, 0)[:7])
+
+    journal = open_journal(journal_dir)
+    assert os.path.getsize(idx_path(journal_dir)) == 2 * INDEX_RECORD.size
+    entry = journal.append('c')
+    assert entry['id'] == 3
+    journal.close()
+
+    journal = open_journal(journal_dir)
+    assert texts(journal) == ['a', 'b', 'c']
+    journal.close()
+
+
+def test_index_past_end_of_data_is_dropped(journal_dir):
+    """Запись индекса без данных (обрезанный .log) отбрасывается вместе с хвостом"""
+    journal = open_journal(journal_dir)
+    journal.append('целое')
+    journal.append('оборванное')
+    journal.close()
+    with open(log_path(journal_dir), 'r+b') as f:
+        f.truncate(len('целое'.encode('utf-8')) + 3)
+
+    journal = open_journal(journal_dir)
+    assert texts(journal) == ['целое']
+    assert os.path.getsize(idx_path(journal_dir)) == INDEX_RECORD.size
+    journal.append('новое')
+    journal.close()
+
+    journal = open_journal(journal_dir)
+    assert texts(journal) == ['целое', 'новое']
+    journal.close()
+
+
+def test_orphan_data_without_index_is_skipped(journal_dir):
+    """Данные, записанные без записи индекса, не мешают следующим сообщениям"""
+    journal = open_journal(journal_dir)
+    journal.append('a')
+    journal.close()
+    with open(log_path(journal_dir), 'ab') as f:
+        f.write(b'orphan')
+
+    journal = open_journal(journal_dir)
+    journal.append('b')
+    journal.close()
+
+    journal = open_journal(journal_dir)
+    assert texts(journal) == ['a', 'b']
+    journal.close()
+
+
+def test_compaction_survives_reopen(journal_dir):
+    journal = open_journal(journal_dir, segment_size=16, compact_ratio=0.1)
+    ids = [journal.append(f'message {i:02d}')['id'] for i in range(10)]
+    for msg_id in ids[:6]:
+        journal.delete(msg_id)
+    assert journal.compact() > 0
+    assert texts(journal) == [f'message {i:02d}' for i in range(6, 10)]
+    journal.close()
+
+    journal = open_journal(journal_dir)
+    assert texts(journal) == [f'message {i:02d}' for i in range(6, 10)]
+    journal.close()
+
+
+def test_compaction_keeps_tombstones_of_messages_outside_sealed(journal_dir):
+    """Надгробие не теряется, пока удаленное сообщение лежит в несжимаемом сегменте"""
+    journal = open_journal(journal_dir, segment_size=16, compact_ratio=0.1)
+    ids = [journal.append(f'message {i}')['id'] for i in range(1, 5)]
+    journal.delete(ids[0])
+    journal.compact()
+    journal.delete(ids[1])
+    journal.close()
+
+    journal = open_journal(journal_dir, segment_size=16, compact_ratio=0.1)
+    journal.delete(ids[3])
+    journal.compact()
+    journal.close()
+
+    journal = open_journal(journal_dir, segment_size=16, compact_ratio=0.1)
+    assert [entry['id'] for entry in journal.entries()] == [ids[2]]
+    journal.close()
+
+
+def test_interrupted_compaction_copy_is_deduplicated(journal_dir):
+    """Копия сообщения в новом сегменте (компакция прервана до удаления старых) не дублируется"""
+    journal = open_journal(journal_dir, segment_size=8)
+    journal.append('aaaaaaaa')
+    journal.append('bbbbbbbb')
+    journal.close()
+    data = b'aaaaaaaa'
+    with open(log_path(journal_dir, 9), 'wb') as f:
+        f.write(data)
+    with open(idx_path(journal_dir, 9), 'wb') as f:
+        f.write(INDEX_RECORD.pack(1, 0, len(data), 0.0, 0))
+
+    journal = open_journal(journal_dir, segment_size=8)
+    assert len(journal) == 2
+    assert texts(journal) == ['aaaaaaaa', 'bbbbbbbb']
+    journal.close()
+
+
+def test_reads_during_compaction(journal_dir):
+    """get/preview не читают закрытый компакцией сегмент"""
+    journal = open_journal(journal_dir, segment_size=64, compact_ratio=0.01)
+    ids = [journal.append(f'message {i:03d}')['id'] for i in range(200)]
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        try:
+            while not stop.is_set():
+                for msg_id in ids[1::2]:
+                    assert journal.get(msg_id)['text'] == f'message {msg_id - 1:03d}'
+                    assert journal.preview(msg_id, 7) == 'message'
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for msg_id in ids[::2]:
+        journal.delete(msg_id)
+        if msg_id % 20 == 1:
+            journal.compact()
+    journal.compact()
+    stop.set()
+    for thread in threads:
+        thread.join()
+    journal.close()
+    assert not errors
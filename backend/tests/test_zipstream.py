@@ -0,0 +1,89 @@
+# tests/test_zipstream.py
+import io
+import zipfile
+
+import pytest
+
+from app.core.zipstream import ZipEntry, ZipStream
+
+MTIME = 1700000000.0
+
+
+def entry(name, data, compress=False, chunk=7):
+    chunks = [data[i:i + chunk] for i in range(0, len(data), chunk)]
+    return ZipEntry(name, len(data), MTIME, lambda: iter(chunks), compress=compress)
+
+
+def build(entries, **kwargs):
+    return b''.join(ZipStream(entries, chunk_size=16, **kwargs))
+
+
+def read_back(archive):
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert zf.testzip() is None
+        return {info.filename: (info.compress_type, zf.read(info)) for info in zf.infolist()}
+
+
+def test_stored_entries_round_trip_and_match_content_length():
+    entries = [entry('a.txt', b'hello world' * 10), entry('пусто.bin', b''), entry('b.bin', bytes(range(256)))]
+    stream = ZipStream(entries, chunk_size=16)
+    length = stream.content_length()
+    archive = b''.join(stream)
+
+    assert length == len(archive)
+    assert read_back(archive) == {
+        'a.txt': (zipfile.ZIP_STORED, b'hello world' * 10),
+        'пусто.bin': (zipfile.ZIP_STORED, b''),
+        'b.bin': (zipfile.ZIP_STORED, bytes(range(256)))
+    }
+
+
+def test_deflated_entries_round_trip():
+    text = 'строка журнала\n'.encode('utf-8') * 500
+    archive = build([entry('log.txt', text, compress=True), entry('raw.bin', b'\x00\x01', compress=False)])
+
+    files = read_back(archive)
+    assert files['log.txt'] == (zipfile.ZIP_DEFLATED, text)
+    assert files['raw.bin'] == (zipfile.ZIP_STORED, b'\x00\x01')
+    assert len(archive) < len(text)
+
+
+def test_content_length_unknown_with_deflate():
+    assert ZipStream([entry('a.txt', b'a', compress=True)]).content_length() is None
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_forced_zip64_entry(compress):
+    """Большой файл пишется с zip64-полями; проверяем формат на маленьком"""
+    data = b'zip64 payload ' * 100
+    big = entry('big.bin', data, compress=compress)
+    big.zip64 = True
+    stream = ZipStream([big, entry('small.txt', b'small')], chunk_size=16)
+    length = stream.content_length()
+    archive = b''.join(stream)
+
+    if not compress:
+        assert length == len(archive)
+    files = read_back(archive)
+    assert files['big.bin'][1] == data
+    assert files['small.txt'][1] == b'small'
+
+
+def test_blocking_work_goes_through_offload():
+    calls = []
+
+    def offload(func):
+        calls.append(func)
+        return func()
+
+    text = b'x' * 100
+    archive = build([entry('a.txt', text, compress=True)], offload=offload)
+    assert read_back(archive)['a.txt'][1] == text
+    # Открытие источника, каждый кусок, конец источника и flush
+    assert len(calls) == 1 + len(range(0, len(text), 7)) + 1 + 1
+
+
+def test_stored_size_change_aborts_archive():
+    changed = ZipEntry('a.txt', 10, MTIME, lambda: [b'short'])
+    with pytest.raises(IOError):
+        build([changed])
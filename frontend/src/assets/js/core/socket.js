@@ -1,10 +1,20 @@
 import { io } from 'socket.io-client'
 
+// Идентификатор устройства (комната device:<id>) выдает сервер: клиент хранит
+// подписанный токен из connection_status и предъявляет его при подключении
+const DEVICE_TOKEN_KEY = 'deviceToken'
+
 export function setupSocket(app) {
   const socket = io('http://localhost:8080', {
     path: '/socket.io',
     transports: ['websocket'],
-    reconnectionAttempts: 5
+    reconnectionAttempts: 5,
+    // Токен проверяется один раз при подключении; функция перечитывает его при переподключении
+    auth: (cb) => cb({
+      token: localStorage.getItem('token'),
+      device_token: localStorage.getItem(DEVICE_TOKEN_KEY),
+      topics: ['files', 'messages', 'youtube']
+    })
   })
 
   // Глобальное предоставление сокета
@@ -14,6 +24,12 @@ export function setupSocket(app) {
     console.log('Socket connected')
   })
 
+  socket.on('connection_status', (status) => {
+    if (status.device_token) {
+      localStorage.setItem(DEVICE_TOKEN_KEY, status.device_token)
+    }
+  })
+
   socket.on('disconnect', () => {
     console.log('Socket disconnected')
   })
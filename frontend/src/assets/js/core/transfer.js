@@ -0,0 +1,137 @@
+// transfer.js
+// Загрузка файла частями по открытому Socket.IO-соединению (события upload_*)
+
+const ACK_TIMEOUT = 30000;
+const CHUNK_RETRIES = 5;
+// SHA-256 считается по файлу целиком в памяти - только для файлов поменьше
+const SHA256_MAX_BYTES = 64 * 1024 * 1024;
+
+const CRC_TABLE = (() => {
+    const table = new Uint32Array(256);
+    for (let n = 0; n < 256; n++) {
+        let c = n;
+        for (let k = 0; k < 8; k++) {
+            c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+        }
+        table[n] = c >>> 0;
+    }
+    return table;
+})();
+
+/**
+ * CRC32 (как zlib.crc32 на сервере); crc - значение для предыдущих данных
+ */
+export function crc32(bytes, crc = 0) {
+    let c = (crc ^ 0xFFFFFFFF) >>> 0;
+    for (let i = 0; i < bytes.length; i++) {
+        c = CRC_TABLE[(c ^ bytes[i]) & 0xFF] ^ (c >>> 8);
+    }
+    return (c ^ 0xFFFFFFFF) >>> 0;
+}
+
+// SHA-256 есть только в защищенном контексте (HTTPS или localhost)
+async function sha256Hex(file) {
+    if (!globalThis.crypto?.subtle || file.size > SHA256_MAX_BYTES) return null;
+    const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+/**
+ * Отказ сервера (лимит, имя, размер, контрольная сумма) - в отличие от обрыва
+ * или таймаута повтор другим способом его не исправит
+ */
+export class TransferRejected extends Error {}
+
+async function request(socket, event, payload) {
+    const response = await socket.timeout(ACK_TIMEOUT).emitWithAck(event, payload);
+    if (response?.error) throw new TransferRejected(response.error);
+    return response;
+}
+
+async function readChunk(file, index, chunkSize) {
+    const buffer = await file.slice(index * chunkSize, (index + 1) * chunkSize).arrayBuffer();
+    return new Uint8Array(buffer);
+}
+
+function waitForConnect(socket) {
+    return new Promise((resolve, reject) => {
+        const timer = setTimeout(() => {
+            socket.off('connect', onConnect);
+            reject(new Error('Нет соединения с сервером'));
+        }, ACK_TIMEOUT);
+        const onConnect = () => {
+            clearTimeout(timer);
+            resolve();
+        };
+        socket.once('connect', onConnect);
+    });
+}
+
+async function sendChunk(socket, uploadId, index, bytes) {
+    const checksum = crc32(bytes);
+    for (let attempt = 1; ; attempt++) {
+        try {
+            // Повтор после переподключения ждет, пока сокет снова подключится
+            if (!socket.connected) {
+                await waitForConnect(socket);
+                await request(socket, 'upload_start', { upload_id: uploadId });
+            }
+            const ack = await request(socket, 'upload_chunk', {
+                upload_id: uploadId, index, data: bytes, crc32: checksum
+            });
+            if (ack.ok) return ack;
+            if (attempt >= CHUNK_RETRIES) throw new Error(`Часть ${index} повреждена при передаче`);
+        } catch (error) {
+            if (attempt >= CHUNK_RETRIES) throw error;
+        }
+    }
+}
+
+/**
+ * Загрузка файла: не больше window неподтвержденных частей одновременно,
+ * каждая часть и весь файл проверяются сервером по CRC32 (и SHA-256, если доступен).
+ * Уже принятые части (после обрыва и повторного upload_start) не отправляются.
+ * onProgress(отправлено байт, всего байт)
+ */
+export async function uploadOverSocket(socket, file, { onProgress } = {}) {
+    const started = await request(socket, 'upload_start', {
+        name: file.name,
+        size: file.size,
+        type: file.type || null
+    });
+    const { upload_id: uploadId, chunk_size: chunkSize, chunks, window } = started;
+    const done = new Set(started.received);
+    const pending = [];
+    let next = 0;
+    let sent = 0;
+
+    try {
+        const worker = async () => {
+            while (next < chunks) {
+                const index = next++;
+                if (done.has(index)) continue;
+                const bytes = await readChunk(file, index, chunkSize);
+                await sendChunk(socket, uploadId, index, bytes);
+                done.add(index);
+                sent += bytes.length;
+                onProgress?.(sent, file.size);
+            }
+        };
+        for (let i = 0; i < Math.max(1, window); i++) pending.push(worker());
+        await Promise.all(pending);
+
+        // Контрольная сумма всего файла - по частям, без чтения файла целиком
+        let checksum = 0;
+        for (let index = 0; index < chunks; index++) {
+            checksum = crc32(await readChunk(file, index, chunkSize), checksum);
+        }
+        return await request(socket, 'upload_finish', {
+            upload_id: uploadId,
+            crc32: checksum,
+            sha256: await sha256Hex(file)
+        });
+    } catch (error) {
+        socket.emit('upload_abort', { upload_id: uploadId });
+        throw error;
+    }
+}
@@ -11,6 +11,7 @@ import {
   formatFileSize,
   showLoader
 } from '../../core/utils.js';
+import { TransferRejected, uploadOverSocket } from '../../core/transfer.js';
 
 export const Files = {
     fileToDelete: null,
@@ -40,6 +41,12 @@ export const Files = {
     setupSocketListeners() {
         if (this.socket) {
             this.socket.on('file_updated', () => this.load());
+            this.socket.on('files_batch_added', () => this.load());
+            this.socket.on('files_batch_updated', () => this.load());
+            // Изменения папки приходят от наблюдателя на сервере, опрос не нужен
+            ['file_added', 'file_deleted', 'file_modified'].forEach(event =>
+                this.socket.on(event, () => this.load())
+            );
         }
     },
 
@@ -121,11 +128,11 @@ export const Files = {
     },
 
     async uploadFile(file) {
-        const formData = new FormData();
-        formData.append('file', file);
-
         try {
-            const response = await fetchUpload('/api/files/upload', formData);
+            // По открытому сокету - частями с проверкой, иначе (и пустые файлы) обычной формой
+            const response = this.socket?.connected && file.size > 0
+                ? await this.uploadSocket(file)
+                : await this.uploadForm(file);
             if (response.error) throw new Error(response.error);
             
             showToast('Файл загружен!');
@@ -137,6 +144,23 @@ export const Files = {
         }
     },
 
+    async uploadSocket(file) {
+        try {
+            return await uploadOverSocket(this.socket, file);
+        } catch (error) {
+            // Сбой протокола (таймаут, обрыв, поврежденные части) - повтор обычной формой
+            if (error instanceof TransferRejected) throw error;
+            console.warn('Socket upload failed, falling back to form:', error);
+            return this.uploadForm(file);
+        }
+    },
+
+    uploadForm(file) {
+        const formData = new FormData();
+        formData.append('file', file);
+        return fetchUpload('/api/files/upload', formData);
+    },
+
     async confirmDelete() {
         if (!this.fileToDelete) return;
 
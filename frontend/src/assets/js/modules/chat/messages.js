@@ -87,6 +87,9 @@ export const Messages = {
         container.innerHTML = messages.map(msg => `
             <div class="message ${msg.type === 'text' ? 'user' : ''}">
                 <div class="message-content">${escapeHtml(msg.content)}</div>
+                ${this.isImage(msg) ? `
+                <img class="message-image" loading="lazy" alt="${escapeAttr(msg.filename)}"
+                     src="/api/files/download/${encodeURIComponent(msg.filename)}?size=480">` : ''}
                 <span class="message-time">${formatDate(msg.time)}</span>
                 <div class="message-actions">
                     <button class="copy-btn" data-content="${escapeAttr(msg.content)}">
@@ -114,11 +117,19 @@ export const Messages = {
         });
     },
 
+    isImage(msg) {
+        return msg.type === 'file' && /\.(jpe?g|png|webp|bmp|tiff?)$/i.test(msg.filename || '');
+    },
+
     setupOpenFileButtons() {
         document.querySelectorAll('.open-file-btn').forEach(btn => {
             btn.addEventListener('click', () => {
                 const filename = btn.dataset.filename;
-                window.open(`/download_file/${encodeURIComponent(filename)}`, '_blank');
+                // Картинки открываются уменьшенной копией для экрана, оригинал - через скачивание
+                const url = this.isImage({ type: 'file', filename })
+                    ? `/api/files/download/${encodeURIComponent(filename)}?size=2048`
+                    : `/download_file/${encodeURIComponent(filename)}`;
+                window.open(url, '_blank');
             });
         });
     },